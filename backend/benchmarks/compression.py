@@ -0,0 +1,132 @@
+"""
+Payload size and latency of API responses with and without compression
+(``core.middleware.CompressionMiddleware``), through the full middleware
+stack, at typical page sizes.
+
+    cd backend && python benchmarks/compression.py [--products 500]
+
+"latency" adds the server time to the time needed to move the body over
+each link (round trip plus size / bandwidth; TCP slow start ignored), so it
+understates what compression saves on real cellular links. The generated
+rows are more alike than a real catalog, so real ratios are lower. Brotli
+rows appear when the ``brotli`` package is installed.
+
+Builds a throwaway in-memory database, so it can run anywhere.
+"""
+import argparse
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'trinity_backend.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+# (name, bandwidth in bytes/s, round trip in s)
+LINKS = [
+    ('3g', 1_500_000 / 8, 0.150),
+    ('4g', 12_000_000 / 8, 0.060),
+]
+
+
+def build_data(product_count, invoice_count):
+    from django.contrib.auth.models import User
+    from invoices.models import Invoice, InvoiceItem
+    from products.models import Category, Product
+    from users.models import Customer
+
+    categories = [Category.objects.create(name=f'Aisle {n}') for n in range(12)]
+    Product.objects.bulk_create([
+        Product(
+            name=f'Sparkling water {n} – 1,5 L',
+            brand='Fontaine',
+            barcode=f'{3000000000000 + n}',
+            category=categories[n % len(categories)],
+            price=Decimal('0.99') + n % 50,
+            quantity_in_stock=n % 120,
+            picture_url=f'https://images.openfoodfacts.org/images/products/300/000/000/{n:04d}/front_fr.4.400.jpg',
+        )
+        for n in range(product_count)
+    ])
+    products = list(Product.objects.order_by('id'))
+    customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com')
+    for n in range(invoice_count):
+        invoice = Invoice.objects.create(
+            customer=customer, invoice_number=f'INV-B-{n}', subtotal=Decimal('40.00'),
+            tax_amount=Decimal('8.00'), total_amount=Decimal('48.00'), status='paid',
+        )
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=invoice, product=products[(n + i) % len(products)], quantity=1 + i,
+                        unit_price=Decimal('5.00'), total_price=Decimal('5.00') * (1 + i))
+            for i in range(6)
+        ])
+    return User.objects.create_user('bench', password='x', is_staff=True)
+
+
+def measure(func, repeat=5):
+    number, _ = timeit.Timer(func).autorange()
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    from rest_framework.pagination import PageNumberPagination
+    from rest_framework.test import APIClient
+    from core import middleware
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--invoices', type=int, default=200)
+    args = parser.parse_args()
+
+    encodings = ['identity', 'gzip'] + (['br'] if middleware.brotli is not None else [])
+    cases = [
+        (f'products x{size}', '/api/products/', size) for size in (20, 50, 100)
+    ] + [
+        ('invoices x20', '/api/invoices/', 20),
+        ('export (stream)', '/api/reports/export/invoice-items/?output=jsonl', None),
+    ]
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        client = APIClient()
+        client.force_authenticate(build_data(args.products, args.invoices))
+        links = ' '.join(f'{name + " ms":>8}' for name, _, _ in LINKS)
+        print(f"{'payload':<17} {'encoding':<9} {'bytes':>9} {'ratio':>6} {'server ms':>10} {links}")
+        for name, path, page_size in cases:
+            if page_size:
+                PageNumberPagination.page_size = page_size
+            identity_size = None
+            for encoding in encodings:
+                headers = {} if encoding == 'identity' else {'HTTP_ACCEPT_ENCODING': encoding}
+                def fetch():
+                    response = client.get(path, **headers)
+                    assert response.status_code == 200, (path, response.status_code)
+                    body = b''.join(response.streaming_content) if response.streaming else response.content
+                    return response, body
+
+                response, body = fetch()
+                assert response.get('Content-Encoding', 'identity') == encoding, (path, encoding)
+                size = len(body)
+                identity_size = identity_size or size
+                server = measure(fetch)
+                latencies = ' '.join(
+                    f'{(server + rtt + size / bandwidth) * 1000:>8.1f}' for _, bandwidth, rtt in LINKS
+                )
+                print(
+                    f'{name:<17} {encoding:<9} {size:>9,} {identity_size / size:>5.1f}x '
+                    f'{server * 1000:>10.2f} {latencies}'
+                )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Compare DRF's JSONRenderer/JSONParser with core's orjson-backed classes on
+realistic payloads: a page of the product catalog and a page of invoices
+with their items, both produced by the real serializers.
+
+    cd backend && python benchmarks/json_renderer.py [--products 500] [--invoices 100]
+
+Builds a throwaway in-memory database, so it can run anywhere.
+"""
+import argparse
+import io
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'trinity_backend.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+
+def build_payloads(product_count, invoice_count, items_per_invoice=8):
+    from invoices.models import Invoice, InvoiceItem
+    from invoices.serializers import InvoiceSerializer
+    from products.models import Category, Product
+    from products.serializers import ProductListSerializer
+    from users.models import Customer
+
+    category = Category.objects.create(name='Beverages')
+    Product.objects.bulk_create([
+        Product(
+            name=f'Sparkling water {n} – 1,5 L',
+            brand='Fontaine',
+            barcode=f'{3000000000000 + n}',
+            category=category,
+            price=Decimal('0.99') + n % 50,
+            quantity_in_stock=n % 120,
+        )
+        for n in range(product_count)
+    ])
+    products = list(Product.objects.select_related('category').order_by('id'))
+    customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com')
+    for n in range(invoice_count):
+        invoice = Invoice.objects.create(
+            customer=customer, subtotal=Decimal('40.00'), tax_amount=Decimal('8.00'), total_amount=Decimal('48.00'),
+        )
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(
+                invoice=invoice,
+                product=products[(n + i) % len(products)],
+                quantity=1 + i,
+                unit_price=Decimal('5.00'),
+                total_price=Decimal('5.00') * (1 + i),
+                product_name=products[(n + i) % len(products)].name,
+            )
+            for i in range(items_per_invoice)
+        ])
+
+    catalog = ProductListSerializer(products, many=True, context={}).data
+    invoices = InvoiceSerializer(
+        Invoice.objects.select_related('customer').prefetch_related('items'), many=True, context={},
+    ).data
+    return {'catalog': catalog, 'invoices': invoices}
+
+
+def measure(func, repeat=5):
+    number, _ = timeit.Timer(func).autorange()
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    from core.parsers import FastJSONParser
+    from core.renderers import FastJSONRenderer, orjson
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--invoices', type=int, default=100)
+    args = parser.parse_args()
+    if orjson is None:
+        print('orjson is not installed; FastJSONRenderer would fall back to DRF.')
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        payloads = build_payloads(args.products, args.invoices)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    stock, fast = JSONRenderer(), FastJSONRenderer()
+    stock_parser, fast_parser = JSONParser(), FastJSONParser()
+    print(f"{'payload':<10} {'size':>9} {'step':<7} {'drf ms':>9} {'fast ms':>9} {'speedup':>8}")
+    for name, data in payloads.items():
+        body = stock.render(data)
+        assert fast.render(data) == body, f'{name}: renderers disagree'
+        rows = [
+            ('render', measure(lambda: stock.render(data)), measure(lambda: fast.render(data))),
+            ('parse', measure(lambda: stock_parser.parse(io.BytesIO(body))),
+             measure(lambda: fast_parser.parse(io.BytesIO(body)))),
+        ]
+        for step, before, after in rows:
+            print(
+                f'{name:<10} {len(body):>9,} {step:<7} {before * 1000:>9.3f} {after * 1000:>9.3f} '
+                f'{before / after:>7.1f}x'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Compare the DRF list serializers with their ``values()`` fast paths
+(``products.fastpath``, ``invoices.fastpath``) on one page of each list
+endpoint: end to end with queries ("page"), and serializing rows that are
+already loaded ("serialize"; the DRF side gets select_related/prefetch).
+
+    cd backend && python benchmarks/list_serializers.py [--rows 100]
+
+Builds a throwaway in-memory database, so it can run anywhere.
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'trinity_backend.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+
+def build_data(rows, items_per_invoice=8):
+    from invoices.models import Invoice, InvoiceItem
+    from products.models import Category, Product, Promotion
+    from users.models import Customer
+
+    categories = [Category.objects.create(name=f'Aisle {n}') for n in range(10)]
+    Product.objects.bulk_create([
+        Product(
+            name=f'Sparkling water {n}',
+            brand='Fontaine',
+            barcode=f'{3000000000000 + n}',
+            category=categories[n % len(categories)],
+            price=Decimal('0.99') + n % 50,
+            quantity_in_stock=n % 120,
+        )
+        for n in range(rows)
+    ])
+    products = list(Product.objects.order_by('id'))
+    now = timezone.now()
+    Promotion.objects.create(
+        title='Storewide', description='5% off', discount_percentage=Decimal('5.00'),
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+    )
+    Promotion.objects.create(
+        title='Water week', description='15% off', product=products[0], discount_percentage=Decimal('15.00'),
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+    )
+    customer = Customer.objects.create(first_name='Ada', last_name='Lovelace', email='ada@example.com')
+    for n in range(rows):
+        invoice = Invoice.objects.create(
+            customer=customer, invoice_number=f'INV-B-{n}', subtotal=Decimal('40.00'),
+            tax_amount=Decimal('8.00'), total_amount=Decimal('48.00'),
+        )
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=invoice, product=products[(n + i) % len(products)], quantity=1 + i,
+                        unit_price=Decimal('5.00'), total_price=Decimal('5.00') * (1 + i))
+            for i in range(items_per_invoice)
+        ])
+
+
+def measure(func, repeat=5):
+    number, _ = timeit.Timer(func).autorange()
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    from invoices.fastpath import InvoiceListValues
+    from invoices.models import Invoice
+    from products.fastpath import CategoryValues, ProductListValues
+    from products.models import Category, Product
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100, help='rows per page (and per table)')
+    args = parser.parse_args()
+
+    cases = [
+        ('products', ProductListValues, lambda: Product.objects.filter(is_active=True), ['category'], []),
+        ('invoices', InvoiceListValues, lambda: Invoice.objects.all(), ['customer'], ['items']),
+        ('categories', CategoryValues, lambda: Category.objects.all(), [], ['products']),
+    ]
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        build_data(args.rows)
+        print(f"{'endpoint':<11} {'rows':>5} {'step':<10} {'drf ms':>9} {'fast ms':>9} {'speedup':>8}")
+        for name, values_class, queryset, related, prefetch in cases:
+            serializer_class = values_class.serializer_class
+
+            def drf():
+                return serializer_class(queryset(), many=True, context={}).data
+
+            def fast():
+                serializer = values_class(context={})
+                return serializer.serialize(serializer.values(queryset()))
+
+            assert JSONRenderer().render(fast()) == JSONRenderer().render(drf()), f'{name}: outputs differ'
+            instances = list(queryset().select_related(*related).prefetch_related(*prefetch))
+            rows = list(values_class(context={}).values(queryset()))
+            steps = [
+                ('page', drf, fast),
+                ('serialize', lambda: serializer_class(instances, many=True, context={}).data,
+                 lambda: values_class(context={}).serialize(rows)),
+            ]
+            for step, before, after in steps:
+                before, after = measure(before), measure(after)
+                print(
+                    f'{name:<11} {len(rows):>5} {step:<10} {before * 1000:>9.2f} {after * 1000:>9.2f} '
+                    f'{before / after:>7.1f}x'
+                )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
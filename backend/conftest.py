@@ -1,10 +1,36 @@
 import pytest
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
 from users.models import Customer
 from products.models import Product, Category
 from invoices.models import Invoice, InvoiceItem
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    """Keep files written through the default storage out of the repo."""
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    return tmp_path / 'media'
+
+
+@pytest.fixture
+def render_both():
+    """Render a queryset through the DRF serializer and its ``values()`` fast path."""
+    def render(values_class, queryset, **context):
+        drf = values_class.serializer_class(queryset, many=True, context=context).data
+        fast = values_class(context=context)
+        return JSONRenderer().render(drf), JSONRenderer().render(fast.serialize(fast.values(queryset)))
+    return render
+
+
 @pytest.fixture
 def api_client():
     from rest_framework.test import APIClient
@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import IdempotencyKey
 
-# Register your models here.
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'response_status', 'locked_at', 'expires_at']
+    search_fields = ['key', 'user__username']
+    readonly_fields = ['fingerprint', 'response_body']
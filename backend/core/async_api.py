@@ -0,0 +1,65 @@
+"""
+Helpers for native async API views.
+
+DRF views are synchronous, so endpoints that spend most of their time on
+outbound I/O are written as plain Django async views. ``async_api_view``
+gives them the same JWT authentication, permission checks and JSON body
+handling as the rest of the API.
+"""
+import json
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+from users.authentication import CustomerJWTAuthentication
+
+
+def _authenticate(request):
+    result = CustomerJWTAuthentication().authenticate(request)
+    return result[0] if result else None
+
+
+def async_api_view(methods=('POST',), permission='authenticated'):
+    """
+    Decorate an async view taking ``(request, *args, **kwargs)``.
+
+    ``permission`` is ``'authenticated'``, ``'admin'`` or None (public).
+    The parsed JSON body is available as ``request.data``.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=405,
+                )
+
+            if permission is not None:
+                try:
+                    user = await sync_to_async(_authenticate)(request)
+                except AuthenticationFailed as exc:
+                    return JsonResponse({'detail': str(exc.detail)}, status=401)
+                if user is None:
+                    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+                if permission == 'admin' and not user.is_staff:
+                    return JsonResponse(
+                        {'detail': 'You do not have permission to perform this action.'},
+                        status=403,
+                    )
+                request.user = user
+
+            try:
+                request.data = json.loads(request.body) if request.body else {}
+            except ValueError:
+                return JsonResponse({'detail': 'JSON parse error.'}, status=400)
+            if not isinstance(request.data, dict):
+                return JsonResponse({'detail': 'Expected a JSON object.'}, status=400)
+
+            return await view(request, *args, **kwargs)
+
+        # Token-authenticated like the DRF views. Set the flag directly:
+        # Django 4.2's csrf_exempt would wrap the coroutine in a sync view.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
@@ -0,0 +1,77 @@
+import hashlib
+from django.utils.cache import parse_etags, patch_cache_control
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def _opaque(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Weak comparison of ``etag`` against an ``If-None-Match`` header, as
+    RFC 9110 prescribes for it. ``CompressionMiddleware`` turns strong ETags
+    into weak ones, so a strong comparison would never match again.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(_opaque(candidate) == _opaque(etag) for candidate in parse_etags(if_none_match))
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin answering ``If-None-Match`` on list and retrieve.
+
+    The ETag is derived from the request path, the negotiated media type and
+    the values returned by ``get_etag_validators()``, so a matching request
+    gets a ``304`` before the queryset is evaluated or serialized. A view
+    that returns no validators is served without an ETag.
+    """
+    conditional_actions = ('list', 'retrieve')
+
+    def get_etag_validators(self):
+        """Return cheap values that change whenever the response would."""
+        return []
+
+    def get_etag(self, request):
+        """The ETag of the response to ``request``, or ``None`` without validators."""
+        validators = list(self.get_etag_validators())
+        if not validators:
+            return None
+        parts = [
+            type(self).__name__,
+            request.get_full_path(),
+            getattr(request, 'accepted_media_type', ''),
+            *validators,
+        ]
+        digest = hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+        return f'W/"{digest}"'
+
+    def _etag_matches(self, request, etag):
+        return etag_matches(request.headers.get('If-None-Match'), etag)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        etag = getattr(self, '_response_etag', None)
+        if etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        self._response_etag = self.get_etag(request)
+        if self._response_etag and self._etag_matches(request, self._response_etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return handler(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        if 'list' not in self.conditional_actions:
+            return super().list(request, *args, **kwargs)
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' not in self.conditional_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self._conditional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,157 @@
+"""
+Publish/subscribe fan-out for the server-sent events stream.
+
+Publishers are ordinary (sync) Django code such as signal handlers; they call
+``publish_event()``. Subscribers are the async SSE views. Events travel
+through Redis pub/sub when ``REDIS_URL`` is configured, so every web and
+job worker process reaches every client. Without it an in-process broker is
+used, which only reaches clients connected to the same process; that is
+only good enough for a single development server, and settings require
+``REDIS_URL`` whenever ``DEBUG`` is off.
+"""
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+from django.conf import settings
+
+BROADCAST_CHANNEL = 'events:broadcast'
+USER_CHANNEL_PREFIX = 'events:user:'
+
+
+def user_channel(user_id):
+    return f'{USER_CHANNEL_PREFIX}{user_id}'
+
+
+class InProcessBroker:
+    """Fans events out to asyncio queues living in this process."""
+
+    queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return bool(self._subscribers.get(channel))
+
+    def has_user_subscribers(self):
+        with self._lock:
+            return any(channel.startswith(USER_CHANNEL_PREFIX) for channel in self._subscribers)
+
+    def publish(self, channel, message):
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, message)
+            except RuntimeError:
+                # The subscriber's event loop has already shut down.
+                pass
+
+    @staticmethod
+    def _put(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A client that stopped reading loses events rather than memory.
+            pass
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(entry)
+        try:
+            yield Subscription(entry[1].get)
+        finally:
+            with self._lock:
+                for channel in channels:
+                    subscribers = self._subscribers.get(channel)
+                    if subscribers is not None:
+                        subscribers.discard(entry)
+                        if not subscribers:
+                            del self._subscribers[channel]
+
+
+class RedisBroker:
+    """Fans events out through Redis pub/sub, across all worker processes."""
+
+    def __init__(self, url):
+        import redis
+
+        self._url = url
+        self._client = redis.Redis.from_url(url)
+
+    def has_subscribers(self, channel):
+        return True
+
+    def has_user_subscribers(self):
+        return bool(self._client.pubsub_channels(f'{USER_CHANNEL_PREFIX}*'))
+
+    def publish(self, channel, message):
+        self._client.publish(channel, json.dumps(message))
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self._url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*channels)
+
+        async def next_message():
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                if message is not None:
+                    return json.loads(message['data'])
+
+        try:
+            yield Subscription(next_message)
+        finally:
+            await pubsub.unsubscribe(*channels)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+class Subscription:
+    def __init__(self, getter):
+        self._getter = getter
+
+    async def get(self, timeout):
+        """Return the next event, or None if nothing arrived within ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self._getter(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = RedisBroker(settings.REDIS_URL) if settings.REDIS_URL else InProcessBroker()
+    return _broker
+
+
+def publish_event(event, data, user_id=None):
+    """
+    Send ``event`` to one user's streams, or to every stream when
+    ``user_id`` is None.
+    """
+    channel = user_channel(user_id) if user_id else BROADCAST_CHANNEL
+    broker = get_broker()
+    if broker.has_subscribers(channel):
+        broker.publish(channel, {'event': event, 'data': data})
+
+
+def format_sse(event, data):
+    payload = json.dumps(data, separators=(',', ':'), default=str)
+    return f'event: {event}\ndata: {payload}\n\n'
@@ -0,0 +1,135 @@
+"""
+Fast-path list serialization from ``values()`` rows.
+
+A ``ValuesSerializer`` mirrors one DRF serializer: it produces the same
+dicts, but from ``queryset.values(...)`` rows instead of model instances,
+with the per-field work worked out once per class. Plain columns are
+copied as they are, typed ones (decimals, datetimes) go through the DRF
+field's own ``to_representation``, and anything else is a ``get_<name>``
+method on the subclass. The parity tests keep each one in step with its
+DRF serializer.
+
+``FastListMixin`` uses it for a viewset's ``list`` action.
+"""
+from rest_framework import serializers
+from rest_framework.response import Response
+from .fieldsets import selected_fields
+
+# Fields whose representation is the column value itself.
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+
+class ValuesSerializer:
+    """
+    Serialize ``values()`` rows the way ``serializer_class`` serializes
+    instances.
+
+    ``sources`` maps an output name to its ``values()`` lookup when that is
+    not the DRF field's source; ``requires`` lists the lookups a
+    ``get_<name>`` method reads. As in DRF, a field reached through a
+    missing relation (``category.name`` without a category) is left out.
+    """
+    serializer_class = None
+    sources = {}
+    requires = {}
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        plan = self.get_plan()
+        fieldset = self.context.get('fieldset')
+        expandable = getattr(self.serializer_class.Meta, 'expandable_fields', ())
+        keep = set(selected_fields([entry[0] for entry in plan], fieldset, expandable))
+        self.plan = [entry for entry in plan if entry[0] in keep]
+        self.names = [entry[0] for entry in self.plan]
+
+    @classmethod
+    def get_plan(cls):
+        """``[(name, lookup, convert, omit_null, method_name)]``, built once per class."""
+        if '_plan' not in cls.__dict__:
+            plan = []
+            for name, field in cls.serializer_class().fields.items():
+                if field.write_only:
+                    continue
+                if hasattr(cls, f'get_{name}'):
+                    plan.append((name, None, None, False, f'get_{name}'))
+                    continue
+                # A method field without a ``get_<name>`` here is read from
+                # an annotation of the same name.
+                lookup = cls.sources.get(name) or '__'.join(field.source_attrs) or name
+                passthrough = isinstance(field, (serializers.SerializerMethodField, *PASSTHROUGH_FIELDS))
+                convert = None if passthrough else field.to_representation
+                plan.append((name, lookup, convert, len(field.source_attrs) > 1, None))
+            cls._plan = plan
+        return cls._plan
+
+    def get_annotations(self):
+        """Expressions to ``annotate()`` the queryset with, unless it already has them."""
+        return {}
+
+    def values(self, queryset):
+        """``queryset`` as the ``values()`` rows this serializer needs."""
+        annotations = {
+            name: expression for name, expression in self.get_annotations().items()
+            if name not in queryset.query.annotations
+        }
+        lookups = {'pk'}
+        for name, lookup, _, _, method_name in self.plan:
+            if method_name:
+                lookups.update(self.requires.get(name, ()))
+            else:
+                lookups.add(lookup)
+        names = sorted(lookup for lookup in lookups if lookup not in annotations)
+        queryset = queryset.prefetch_related(None)
+        if annotations:
+            queryset = queryset.annotate(**{
+                name: expression for name, expression in annotations.items() if name in lookups
+            })
+        return queryset.values(*names, *(name for name in annotations if name in lookups))
+
+    def prepare(self, rows):
+        """Hook to load whatever a page of rows needs in one go."""
+
+    def serialize(self, rows):
+        rows = list(rows)
+        self.prepare(rows)
+        data = []
+        for row in rows:
+            item = {}
+            for name, lookup, convert, omit_null, method_name in self.plan:
+                if method_name:
+                    item[name] = getattr(self, method_name)(row)
+                    continue
+                value = row[lookup]
+                if value is None:
+                    if omit_null:
+                        continue
+                    item[name] = None
+                else:
+                    item[name] = convert(value) if convert else value
+            data.append(item)
+        return data
+
+
+class FastListMixin:
+    """
+    ViewSet mixin serving ``list`` through ``fast_serializer_class`` when
+    the action's serializer is the one it mirrors.
+    """
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        fast_class = self.fast_serializer_class
+        if fast_class is None or self.get_serializer_class() is not fast_class.serializer_class:
+            return super().list(request, *args, **kwargs)
+
+        fast = fast_class(context=self.get_serializer_context())
+        queryset = fast.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast.serialize(page))
+        return Response(fast.serialize(queryset))
@@ -0,0 +1,202 @@
+"""
+Sparse fieldsets: ``?fields=`` and ``?expand=`` on read endpoints.
+
+``fields`` lists the keys to return; a dotted name reaches into a nested
+serializer (``items.quantity``). ``expand`` lists which embedded objects
+(a serializer's ``Meta.expandable_fields``) to include, e.g.
+``expand=customer_details,items.product_details``. An embedded object is
+returned when it is expanded or named in ``fields``. Without either
+parameter the full representation is returned, as before.
+
+Fields that were not asked for are removed from the serializer before
+anything is read, so their method fields and nested serializers never
+run, and ``SparseFieldsetMixin`` loads only the columns the remaining
+fields use. ``Meta.field_columns`` names what a method field (or a field
+with extra needs) reads from the model.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def parse_field_paths(value):
+    """``'id,items.quantity'`` -> ``{'id': {}, 'items': {'quantity': {}}}``."""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def get_fieldset(request):
+    """Return ``(fields, expand)`` trees from the query string, or ``None`` when neither is given."""
+    params = request.query_params
+    if 'fields' not in params and 'expand' not in params:
+        return None
+    fields = parse_field_paths(params['fields']) if 'fields' in params else None
+    return fields or None, parse_field_paths(params.get('expand', ''))
+
+
+def selected_fields(names, fieldset, expandable=()):
+    """The subset of ``names`` that ``fieldset`` keeps at the top level."""
+    if fieldset is None:
+        return list(names)
+    only, expand = fieldset
+    return [
+        name for name in names
+        if (name in expand or (only is not None and name in only))
+        or (name not in expandable and only is None)
+    ]
+
+
+def _nested(field):
+    """The serializer behind ``field`` (the child of a ``many=True`` field), if any."""
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin that drops fields according to a fieldset.
+
+    The top-level serializer takes the fieldset from ``context['fieldset']``
+    (set by ``SparseFieldsetMixin``); nested ones get their part of it from
+    their parent.
+    """
+    _fieldset = None
+
+    def _get_fieldset(self):
+        if self._fieldset is not None:
+            return self._fieldset
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return self.context.get('fieldset') if parent is None else None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self._get_fieldset()
+        if fieldset is None:
+            return fields
+
+        only, expand = fieldset
+        keep = selected_fields(fields, fieldset, getattr(self.Meta, 'expandable_fields', ()))
+        for name in list(fields):
+            if name not in keep:
+                del fields[name]
+
+        for name, field in fields.items():
+            nested = _nested(field)
+            if isinstance(nested, SparseFieldsMixin):
+                nested._fieldset = ((only or {}).get(name) or None, expand.get(name, {}))
+        return fields
+
+
+def _columns_for(model, path, columns, related, prefetch, nested=None):
+    """
+    Record what reading ``path`` from a ``model`` instance needs.
+
+    Returns ``False`` when the path is not a model field, in which case the
+    columns it touches are unknown.
+    """
+    attrs = path.split('.') if isinstance(path, str) else list(path)
+    try:
+        model_field = model._meta.get_field(attrs[0])
+    except FieldDoesNotExist:
+        return False
+    if model_field.one_to_many or model_field.many_to_many:
+        if nested is not None or attrs[0] not in prefetch:
+            prefetch[attrs[0]] = nested
+        return True
+    if not model_field.concrete:
+        return False
+    columns.add(model_field.name)
+    if model_field.is_relation and (len(attrs) > 1 or nested is not None):
+        if nested is not None or model_field.name not in related:
+            related[model_field.name] = nested
+    return True
+
+
+def _related_paths(tree, prefix=''):
+    for name, subtree in tree.items():
+        yield prefix + name
+        yield from _related_paths(subtree or {}, f'{prefix}{name}__')
+
+
+def restrict_queryset(queryset, serializer, defer_columns=True):
+    """
+    Narrow ``queryset`` to what ``serializer``'s (already pruned) fields read:
+    ``only()`` the columns they use, ``select_related`` the foreign keys they
+    follow and prefetch the reverse relations they list.
+
+    Columns are left alone when a field's needs are unknown (a method field
+    without a ``Meta.field_columns`` entry), since a deferred column would
+    cost one query per row.
+    """
+    model = queryset.model
+    overrides = getattr(getattr(serializer, 'Meta', None), 'field_columns', {})
+    columns = {model._meta.pk.name}
+    known = True
+    related, prefetch = {}, {}
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in overrides:
+            for path in overrides[name]:
+                known = _columns_for(model, path, columns, related, prefetch) and known
+        elif field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+            known = False
+        else:
+            known = _columns_for(model, field.source_attrs, columns, related, prefetch, _nested(field)) and known
+
+    for name, nested in prefetch.items():
+        if nested is not None:
+            related_model = model._meta.get_field(name).related_model
+            child = restrict_queryset(related_model._default_manager.all(), nested, defer_columns=False)
+            prefetch[name] = Prefetch(name, queryset=child)
+        else:
+            prefetch[name] = name
+
+    select = set()
+    for name, nested in related.items():
+        select.add(name)
+        if nested is not None:
+            # Follow the nested serializer's own foreign keys in the same join.
+            child = restrict_queryset(model._meta.get_field(name).related_model._default_manager.all(), nested)
+            select.update(f'{name}__{path}' for path in _related_paths(child.query.select_related or {}))
+
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch.values())
+    if known and defer_columns:
+        queryset = queryset.only(*sorted(columns))
+    return queryset
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin applying ``?fields=``/``?expand=`` to ``fieldset_actions``:
+    the serializer is pruned and the queryset narrowed to match.
+    """
+    fieldset_actions = ('list', 'retrieve')
+
+    def get_fieldset(self):
+        if getattr(self, 'action', None) not in self.fieldset_actions:
+            return None
+        return get_fieldset(self.request)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_fieldset() is None:
+            return queryset
+        return restrict_queryset(queryset, self.get_serializer())
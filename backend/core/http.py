@@ -0,0 +1,27 @@
+"""
+Pooled async HTTP client for outbound calls (PayPal, Open Food Facts).
+
+One ``httpx.AsyncClient`` is kept per event loop so connections (and TLS
+sessions) are reused across requests served by the same ASGI worker.
+"""
+import asyncio
+import weakref
+import httpx
+from django.conf import settings
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.OUTBOUND_HTTP_TIMEOUT, connect=settings.OUTBOUND_HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.OUTBOUND_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OUTBOUND_HTTP_MAX_KEEPALIVE,
+            ),
+        )
+        _clients[loop] = client
+    return client
@@ -0,0 +1,229 @@
+"""
+``Idempotency-Key`` support for unsafe endpoints that clients retry.
+
+The first request carrying a key claims a row in ``IdempotencyKey`` and runs
+normally; its response is stored against the key. A retry with the same key
+gets that stored response back without running the view again.
+
+A duplicate that arrives while the original is still running gets a 409 with
+``Retry-After`` straight away from sync views: under ASGI they share one
+thread per worker, so sleeping there would stall every other sync request.
+Async views wait for the original (up to ``IDEMPOTENCY_WAIT_TIMEOUT``) and
+replay its response.
+
+Only successful responses are stored. Error responses, whether returned or
+raised (4xx and 5xx alike), and unhandled exceptions release the key so the
+client can correct the request or retry for real. Requests without the
+header are unaffected.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Seconds between checks while waiting on an in-flight duplicate.
+POLL_INTERVAL = 0.1
+
+ACQUIRED = 'acquired'
+REPLAY = 'replay'
+MISMATCH = 'mismatch'
+IN_FLIGHT = 'in_flight'
+
+
+def request_fingerprint(request):
+    """Hash of what makes two requests "the same" for one key."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {key: values for key, values in data.lists()}
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method}|{request.path}|{body}'.encode()).hexdigest()
+
+
+def claim_key(user, key, fingerprint):
+    """
+    Try to claim ``key`` for ``user``.
+
+    Returns ``(outcome, record)`` where outcome is ``ACQUIRED`` (run the view),
+    ``REPLAY`` (send the stored response), ``MISMATCH`` (the key was used for
+    a different request) or ``IN_FLIGHT`` (the original is still running).
+    """
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user,
+                    key=key,
+                    fingerprint=fingerprint,
+                    locked_at=now,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                )
+            return ACQUIRED, record
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            # Released or purged between the insert and the read.
+            continue
+        if record.expires_at <= now:
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+            continue
+        if record.fingerprint != fingerprint:
+            return MISMATCH, record
+        if record.is_complete:
+            return REPLAY, record
+
+        stale_before = now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        if record.locked_at < stale_before:
+            # The original never finished (worker killed mid-request); take it over.
+            taken = IdempotencyKey.objects.filter(
+                pk=record.pk,
+                response_status__isnull=True,
+                locked_at=record.locked_at,
+            ).update(locked_at=now)
+            if taken:
+                record.locked_at = now
+                return ACQUIRED, record
+            continue
+        return IN_FLIGHT, record
+
+
+def store_response(record, status_code, body):
+    """Record the response for ``record``, or release the key on an error response."""
+    if status_code >= 400:
+        release_key(record)
+        return
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        response_status=status_code,
+        response_body=body,
+    )
+
+
+def release_key(record):
+    IdempotencyKey.objects.filter(pk=record.pk, response_status__isnull=True).delete()
+
+
+def purge_expired_keys():
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def _wait_deadline():
+    return time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+
+
+def _error_payload(outcome):
+    if outcome == MISMATCH:
+        detail = 'This Idempotency-Key was already used for a different request.'
+        return {'detail': detail}, status.HTTP_422_UNPROCESSABLE_ENTITY
+    detail = 'A request with this Idempotency-Key is still being processed.'
+    return {'detail': detail}, status.HTTP_409_CONFLICT
+
+
+def _get_key(request):
+    key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+    if key and request.user.is_authenticated:
+        return key
+    return None
+
+
+def idempotent(handler):
+    """
+    Decorate a DRF view method ``(self, request, ...)`` to honour
+    ``Idempotency-Key``.
+    """
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = _get_key(request)
+        if key is None:
+            return handler(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        outcome, record = claim_key(request.user, key, fingerprint)
+
+        if outcome == REPLAY:
+            data = json.loads(record.response_body) if record.response_body else None
+            return Response(data, status=record.response_status, headers={REPLAY_HEADER: 'true'})
+        if outcome != ACQUIRED:
+            payload, status_code = _error_payload(outcome)
+            headers = {'Retry-After': '1'} if outcome == IN_FLIGHT else None
+            return Response(payload, status=status_code, headers=headers)
+
+        try:
+            response = handler(self, request, *args, **kwargs)
+        except BaseException:
+            release_key(record)
+            raise
+        body = json.dumps(response.data, cls=JSONEncoder) if response.data is not None else ''
+        store_response(record, response.status_code, body)
+        return response
+    return wrapper
+
+
+def aidempotent(view):
+    """
+    Async counterpart of ``idempotent`` for views built with
+    ``core.async_api.async_api_view`` (apply it beneath that decorator).
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        key = _get_key(request)
+        if key is None:
+            return await view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse(
+                {'detail': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        deadline = _wait_deadline()
+        outcome, record = await sync_to_async(claim_key)(request.user, key, fingerprint)
+        while outcome == IN_FLIGHT and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            outcome, record = await sync_to_async(claim_key)(request.user, key, fingerprint)
+
+        if outcome == REPLAY:
+            response = HttpResponse(
+                record.response_body,
+                status=record.response_status,
+                content_type='application/json',
+            )
+            response[REPLAY_HEADER] = 'true'
+            return response
+        if outcome != ACQUIRED:
+            payload, status_code = _error_payload(outcome)
+            response = JsonResponse(payload, status=status_code)
+            if outcome == IN_FLIGHT:
+                response['Retry-After'] = '1'
+            return response
+
+        try:
+            response = await view(request, *args, **kwargs)
+        except BaseException:
+            await sync_to_async(release_key)(record)
+            raise
+        await sync_to_async(store_response)(record, response.status_code, response.content.decode())
+        return response
+    return wrapper
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from core.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete Idempotency-Key records whose replay window has expired.'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} expired idempotency key(s).'))
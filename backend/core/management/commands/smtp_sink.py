@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from core.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = 'Run a local SMTP server that prints the messages it receives instead of delivering them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, **options):
+        def show(sender, recipients, message):
+            attachments = [part.get_filename() for part in message.iter_attachments()]
+            self.stdout.write(
+                f"{sender} -> {', '.join(recipients)}: {message['Subject']}"
+                + (f" [{', '.join(attachments)}]" if attachments else '')
+            )
+
+        sink = SMTPSink(options['host'], options['port'], on_message=show)
+        self.stdout.write(f'SMTP sink listening on {sink.host}:{sink.port} (Ctrl+C to stop).')
+        try:
+            sink.serve_forever()
+        except KeyboardInterrupt:
+            pass
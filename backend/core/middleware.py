@@ -0,0 +1,165 @@
+"""
+Response compression for the API.
+
+``CompressionMiddleware`` compresses responses under ``COMPRESSION_PATHS``
+with Brotli when the ``brotli`` package is installed and the client
+accepts it, and with gzip otherwise. Small bodies (under
+``COMPRESSION_MIN_SIZE``), media types that do not shrink, and responses
+that already carry a ``Content-Encoding`` (e.g. ``?gzip=1`` exports) are
+sent as they are. Streaming responses, sync or async, are compressed chunk
+by chunk and each chunk is flushed, so exports keep streaming.
+
+Paths under ``COMPRESSION_EXCLUDE_PATHS`` are never compressed: token
+responses should not be compressed next to attacker-influenced input
+(BREACH).
+
+Static files are not handled here; WhiteNoise serves them precompressed.
+"""
+import re
+import zlib
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/problem+json',
+    'application/vnd.oai.openapi',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/',
+)
+
+_accept_re = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def accepted_encodings(header):
+    """``{coding: q}`` from an ``Accept-Encoding`` header."""
+    accepted = {}
+    for part in header.split(','):
+        match = _accept_re.match(part)
+        if match:
+            try:
+                accepted[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+    return accepted
+
+
+def choose_encoding(header):
+    """The best encoding we can produce for ``header``: ``'br'``, ``'gzip'`` or ``None``."""
+    accepted = accepted_encodings(header)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = None
+    for coding in candidates:
+        q = accepted.get(coding, accepted.get('*', 0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (coding, q)
+    return best[0] if best else None
+
+
+class _Gzip:
+    def __init__(self):
+        self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+COMPRESSORS = {'gzip': _Gzip, 'br': _Brotli}
+
+
+def compress(encoding, data):
+    compressor = COMPRESSORS[encoding]()
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_stream(encoding, chunks):
+    compressor = COMPRESSORS[encoding]()
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_stream(encoding, chunks):
+    compressor = COMPRESSORS[encoding]()
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def is_compressible(content_type):
+    media_type = content_type.split(';')[0].strip().lower()
+    return media_type.startswith(COMPRESSIBLE_TYPES) or media_type.endswith('+json')
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Negotiate ``Content-Encoding`` for API responses (see the module docstring)."""
+
+    def process_response(self, request, response):
+        path = request.path_info
+        if not path.startswith(tuple(settings.COMPRESSION_PATHS)):
+            return response
+        if path.startswith(tuple(settings.COMPRESSION_EXCLUDE_PATHS)):
+            return response
+        # Whatever we decide, the body depends on Accept-Encoding.
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.has_header('Content-Encoding') or not is_compressible(response.get('Content-Type', '')):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(encoding, response.streaming_content)
+            else:
+                response.streaming_content = compress_stream(encoding, response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = compress(encoding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body is a different representation of the same
+        # resource: a strong ETag must not match the uncompressed one.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
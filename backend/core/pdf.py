@@ -0,0 +1,61 @@
+"""
+Minimal PDF writer for plain-text documents (receipts, slips).
+
+Lines are set in Helvetica on A4 pages. Nothing time-dependent goes into
+the file, so the same text always produces the same bytes and the result
+can be stored under a hash of its content.
+"""
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+
+
+def _escape(text):
+    # The standard fonts use WinAnsiEncoding, i.e. cp1252.
+    raw = text.encode('cp1252', errors='replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def text_pdf(lines, title='', font_size=10):
+    """Return a PDF (bytes) showing ``lines``, one per row, paginated as needed."""
+    leading = round(font_size * 1.4)
+    per_page = (PAGE_HEIGHT - 2 * MARGIN) // leading
+    lines = list(lines) or ['']
+    pages = [lines[start:start + per_page] for start in range(0, len(lines), per_page)]
+
+    # Object numbers: 1 catalog, 2 page tree, 3 font, 4 info, then a
+    # (page, content stream) pair per page.
+    objects = {}
+    page_ids = []
+    for index, page_lines in enumerate(pages):
+        page_id, content_id = 5 + 2 * index, 6 + 2 * index
+        page_ids.append(page_id)
+        stream = b''.join([
+            b'BT\n/F1 %d Tf\n%d TL\n%d %d Td\n' % (font_size, leading, MARGIN, PAGE_HEIGHT - MARGIN - font_size),
+            *(b'(' + _escape(line) + b') Tj T*\n' for line in page_lines),
+            b'ET\n',
+        ])
+        objects[page_id] = (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>'
+            % (PAGE_WIDTH, PAGE_HEIGHT, content_id)
+        )
+        objects[content_id] = b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'endstream'
+
+    kids = b' '.join(b'%d 0 R' % page_id for page_id in page_ids)
+    objects[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[2] = b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % len(page_ids)
+    objects[3] = b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'
+    objects[4] = b'<< /Title (' + _escape(title) + b') >>'
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b'%d 0 obj\n' % number + objects[number] + b'\nendobj\n'
+    xref_at = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for number in sorted(objects):
+        out += b'%010d 00000 n \n' % offsets[number]
+    out += b'trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_at)
+    return bytes(out)
@@ -0,0 +1,43 @@
+"""
+JSON rendering through orjson when it is installed.
+
+``FastJSONRenderer`` produces the same output as DRF's ``JSONRenderer`` for
+compact, UTF-8 responses (the project's settings). Datetimes, dates, UUIDs
+and dicts with non-string keys are encoded natively by orjson. Anything
+else, Decimal included, goes through DRF's own encoder. Indented output
+(the browsable API, ``Accept: application/json; indent=4``) and
+integers beyond 64 bits fall back to the stock renderer. So does
+everything when orjson is not installed. One difference: orjson writes
+NaN and infinity as ``null`` where the stock renderer raises.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+class FastJSONRenderer(JSONRenderer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._default = self.encoder_class().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self._default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, so the output stays valid JavaScript.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,37 @@
+import json
+from django.http import HttpResponse
+
+
+class PrerenderedJSONResponse(HttpResponse):
+    """
+    A JSON response whose body is already encoded, for views that assemble
+    it from stored JSON fragments instead of serializing Python objects.
+
+    ``.data`` decodes the body on access, matching DRF's ``Response`` for
+    callers (and tests) that read it.
+    """
+
+    def __init__(self, content, status=200, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content, status=status, **kwargs)
+
+    @property
+    def data(self):
+        return json.loads(self.content)
+
+
+def json_object(fields, raw_fields=None):
+    """
+    Encode ``fields`` as a JSON object, adding ``raw_fields`` whose values
+    are already-encoded JSON (``bytes`` or ``str``) inserted verbatim.
+    """
+    parts = [json.dumps(fields, separators=(',', ':'))[1:-1].encode()] if fields else []
+    for name, raw in (raw_fields or {}).items():
+        raw = raw.encode() if isinstance(raw, str) else raw
+        parts.append(json.dumps(name).encode() + b':' + raw)
+    return b'{' + b','.join(parts) + b'}'
+
+
+def json_array(raw_items):
+    """Join already-encoded JSON values into a JSON array."""
+    return b'[' + b','.join(item.encode() if isinstance(item, str) else item for item in raw_items) + b']'
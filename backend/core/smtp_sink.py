@@ -0,0 +1,110 @@
+"""
+A local SMTP server that accepts every message and keeps it in memory.
+
+Point ``EMAIL_HOST``/``EMAIL_PORT`` at it to see outgoing mail during
+development (``manage.py smtp_sink``), or start one in a test to exercise
+the real SMTP backend end to end. It speaks just enough SMTP for
+``smtplib``: no TLS and no authentication.
+"""
+import socketserver
+import threading
+from email import message_from_bytes, policy
+
+
+class _SessionHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        sink = self.server.sink
+        sink._connected()
+        self.reply('220 localhost SMTP sink')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', errors='replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command.partition(':')[2].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.partition(':')[2].strip().strip('<>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = bytearray()
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    if data_line.startswith(b'..'):
+                        data_line = data_line[1:]
+                    data += data_line
+                sink._received(sender, recipients, bytes(data))
+                self.reply('250 OK')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """
+    ``with SMTPSink() as sink:`` serves on a free local port (``sink.port``).
+    ``sink.messages`` holds the parsed ``email.message.EmailMessage``
+    objects and ``sink.connections`` counts SMTP sessions.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, on_message=None):
+        self.messages = []
+        self.connections = 0
+        self.on_message = on_message
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _SessionHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+
+    def _connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def _received(self, sender, recipients, data):
+        message = message_from_bytes(data, policy=policy.default)
+        with self._lock:
+            self.messages.append(message)
+        if self.on_message:
+            self.on_message(sender, recipients, message)
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
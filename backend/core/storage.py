@@ -0,0 +1,37 @@
+"""
+Storage for content-addressed files (thumbnails, mirrored images).
+
+Their names include a hash of the content, so a name never points at
+different bytes and clients and CDNs may cache them forever. On S3 they are
+written with a far-future ``Cache-Control``; on local media that header is
+up to the web server serving ``MEDIA_URL``.
+
+The storage is built once per process: constructing an ``S3Boto3Storage``
+(and the boto3 session behind its ``url()``) is far too slow to do per row.
+"""
+import functools
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@functools.cache
+def immutable_storage():
+    """The default storage, configured for files that never change."""
+    if getattr(settings, 'DEFAULT_FILE_STORAGE', '').endswith('S3Boto3Storage'):
+        from storages.backends.s3boto3 import S3Boto3Storage
+
+        return S3Boto3Storage(object_parameters={
+            **settings.AWS_S3_OBJECT_PARAMETERS,
+            'CacheControl': IMMUTABLE_CACHE_CONTROL,
+        })
+    return default_storage
+
+
+@receiver(setting_changed)
+def reset_immutable_storage(setting, **kwargs):
+    if setting in ('DEFAULT_FILE_STORAGE', 'STORAGES', 'AWS_S3_OBJECT_PARAMETERS', 'MEDIA_ROOT', 'MEDIA_URL'):
+        immutable_storage.cache_clear()
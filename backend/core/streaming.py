@@ -0,0 +1,63 @@
+"""
+Streaming responses that keep memory flat under both WSGI and ASGI.
+
+Django 4.2 buffers a synchronous iterator completely before sending it
+from the ASGI handler, and buffers an asynchronous one under WSGI. We
+therefore pick the iterator type to match the server. Under ASGI the sync
+producer (usually a database cursor) is advanced in batches on the sync
+thread.
+"""
+import itertools
+import zlib
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+# Aim for roughly this many bytes per chunk handed to the server.
+CHUNK_BYTES = 64 * 1024
+
+# Chunks pulled from the sync producer per hop to the sync thread (ASGI).
+ASYNC_BATCH = 16
+
+
+def buffered(pieces, chunk_bytes=CHUNK_BYTES):
+    """Join small ``bytes`` pieces into chunks of about ``chunk_bytes``."""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_bytes:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(chunks, level=6):
+    """Compress a stream of ``bytes`` chunks into a gzip stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def _aiterate(iterator):
+    next_batch = sync_to_async(lambda: list(itertools.islice(iterator, ASYNC_BATCH)))
+    while True:
+        batch = await next_batch()
+        if not batch:
+            return
+        for chunk in batch:
+            yield chunk
+
+
+def stream_response(request, chunks, content_type, filename=None):
+    """Wrap an iterator of ``bytes`` in a ``StreamingHttpResponse`` suited to the server."""
+    iterator = iter(chunks)
+    if 'wsgi.version' not in request.META:
+        iterator = _aiterate(iterator)
+    response = StreamingHttpResponse(iterator, content_type=content_type)
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
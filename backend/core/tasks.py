@@ -0,0 +1,7 @@
+from jobs.queue import task
+from .idempotency import purge_expired_keys
+
+
+@task('core.purge_idempotency_keys', every=3600)
+def purge_idempotency_keys():
+    purge_expired_keys()
@@ -1,3 +1,408 @@
-from django.test import TestCase
+import pytest
+import asyncio
+import gzip
+import io
+import json
+import re
+import time
+import uuid
+from datetime import timedelta, date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.test import AsyncClient, RequestFactory
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken
+from core import middleware
+from core.conditional import ConditionalGetMixin
+from core.events import InProcessBroker
+from core.middleware import acompress_stream
+from core.models import IdempotencyKey
+from core.parsers import FastJSONParser
+from core.pdf import text_pdf
+from core.renderers import FastJSONRenderer
+from core.streaming import buffered, gzipped, stream_response
+from core.versioning import bump_version, get_version
+from products.models import Product
+from products.views import ProductViewSet
+from users.models import Notification
 
-# Create your tests here.
+
+class TestVersioning:
+    def test_bump_changes_version(self):
+        before = get_version('scope-a')
+        bump_version('scope-a')
+        assert get_version('scope-a') != before
+
+    def test_scopes_are_independent(self):
+        other = get_version('scope-b')
+        bump_version('scope-a')
+        assert get_version('scope-b') == other
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    def test_list_returns_etag_and_304(self, authenticated_client, product):
+        response = authenticated_client.get('/api/products/')
+        assert response.status_code == 200
+        etag = response['ETag']
+
+        response = authenticated_client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response['ETag'] == etag
+
+    def test_write_invalidates_etag(self, authenticated_client, product):
+        etag = authenticated_client.get('/api/categories/')['ETag']
+
+        product.category.description = 'Updated'
+        product.category.save()
+
+        response = authenticated_client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+
+    def test_304_skips_queryset_evaluation(self, authenticated_client, product, django_assert_max_num_queries):
+        etag = authenticated_client.get(f'/api/products/{product.id}/')['ETag']
+        # Only the running-promotions lookup used by the validator remains.
+        with django_assert_max_num_queries(1):
+            response = authenticated_client.get(f'/api/products/{product.id}/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+    def test_notification_etag_is_per_user(self, authenticated_client, staff_user, user):
+        etag = authenticated_client.get('/api/notifications/')['ETag']
+        Notification.objects.create(user=staff_user, title='Staff only', message='...')
+        assert authenticated_client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        Notification.objects.create(user=user, title='Yours', message='...')
+        assert authenticated_client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_view_without_validators_skips_the_etag(self, authenticated_client, product, monkeypatch):
+        monkeypatch.setattr(ProductViewSet, 'get_etag_validators', ConditionalGetMixin.get_etag_validators)
+        response = authenticated_client.get('/api/products/', HTTP_IF_NONE_MATCH='*')
+        assert response.status_code == 200
+        assert not response.has_header('ETag')
+
+
+class TestInProcessBroker:
+    def test_published_event_reaches_subscriber(self):
+        broker = InProcessBroker()
+
+        async def scenario():
+            async with broker.subscribe(['events:user:1']) as subscription:
+                assert broker.has_subscribers('events:user:1')
+                broker.publish('events:user:1', {'event': 'ping', 'data': {}})
+                broker.publish('events:user:2', {'event': 'other', 'data': {}})
+                first = await subscription.get(timeout=1)
+                second = await subscription.get(timeout=0.05)
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert first == {'event': 'ping', 'data': {}}
+        assert second is None
+        assert not broker.has_subscribers('events:user:1')
+
+
+@pytest.mark.django_db(transaction=True)
+class TestEventStream:
+    def _token(self, user):
+        return str(AccessToken.for_user(user))
+
+    def test_requires_authentication(self):
+        async def request():
+            return await AsyncClient().get('/api/events/')
+
+        assert async_to_sync(request)().status_code == 401
+
+    def test_rejected_under_wsgi(self, authenticated_client):
+        response = authenticated_client.get('/api/events/')
+        assert response.status_code == 501
+
+    def test_streams_invoice_status_changes(self, invoice):
+        def mark_paid():
+            invoice.status = 'paid'
+            invoice.save(update_fields=['status'])
+
+        async def scenario():
+            response = await AsyncClient().get(f'/api/events/?token={self._token(invoice.customer.user)}')
+            assert response.status_code == 200
+            assert response['Content-Type'] == 'text/event-stream'
+            chunks = response.streaming_content
+            assert (await anext(chunks)).startswith(b'retry:')
+            assert b'event: ready' in await anext(chunks)
+            await sync_to_async(mark_paid)()
+            event = await anext(chunks)
+            await chunks.aclose()
+            return event
+
+        event = async_to_sync(scenario)()
+        assert b'event: invoice.status' in event
+        assert b'"status":"paid"' in event
+
+    def _events_after_ready(self, url):
+        async def scenario():
+            response = await AsyncClient().get(url)
+            chunks = response.streaming_content
+            await anext(chunks)
+            await anext(chunks)
+            return [chunk async for chunk in chunks]
+
+        return async_to_sync(scenario)()
+
+    def test_stream_closes_when_the_token_expires(self, user):
+        token = AccessToken.for_user(user)
+        token.set_exp(lifetime=timedelta(seconds=1))
+        events = self._events_after_ready(f'/api/events/?token={token}')
+        assert b'event: reauthenticate' in events[-1]
+        assert b'token_expired' in events[-1]
+
+    def test_stream_closes_when_the_user_is_deactivated(self, user, monkeypatch):
+        monkeypatch.setattr('core.views.HEARTBEAT_SECONDS', 0.05)
+        url = f'/api/events/?token={self._token(user)}'
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        # Authenticated before the change reaches the stream's next check.
+        monkeypatch.setattr('core.views._authenticate_stream', lambda request: (user, AccessToken.for_user(user)))
+        events = self._events_after_ready(url)
+        assert b'user_inactive' in events[-1]
+
+
+@pytest.mark.django_db
+class TestIdempotencyKeys:
+    def _process(self, client, invoice, key, method='card'):
+        return client.post(
+            '/api/payments/process',
+            {'orderId': str(invoice.id), 'paymentMethod': method},
+            format='json',
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_first_response(self, authenticated_client, invoice):
+        first = self._process(authenticated_client, invoice, 'key-1')
+        assert first.status_code == 200
+
+        # Reopen the invoice: a replayed retry must not process it again.
+        invoice.status = 'pending'
+        invoice.save(update_fields=['status'])
+
+        retry = self._process(authenticated_client, invoice, 'key-1')
+        assert retry.status_code == 200
+        assert retry['Idempotent-Replayed'] == 'true'
+        assert retry.json() == first.json()
+        invoice.refresh_from_db()
+        assert invoice.status == 'pending'
+
+    def test_key_reused_for_different_request_is_rejected(self, authenticated_client, invoice):
+        self._process(authenticated_client, invoice, 'key-1')
+        response = self._process(authenticated_client, invoice, 'key-1', method='cash')
+        assert response.status_code == 422
+
+    def test_keys_are_scoped_per_user(self, authenticated_client, invoice, staff_user):
+        IdempotencyKey.objects.create(
+            user=staff_user,
+            key='key-1',
+            fingerprint='other',
+            locked_at=timezone.now(),
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        response = self._process(authenticated_client, invoice, 'key-1')
+        assert response.status_code == 200
+        assert 'Idempotent-Replayed' not in response
+
+    def test_duplicate_of_in_flight_request_conflicts_after_wait(
+        self, authenticated_client, invoice, user, settings
+    ):
+        settings.IDEMPOTENCY_WAIT_TIMEOUT = 0
+        first = self._process(authenticated_client, invoice, 'key-1')
+        record = IdempotencyKey.objects.get(user=user, key='key-1')
+        IdempotencyKey.objects.filter(pk=record.pk).update(response_status=None, locked_at=timezone.now())
+
+        response = self._process(authenticated_client, invoice, 'key-1')
+        assert first.status_code == 200
+        assert response.status_code == 409
+        assert response['Retry-After'] == '1'
+
+    def test_sync_view_does_not_sleep_on_in_flight_duplicate(
+        self, authenticated_client, invoice, user, settings, monkeypatch
+    ):
+        settings.IDEMPOTENCY_WAIT_TIMEOUT = 10
+        self._process(authenticated_client, invoice, 'key-1')
+        IdempotencyKey.objects.filter(user=user, key='key-1').update(response_status=None, locked_at=timezone.now())
+
+        def no_sleep(seconds):
+            raise AssertionError('sync views must not sleep')
+
+        monkeypatch.setattr(time, 'sleep', no_sleep)
+        response = self._process(authenticated_client, invoice, 'key-1')
+        assert response.status_code == 409
+        assert response['Retry-After'] == '1'
+
+    def test_error_responses_release_the_key(self, authenticated_client, invoice, user):
+        returned = authenticated_client.post(
+            '/api/payments/process', {'paymentMethod': 'card'}, format='json', HTTP_IDEMPOTENCY_KEY='key-1',
+        )
+        assert returned.status_code == 400
+        raised = authenticated_client.post(
+            '/api/invoices/', {'items': 'nope'}, format='json', HTTP_IDEMPOTENCY_KEY='key-2',
+        )
+        assert raised.status_code == 400
+        assert not IdempotencyKey.objects.filter(user=user).exists()
+
+        response = self._process(authenticated_client, invoice, 'key-1')
+        assert response.status_code == 200
+
+    def test_abandoned_request_is_taken_over(self, authenticated_client, invoice, user):
+        self._process(authenticated_client, invoice, 'key-1')
+        invoice.status = 'pending'
+        invoice.save(update_fields=['status'])
+        IdempotencyKey.objects.filter(user=user, key='key-1').update(
+            response_status=None,
+            locked_at=timezone.now() - timedelta(hours=1),
+        )
+
+        response = self._process(authenticated_client, invoice, 'key-1')
+        assert response.status_code == 200
+        assert 'Idempotent-Replayed' not in response
+        invoice.refresh_from_db()
+        assert invoice.status == 'paid'
+
+    def test_purge_command_removes_expired_keys(self, user):
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            user=user, key='old', fingerprint='x', locked_at=now, expires_at=now - timedelta(seconds=1),
+        )
+        IdempotencyKey.objects.create(
+            user=user, key='new', fingerprint='x', locked_at=now, expires_at=now + timedelta(days=1),
+        )
+        call_command('purge_idempotency_keys')
+        assert list(IdempotencyKey.objects.values_list('key', flat=True)) == ['new']
+
+
+class TestStreaming:
+    def test_gzipped_round_trip(self):
+        pieces = [f'line {i}\n'.encode() for i in range(5000)]
+        body = b''.join(gzipped(buffered(pieces, chunk_bytes=1024)))
+        assert gzip.decompress(body) == b''.join(pieces)
+
+    def test_asgi_requests_get_an_async_iterator(self):
+        request = RequestFactory().get('/')
+        del request.META['wsgi.version']
+        response = stream_response(request, iter([b'a', b'b']), 'text/plain')
+        assert response.is_async
+
+        async def collect():
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        assert async_to_sync(collect)() == b'ab'
+
+
+class TestTextPdf:
+    def test_paginates_and_indexes_objects(self):
+        pdf = text_pdf([f'Line {n} (café)' for n in range(120)], title='Test')
+        assert pdf.startswith(b'%PDF-1.4') and pdf.endswith(b'%%EOF\n')
+        assert b'/Count 3' in pdf
+        assert b'(Line 0 \\(caf\xe9\\)) Tj' in pdf
+
+        xref_at = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+        entries = pdf[xref_at:].split(b'\n')[3:]
+        for number in range(1, 11):
+            offset = int(entries[number - 1][:10])
+            assert pdf[offset:].startswith(b'%d 0 obj' % number)
+
+    def test_same_text_gives_same_bytes(self):
+        assert text_pdf(['a', 'b']) == text_pdf(['a', 'b'])
+
+
+class TestFastJSON:
+    def _payload(self):
+        return {
+            'price': Decimal('2.50'),
+            'created_at': datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=dt_timezone.utc),
+            'day': date(2024, 5, 1),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'name': 'Crème brûlée  ',
+            'counts': {1: 2},
+            'items': [{'quantity': 3, 'ok': True, 'note': None}],
+        }
+
+    def test_matches_drf_renderer(self):
+        pytest.importorskip('orjson')
+
+        payload = self._payload()
+        assert FastJSONRenderer().render(payload) == JSONRenderer().render(payload)
+        assert FastJSONRenderer().render(None) == b''
+
+    def test_indented_output_uses_stock_renderer(self):
+        media_type = 'application/json; indent=2'
+        payload = self._payload()
+        assert FastJSONRenderer().render(payload, media_type) == JSONRenderer().render(payload, media_type)
+
+    def test_parser(self):
+        parser = FastJSONParser()
+        assert parser.parse(io.BytesIO('{"a": [1, 2.5, "é"]}'.encode())) == {'a': [1, 2.5, 'é']}
+        with pytest.raises(ParseError):
+            parser.parse(io.BytesIO(b'{"a": NaN}'))
+        with pytest.raises(ParseError):
+            parser.parse(io.BytesIO(b'{"a":'))
+
+
+@pytest.mark.django_db
+class TestCompression:
+    @pytest.fixture
+    def catalog(self, category):
+        Product.objects.bulk_create([
+            Product(name=f'Sparkling water {n}', price=1, category=category, barcode=f'300{n}') for n in range(20)
+        ])
+
+    def test_large_json_is_gzipped(self, authenticated_client, catalog):
+        response = authenticated_client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        assert response['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response['Vary']
+        assert int(response['Content-Length']) == len(response.content)
+        assert json.loads(gzip.decompress(response.content))['count'] == 20
+
+        plain = authenticated_client.get('/api/products/')
+        assert not plain.has_header('Content-Encoding')
+        assert len(plain.content) > 4 * len(response.content)
+
+    def test_small_and_excluded_responses_are_left_alone(self, authenticated_client, user, settings):
+        response = authenticated_client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        assert not response.has_header('Content-Encoding')
+
+        settings.COMPRESSION_MIN_SIZE = 0
+        response = authenticated_client.get('/api/auth/me/', HTTP_ACCEPT_ENCODING='gzip')
+        assert response.status_code == 200
+        assert not response.has_header('Content-Encoding')
+
+    def test_streaming_export_is_compressed_per_chunk(self, staff_client, catalog):
+        response = staff_client.get('/api/reports/export/products/', HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert not response.has_header('Content-Length')
+        text = gzip.decompress(b''.join(response.streaming_content)).decode()
+        assert text.count('Sparkling water') == 20
+
+        response = staff_client.get('/api/reports/export/products/?gzip=1', HTTP_ACCEPT_ENCODING='gzip')
+        assert not response.has_header('Content-Encoding')
+
+    def test_async_stream(self):
+        async def chunks():
+            yield b'{"id": 1}\n' * 50
+            yield b'{"id": 2}\n'
+
+        async def collect():
+            return b''.join([chunk async for chunk in acompress_stream('gzip', chunks())])
+
+        assert gzip.decompress(asyncio.run(collect())) == b'{"id": 1}\n' * 50 + b'{"id": 2}\n'
+
+    def test_choose_encoding(self, monkeypatch):
+        monkeypatch.setattr(middleware, 'brotli', None)
+        assert middleware.choose_encoding('gzip, deflate, br') == 'gzip'
+        assert middleware.choose_encoding('br') is None
+        assert middleware.choose_encoding('gzip;q=0, identity') is None
+        assert middleware.choose_encoding('*') == 'gzip'
+        assert middleware.choose_encoding('') is None
+
+        monkeypatch.setattr(middleware, 'brotli', object())
+        assert middleware.choose_encoding('gzip, br') == 'br'
+        assert middleware.choose_encoding('gzip;q=1, br;q=0.5') == 'gzip'
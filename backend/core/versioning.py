@@ -0,0 +1,41 @@
+"""
+Cache-backed version counters used to build cheap response validators.
+
+Each scope (e.g. ``catalog``) holds an integer that is bumped whenever data
+in that scope is written. Counters start from the current time in
+nanoseconds, so a counter that is evicted from the cache never comes back
+with a value a client has already seen.
+
+The counters only work if every process reads the same cache: with several
+web workers plus the job worker, a per-process cache would leave the other
+processes validating stale responses forever. Settings therefore require
+``REDIS_URL`` whenever ``DEBUG`` is off.
+"""
+import time
+from django.core.cache import cache
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def get_version(scope):
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(*scopes):
+    return [get_version(scope) for scope in scopes]
+
+
+def bump_version(*scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
@@ -1,3 +1,94 @@
-from django.shortcuts import render
+import time
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from users.authentication import CustomerJWTAuthentication
+from .events import BROADCAST_CHANNEL, format_sse, get_broker, user_channel
 
-# Create your views here.
+# Comment lines sent when idle so proxies and clients keep the connection open.
+HEARTBEAT_SECONDS = 15
+
+
+def _authenticate_stream(request):
+    """
+    Return ``(user, validated token)`` from the Authorization header, or
+    from ``?token=`` for EventSource clients that cannot set headers, or
+    ``None``.
+    """
+    authenticator = CustomerJWTAuthentication()
+    raw_token = request.GET.get('token')
+    if raw_token:
+        validated_token = authenticator.get_validated_token(raw_token)
+        return authenticator.get_user(validated_token), validated_token
+    return authenticator.authenticate(request)
+
+
+def _still_authorized(validated_token):
+    """Whether the token's user still exists and is active (uses the user snapshot cache)."""
+    try:
+        CustomerJWTAuthentication().get_user(validated_token)
+    except (AuthenticationFailed, InvalidToken):
+        return False
+    return True
+
+
+async def event_stream(request):
+    """
+    Server-sent events stream of invoice status changes and notifications
+    for the authenticated user.
+
+    **Events:**
+    - invoice.status: `{invoiceId, invoiceNumber, status, paidAt}`
+    - notification: the notification payload as returned by `/api/notifications/`
+    - reauthenticate: `{reason}`, sent just before the stream is closed
+      because the access token expired or the account was deactivated.
+      Reconnect with a fresh token.
+
+    Send the access token in the Authorization header. `?token=` is only
+    for browser EventSource clients, which cannot set headers: the token
+    then ends up in access and proxy logs, so it is only valid for the
+    access token's short lifetime.
+
+    Must be served by the ASGI application; under WSGI a long-lived stream
+    would pin a worker.
+    """
+    if 'wsgi.version' in request.META:
+        return JsonResponse(
+            {'detail': 'The event stream is only available on the ASGI server.'},
+            status=501,
+        )
+
+    try:
+        authenticated = await sync_to_async(_authenticate_stream)(request)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        authenticated = None
+    if authenticated is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    user, validated_token = authenticated
+    expires_at = validated_token['exp']
+
+    channels = [user_channel(user.pk), BROADCAST_CHANNEL]
+
+    async def stream():
+        async with get_broker().subscribe(channels) as subscription:
+            yield 'retry: 5000\n\n'
+            yield format_sse('ready', {'userId': user.pk})
+            while True:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    yield format_sse('reauthenticate', {'reason': 'token_expired'})
+                    return
+                message = await subscription.get(timeout=min(HEARTBEAT_SECONDS, remaining))
+                if message is not None:
+                    yield format_sse(message['event'], message['data'])
+                elif time.time() < expires_at:
+                    if not await sync_to_async(_still_authorized)(validated_token):
+                        yield format_sse('reauthenticate', {'reason': 'user_inactive'})
+                        return
+                    yield ': keepalive\n\n'
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Invoice, InvoiceItem
+from .models import Invoice, InvoiceItem, ReceiptEmail
 
 
 class InvoiceItemInline(admin.TabularInline):
@@ -38,3 +38,11 @@ class InvoiceItemAdmin(admin.ModelAdmin):
     list_display = ['invoice', 'product_name', 'quantity', 'unit_price', 'total_price']
     list_filter = ['created_at']
     search_fields = ['product_name', 'invoice__invoice_number']
+
+
+@admin.register(ReceiptEmail)
+class ReceiptEmailAdmin(admin.ModelAdmin):
+    list_display = ['invoice', 'email', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['email', 'invoice__invoice_number']
+    readonly_fields = ['batch', 'claimed_at', 'last_error']
@@ -0,0 +1,210 @@
+"""
+Async PayPal endpoints.
+
+These views wait on PayPal for most of their run time, so they are native
+async views: under the ASGI server a single worker can keep many PayPal
+calls in flight instead of blocking a thread per call.
+"""
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from core.async_api import async_api_view
+from core.idempotency import aidempotent
+from users.authentication import get_request_customer
+from .models import Invoice
+from .paypal import aget_paypal_access_token, paypal_error_payload, paypal_post
+
+
+async def _get_invoice_for_request(request, pk):
+    queryset = Invoice.objects.all()
+    if not request.user.is_staff:
+        customer = await sync_to_async(get_request_customer)(request)
+        if not customer:
+            return None
+        queryset = queryset.filter(customer=customer)
+    return await queryset.filter(pk=pk).afirst()
+
+
+def _not_found():
+    return JsonResponse({'detail': 'Not found.'}, status=404)
+
+
+def _paypal_error(exc, fallback_message):
+    payload, status_code = paypal_error_payload(exc, fallback_message)
+    return JsonResponse(payload, status=status_code)
+
+
+@async_api_view()
+async def create_paypal_order(request, pk):
+    invoice = await _get_invoice_for_request(request, pk)
+    if invoice is None:
+        return _not_found()
+    if invoice.status == 'paid':
+        return JsonResponse({'detail': 'Invoice already paid.'}, status=400)
+    try:
+        token = await aget_paypal_access_token()
+        return_url = request.build_absolute_uri("/api/paypal/return/")
+        cancel_url = request.build_absolute_uri("/api/paypal/cancel/")
+        payload = {
+            "intent": "CAPTURE",
+            "purchase_units": [
+                {
+                    "reference_id": invoice.invoice_number,
+                    "custom_id": str(invoice.id),
+                    "amount": {
+                        "currency_code": "EUR",
+                        "value": f"{invoice.total_amount:.2f}"
+                    },
+                    "description": f"Invoice {invoice.invoice_number}"
+                }
+            ],
+            "payment_source": {
+                "paypal": {
+                    "experience_context": {
+                        "landing_page": "LOGIN",
+                        "shipping_preference": "NO_SHIPPING",
+                        "user_action": "PAY_NOW",
+                        "return_url": return_url,
+                        "cancel_url": cancel_url,
+                    }
+                }
+            },
+        }
+
+        response = await paypal_post(
+            "/v2/checkout/orders",
+            token,
+            json=payload,
+            headers={"Prefer": "return=representation"},
+        )
+        response.raise_for_status()
+        data = response.json()
+    except httpx.HTTPError as exc:
+        return _paypal_error(exc, 'PayPal order creation failed')
+
+    links = data.get('links') or []
+    approval_link = next(
+        (
+            link.get('href')
+            for link in links
+            if (link.get('rel') or '').lower() in ['approve', 'payer-action']
+        ),
+        ''
+    )
+    if not approval_link and data.get('id'):
+        checkout_host = 'https://www.sandbox.paypal.com'
+        if 'sandbox' not in (settings.PAYPAL_BASE_URL or '').lower():
+            checkout_host = 'https://www.paypal.com'
+        approval_link = f"{checkout_host}/checkoutnow?token={data.get('id')}"
+    if approval_link:
+        data['approval_url'] = approval_link
+
+    invoice.payment_method = 'paypal'
+    invoice.status = 'pending'
+    invoice.paypal_transaction_id = data.get('id', '')
+    await invoice.asave(update_fields=['payment_method', 'status', 'paypal_transaction_id'])
+
+    return JsonResponse(data, status=200)
+
+
+@async_api_view()
+@aidempotent
+async def capture_paypal_order(request, pk):
+    invoice = await _get_invoice_for_request(request, pk)
+    if invoice is None:
+        return _not_found()
+    order_id = request.data.get('order_id') or invoice.paypal_transaction_id
+    if not order_id:
+        return JsonResponse({'detail': 'PayPal order id is required.'}, status=400)
+    try:
+        token = await aget_paypal_access_token()
+        capture_path = f"/v2/checkout/orders/{order_id}/capture"
+        response = await paypal_post(
+            capture_path,
+            token,
+            json={},
+            headers={"Prefer": "return=representation"},
+        )
+
+        # Sandbox sometimes rejects the explicit empty JSON payload.
+        # Retry with an empty body when that specific validation error occurs.
+        if (
+            response.status_code in (400, 422)
+            and 'payload is not supported' in (response.text or '').lower()
+        ):
+            response = await paypal_post(
+                capture_path,
+                token,
+                headers={"Prefer": "return=representation"},
+            )
+
+        response.raise_for_status()
+        data = response.json()
+    except httpx.HTTPError as exc:
+        return _paypal_error(exc, 'PayPal order capture failed')
+
+    payer = data.get('payer', {})
+    payer_email = payer.get('email_address', '')
+
+    invoice.status = 'paid'
+    invoice.paid_at = timezone.now()
+    invoice.paypal_transaction_id = order_id
+    invoice.paypal_payer_email = payer_email
+    await invoice.asave(update_fields=['status', 'paid_at', 'paypal_transaction_id', 'paypal_payer_email'])
+
+    return JsonResponse(data, status=200)
+
+
+@async_api_view(permission=None)
+async def paypal_webhook(request):
+    if not settings.PAYPAL_WEBHOOK_ID:
+        return JsonResponse({'detail': 'PayPal webhook not configured.'}, status=400)
+
+    headers = request.headers
+    try:
+        token = await aget_paypal_access_token()
+    except httpx.HTTPError as exc:
+        return JsonResponse({'detail': f'PayPal token error: {str(exc)}'}, status=502)
+    payload = {
+        "auth_algo": headers.get('PayPal-Auth-Algo'),
+        "cert_url": headers.get('PayPal-Cert-Url'),
+        "transmission_id": headers.get('PayPal-Transmission-Id'),
+        "transmission_sig": headers.get('PayPal-Transmission-Sig'),
+        "transmission_time": headers.get('PayPal-Transmission-Time'),
+        "webhook_id": settings.PAYPAL_WEBHOOK_ID,
+        "webhook_event": request.data,
+    }
+
+    try:
+        verify = await paypal_post("/v1/notifications/verify-webhook-signature", token, json=payload)
+        verify.raise_for_status()
+        verification = verify.json()
+    except httpx.HTTPError as exc:
+        return JsonResponse({'detail': f'PayPal verification failed: {str(exc)}'}, status=502)
+
+    if verification.get('verification_status') != 'SUCCESS':
+        return JsonResponse({'detail': 'Invalid signature.'}, status=400)
+
+    event_type = request.data.get('event_type')
+    resource = request.data.get('resource', {})
+    custom_id = None
+
+    if event_type in ['PAYMENT.CAPTURE.COMPLETED', 'CHECKOUT.ORDER.APPROVED']:
+        if 'purchase_units' in resource and resource['purchase_units']:
+            custom_id = resource['purchase_units'][0].get('custom_id')
+        if not custom_id:
+            custom_id = resource.get('custom_id')
+
+    if custom_id:
+        invoice = await Invoice.objects.filter(id=custom_id).afirst()
+        if invoice is not None:
+            invoice.status = 'paid'
+            invoice.paid_at = timezone.now()
+            invoice.paypal_transaction_id = resource.get('id', invoice.paypal_transaction_id)
+            payer = resource.get('payer', {})
+            invoice.paypal_payer_email = payer.get('email_address', invoice.paypal_payer_email)
+            await invoice.asave(update_fields=['status', 'paid_at', 'paypal_transaction_id', 'paypal_payer_email'])
+
+    return JsonResponse({'status': 'ok'})
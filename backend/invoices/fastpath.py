@@ -0,0 +1,30 @@
+"""
+``values()``-based serializer for the invoice list endpoint (see
+``core.fastpath``).
+"""
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from core.fastpath import ValuesSerializer
+from .models import InvoiceItem
+from .serializers import InvoiceListSerializer
+
+
+class InvoiceListValues(ValuesSerializer):
+    serializer_class = InvoiceListSerializer
+    requires = {
+        'customer_name': ['customer__first_name', 'customer__last_name'],
+    }
+
+    def get_annotations(self):
+        quantities = (
+            InvoiceItem.objects.filter(invoice=OuterRef('pk'))
+            .order_by()
+            .values('invoice')
+            .annotate(total=Sum('quantity'))
+            .values('total')
+        )
+        return {'total_items': Coalesce(Subquery(quantities, output_field=IntegerField()), 0)}
+
+    def get_customer_name(self, row):
+        # ``Customer.full_name``
+        return f"{row['customer__first_name']} {row['customer__last_name']}"
@@ -0,0 +1,118 @@
+"""
+Stored order-history projection for the mobile app.
+
+Every invoice keeps its order payload (the shape returned by
+``/api/invoices/history/``) as compact JSON text in
+``Invoice.order_payload``. The payload is rebuilt once the transaction that
+saved the invoice commits (see ``invoices.signals``). The history endpoint
+therefore reads one indexed range of stored strings and joins them, with
+no per-row serialization.
+
+Product details in the payload (image, category) are captured when the
+invoice is written, not read live. Stock is left out, since it is stale as
+soon as it is stored. When a customer's name or email changes, the payloads
+of their invoices are dropped and rebuilt by the next history request.
+"""
+import json
+from django.db.models import Prefetch
+from .models import Invoice, InvoiceItem
+
+FRONTEND_STATUSES = {
+    'pending': 'PENDING',
+    'processing': 'PROCESSING',
+    'paid': 'COMPLETED',
+    'cancelled': 'CANCELLED',
+    'refunded': 'CANCELLED',
+}
+
+
+def frontend_status(backend_status):
+    return FRONTEND_STATUSES.get((backend_status or '').lower(), 'PENDING')
+
+
+def build_order_payload(invoice):
+    """The order dict for ``invoice`` (uses prefetched ``items`` when present)."""
+    if 'items' in getattr(invoice, '_prefetched_objects_cache', {}):
+        invoice_items = invoice.items.all()
+    else:
+        invoice_items = invoice.items.select_related('product__category')
+    items = []
+    for item in invoice_items:
+        product = item.product
+        items.append({
+            'product': {
+                'id': str(product.id),
+                'name': item.product_name or product.name,
+                'brand': item.product_brand or product.brand,
+                'price': float(item.unit_price),
+                'imageUrl': product.picture_url or '',
+                'barcode': product.barcode or '',
+                'category': product.category.name if product.category else '',
+            },
+            'quantity': item.quantity,
+        })
+
+    return {
+        'id': str(invoice.id),
+        'userId': str(invoice.customer_id),
+        'items': items,
+        'totalAmount': float(invoice.total_amount),
+        'billingInfo': {
+            'firstName': invoice.billing_first_name or invoice.customer.first_name,
+            'lastName': invoice.billing_last_name or invoice.customer.last_name,
+            'address': invoice.billing_address,
+            'zipCode': invoice.billing_zip_code,
+            'city': invoice.billing_city,
+            'email': invoice.paypal_payer_email or invoice.customer.email,
+        },
+        'paymentMethod': invoice.payment_method,
+        'status': frontend_status(invoice.status),
+        'createdAt': invoice.created_at.isoformat(),
+    }
+
+
+def encode_payload(payload):
+    return json.dumps(payload, separators=(',', ':'))
+
+
+def refresh_order_payloads(invoice_ids):
+    """Rebuild and store the payloads of ``invoice_ids``; returns ``{id: json}``."""
+    invoices = Invoice.objects.filter(pk__in=invoice_ids).select_related('customer').prefetch_related(
+        Prefetch('items', queryset=InvoiceItem.objects.select_related('product__category').order_by('created_at', 'id'))
+    )
+    stored = {}
+    for invoice in invoices:
+        stored[invoice.pk] = encode_payload(build_order_payload(invoice))
+        # A queryset update: no signals, and updated_at is left alone.
+        Invoice.objects.filter(pk=invoice.pk).update(order_payload=stored[invoice.pk])
+    return stored
+
+
+def refresh_order_payload(invoice_id):
+    return refresh_order_payloads([invoice_id]).get(invoice_id)
+
+
+def forget_customer_payloads(customer_id):
+    """Drop the stored payloads of ``customer_id``'s invoices; ``history_page`` rebuilds them."""
+    return Invoice.objects.filter(customer_id=customer_id).exclude(order_payload=None).update(order_payload=None)
+
+
+def history_page(queryset, limit, offset):
+    """
+    Return ``(count, [json, ...])`` for one page of ``queryset``.
+
+    Payloads missing from older rows are built and stored on the way.
+    ``count`` is only queried when the page does not already reveal it.
+    """
+    rows = list(queryset.values_list('pk', 'order_payload')[offset:offset + limit])
+    missing = [pk for pk, payload in rows if not payload]
+    if missing:
+        built = refresh_order_payloads(missing)
+        rows = [(pk, payload or built.get(pk)) for pk, payload in rows]
+    payloads = [payload for _, payload in rows if payload]
+
+    if len(rows) < limit and (rows or offset == 0):
+        count = offset + len(rows)
+    else:
+        count = queryset.count()
+    return count, payloads
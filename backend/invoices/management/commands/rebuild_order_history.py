@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from invoices.history import refresh_order_payloads
+from invoices.models import Invoice
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored order-history payload of invoices (only missing ones unless --all).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild every invoice, not just missing payloads')
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.order_by('pk')
+        if not options['all']:
+            invoices = invoices.filter(order_payload__isnull=True)
+        ids = list(invoices.values_list('pk', flat=True))
+        for start in range(0, len(ids), BATCH_SIZE):
+            refresh_order_payloads(ids[start:start + BATCH_SIZE])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(ids)} order payload(s).'))
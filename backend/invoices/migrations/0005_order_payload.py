@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("invoices", "0004_receipts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="order_payload",
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+    ]
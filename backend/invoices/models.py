@@ -77,6 +77,10 @@ class Invoice(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     paid_at = models.DateTimeField(null=True, blank=True)
+
+    # Compact JSON of the mobile order payload, kept up to date by
+    # invoices.history (null until first built).
+    order_payload = models.TextField(null=True, blank=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -226,3 +230,57 @@ class InvoiceItem(models.Model):
             self.product_brand = self.product.brand
         
         super().save(*args, **kwargs)
+
+
+class Receipt(models.Model):
+    """
+    The rendered HTML and PDF receipt of an invoice.
+
+    Files are stored content-addressed (``receipts/<invoice id>/<sha256>``)
+    in the default storage. ``source_hash`` identifies the invoice data they
+    were rendered from; the receipt is rendered again only when it changes.
+    """
+    invoice = models.OneToOneField(Invoice, on_delete=models.CASCADE, related_name='receipt')
+    source_hash = models.CharField(max_length=64)
+    html = models.FileField(max_length=255)
+    pdf = models.FileField(max_length=255)
+    rendered_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Receipt for invoice {self.invoice_id}"
+
+
+class ReceiptEmail(models.Model):
+    """
+    A request to email an invoice's receipt. Pending rows are sent in
+    batches by the ``invoices.send_receipt_emails`` background job.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='receipt_emails')
+    email = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    batch = models.CharField(max_length=32, blank=True, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='receipt_email_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Receipt {self.invoice_id} -> {self.email} ({self.status})"
@@ -0,0 +1,106 @@
+"""
+PayPal REST API client.
+
+The async helpers share the pooled client from ``core.http`` and cache the
+OAuth access token until shortly before it expires, so a typical order
+creation or capture costs a single PayPal round trip.
+"""
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from core.http import get_async_client
+
+ACCESS_TOKEN_CACHE_KEY = 'paypal:access-token'
+
+# Refresh the cached token this many seconds before PayPal expires it.
+ACCESS_TOKEN_EXPIRY_MARGIN = 60
+
+
+def get_paypal_access_token():
+    auth = (settings.PAYPAL_CLIENT_ID, settings.PAYPAL_CLIENT_SECRET)
+    response = requests.post(
+        f"{settings.PAYPAL_BASE_URL}/v1/oauth2/token",
+        data={'grant_type': 'client_credentials'},
+        auth=auth,
+        timeout=15,
+    )
+    response.raise_for_status()
+    return response.json().get('access_token')
+
+
+async def aget_paypal_access_token():
+    token = await cache.aget(ACCESS_TOKEN_CACHE_KEY)
+    if token:
+        return token
+
+    response = await get_async_client().post(
+        f"{settings.PAYPAL_BASE_URL}/v1/oauth2/token",
+        data={'grant_type': 'client_credentials'},
+        auth=(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_CLIENT_SECRET),
+    )
+    response.raise_for_status()
+    payload = response.json()
+    token = payload.get('access_token')
+    expires_in = int(payload.get('expires_in') or 0) - ACCESS_TOKEN_EXPIRY_MARGIN
+    if token and expires_in > 0:
+        await cache.aset(ACCESS_TOKEN_CACHE_KEY, token, timeout=expires_in)
+    return token
+
+
+async def paypal_post(path, token, **kwargs):
+    headers = {"Authorization": f"Bearer {token}", **kwargs.pop('headers', {})}
+    return await get_async_client().post(
+        f"{settings.PAYPAL_BASE_URL}{path}",
+        headers=headers,
+        **kwargs,
+    )
+
+
+def paypal_error_payload(exc, fallback_message):
+    """
+    Translate a failed PayPal call into ``(payload, status_code)``.
+
+    Works for both ``requests`` and ``httpx`` exceptions.
+    """
+    response = getattr(exc, 'response', None)
+    if response is None:
+        return {'detail': f'{fallback_message}: {str(exc)}'}, 502
+
+    raw_status = response.status_code
+    if raw_status in (400, 404, 409, 422):
+        status_code = raw_status
+    elif raw_status in (401, 403):
+        # Avoid colliding with app-auth 401 handling on frontend.
+        status_code = 502
+    elif 400 <= raw_status < 500:
+        status_code = 400
+    else:
+        status_code = 502
+    detail = None
+    paypal_payload = None
+
+    try:
+        payload = response.json()
+        if isinstance(payload, dict):
+            details = payload.get('details') or []
+            first_detail = details[0] if isinstance(details, list) and details else {}
+            issue = first_detail.get('issue') if isinstance(first_detail, dict) else None
+            description = first_detail.get('description') if isinstance(first_detail, dict) else None
+            message = payload.get('message') or payload.get('error_description') or payload.get('error')
+            detail = description or message or issue
+            paypal_payload = {
+                'name': payload.get('name'),
+                'message': payload.get('message'),
+                'issue': issue,
+                'description': description,
+                'debug_id': payload.get('debug_id'),
+            }
+    except ValueError:
+        body = (response.text or '').strip()
+        detail = body[:500] if body else None
+
+    return {
+        'detail': detail or f'{fallback_message}.',
+        'paypal_status': raw_status,
+        'paypal': paypal_payload,
+    }, status_code
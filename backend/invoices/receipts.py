@@ -0,0 +1,227 @@
+"""
+Invoice receipts: rendering, storage and email delivery.
+
+A receipt is rendered once into HTML and PDF and both files are stored in
+the default storage (local media or S3) under the SHA-256 of their content.
+Later requests serve the stored files; the receipt is rendered again only
+when the invoice data it shows changes (see ``receipt_data``).
+
+Emails are queued as ``ReceiptEmail`` rows and sent by the
+``invoices.send_receipt_emails`` background job, which delivers a whole
+batch over a single SMTP connection.
+"""
+import hashlib
+import json
+import logging
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from core.pdf import text_pdf
+from jobs.queue import enqueue
+from .models import Receipt, ReceiptEmail
+
+logger = logging.getLogger(__name__)
+
+# Bump when the receipt templates change so stored receipts are re-rendered.
+RECEIPT_LAYOUT_VERSION = 1
+
+RECEIPT_EMAIL_TASK = 'invoices.send_receipt_emails'
+
+RECEIPT_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'html': 'text/html; charset=utf-8',
+}
+
+
+def _money(value):
+    return f'{value:.2f}'
+
+
+def _when(value):
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+def receipt_data(invoice):
+    """Everything a receipt shows, as plain JSON-serialisable values."""
+    customer = invoice.customer
+    billing_name = f'{invoice.billing_first_name} {invoice.billing_last_name}'.strip()
+    items = invoice.items.order_by('id').values_list(
+        'product_name', 'product_brand', 'quantity', 'unit_price', 'total_price',
+    )
+    return {
+        'layout': RECEIPT_LAYOUT_VERSION,
+        'invoice_number': invoice.invoice_number,
+        'status': invoice.get_status_display(),
+        'payment_method': invoice.get_payment_method_display(),
+        'created_at': _when(invoice.created_at),
+        'paid_at': _when(invoice.paid_at),
+        'customer_name': billing_name or customer.full_name,
+        'customer_email': customer.email,
+        'billing_address': invoice.billing_address,
+        'billing_city': ' '.join(filter(None, [invoice.billing_zip_code, invoice.billing_city])),
+        'billing_country': invoice.billing_country,
+        'subtotal': _money(invoice.subtotal),
+        'tax_rate': _money(invoice.tax_rate),
+        'tax_amount': _money(invoice.tax_amount),
+        'total_amount': _money(invoice.total_amount),
+        'items': [
+            {
+                'name': name,
+                'brand': brand,
+                'quantity': quantity,
+                'unit_price': _money(unit_price),
+                'total_price': _money(total_price),
+            }
+            for name, brand, quantity, unit_price, total_price in items
+        ],
+    }
+
+
+def _store(invoice_id, content, extension):
+    digest = hashlib.sha256(content).hexdigest()
+    name = f'receipts/{invoice_id}/{digest}.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def render_receipt_text(data):
+    return render_to_string('invoices/receipt.txt', {'receipt': data})
+
+
+def render_receipt(data):
+    """Return ``(html, pdf)`` for ``receipt_data`` output."""
+    html = render_to_string('invoices/receipt.html', {'receipt': data})
+    pdf = text_pdf(render_receipt_text(data).splitlines(), title=f"Receipt {data['invoice_number']}")
+    return html, pdf
+
+
+def get_receipt(invoice, data=None):
+    """Return the stored ``Receipt`` for ``invoice``, rendering it if missing or out of date."""
+    data = data or receipt_data(invoice)
+    source_hash = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    receipt = Receipt.objects.filter(invoice=invoice).first()
+    if receipt is not None and receipt.source_hash == source_hash:
+        return receipt
+
+    html, pdf = render_receipt(data)
+    previous = {receipt.html.name, receipt.pdf.name} if receipt else set()
+    receipt, _ = Receipt.objects.update_or_create(
+        invoice=invoice,
+        defaults={
+            'source_hash': source_hash,
+            'html': _store(invoice.pk, html.encode(), 'html'),
+            'pdf': _store(invoice.pk, pdf, 'pdf'),
+            'rendered_at': timezone.now(),
+        },
+    )
+    for name in previous - {receipt.html.name, receipt.pdf.name}:
+        default_storage.delete(name)
+    return receipt
+
+
+def queue_receipt_email(invoice, email):
+    """Queue ``invoice``'s receipt for delivery to ``email``."""
+    with transaction.atomic():
+        queued = ReceiptEmail.objects.create(invoice=invoice, email=email)
+        # Requests arriving while this job waits join its batch.
+        enqueue(RECEIPT_EMAIL_TASK, delay=settings.RECEIPT_EMAIL_BATCH_DELAY, unique_key=RECEIPT_EMAIL_TASK)
+    return queued
+
+
+def _claim_batch(batch_size):
+    now = timezone.now()
+    # Rows a killed worker was sending go back in the queue.
+    ReceiptEmail.objects.filter(
+        status=ReceiptEmail.SENDING,
+        claimed_at__lt=now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT),
+    ).update(status=ReceiptEmail.PENDING)
+
+    ids = list(
+        ReceiptEmail.objects.filter(status=ReceiptEmail.PENDING)
+        .order_by('id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    token = uuid.uuid4().hex
+    ReceiptEmail.objects.filter(id__in=ids, status=ReceiptEmail.PENDING).update(
+        status=ReceiptEmail.SENDING, batch=token, claimed_at=now,
+    )
+    return list(ReceiptEmail.objects.filter(batch=token).select_related('invoice__customer'))
+
+
+def _build_message(invoice, email, connection):
+    data = receipt_data(invoice)
+    receipt = get_receipt(invoice, data)
+    with receipt.html.open('rb') as fh:
+        html = fh.read().decode()
+    with receipt.pdf.open('rb') as fh:
+        pdf = fh.read()
+    message = EmailMultiAlternatives(
+        subject=f'Your receipt {invoice.invoice_number}',
+        body=render_receipt_text(data),
+        to=[email],
+        connection=connection,
+    )
+    message.attach_alternative(html, 'text/html')
+    message.attach(f'{invoice.invoice_number}.pdf', pdf, 'application/pdf')
+    return message
+
+
+def send_receipt_batch(batch_size=None):
+    """
+    Send up to ``batch_size`` pending receipt emails over one SMTP
+    connection. Returns ``(sent, failed)``; failures are retried by a later
+    batch until ``RECEIPT_EMAIL_MAX_ATTEMPTS``.
+    """
+    batch = _claim_batch(batch_size or settings.RECEIPT_EMAIL_BATCH_SIZE)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception:
+        ReceiptEmail.objects.filter(id__in=[queued.id for queued in batch]).update(status=ReceiptEmail.PENDING)
+        raise
+    with connection:
+        for queued in batch:
+            queued.attempts += 1
+            try:
+                _build_message(queued.invoice, queued.email, connection).send()
+            except Exception as exc:
+                logger.warning('Receipt email %s to %s failed: %s', queued.pk, queued.email, exc)
+                failed += 1
+                queued.last_error = str(exc)
+                exhausted = queued.attempts >= settings.RECEIPT_EMAIL_MAX_ATTEMPTS
+                queued.status = ReceiptEmail.FAILED if exhausted else ReceiptEmail.PENDING
+            else:
+                sent += 1
+                queued.status = ReceiptEmail.SENT
+                queued.sent_at = timezone.now()
+                queued.last_error = ''
+            queued.save(update_fields=['attempts', 'status', 'sent_at', 'last_error'])
+    return sent, failed
+
+
+def send_pending_receipts():
+    """Send batches until nothing is pending (failures wait for the next run)."""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_receipt_batch()
+        total_sent += sent
+        total_failed += failed
+        if not sent and not failed:
+            break
+        if failed:
+            # Likely an SMTP outage: let the job retry with backoff.
+            break
+    if total_failed:
+        raise RuntimeError(f'{total_failed} receipt email(s) failed; {total_sent} sent.')
+    return total_sent
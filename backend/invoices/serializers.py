@@ -4,13 +4,15 @@ from drf_spectacular.utils import extend_schema_field
 from decimal import Decimal
 from django.db import transaction
 from django.utils import timezone
+from core.fieldsets import SparseFieldsMixin
 from .models import Invoice, InvoiceItem, Cart, CartItem
 from users.serializers import CustomerSerializer
 from products.serializers import ProductListSerializer
-from products.models import Product
+from products.holds import InsufficientStock, convert_holds
+from products.ledger import invoice_reference
 
 
-class InvoiceItemSerializer(serializers.ModelSerializer):
+class InvoiceItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Invoice Items"""
     product_details = ProductListSerializer(source='product', read_only=True)
     
@@ -21,6 +23,7 @@ class InvoiceItemSerializer(serializers.ModelSerializer):
             'unit_price', 'total_price', 'product_name', 'product_brand'
         ]
         read_only_fields = ['id', 'total_price', 'product_name', 'product_brand']
+        expandable_fields = ['product_details']
 
 
 class InvoiceItemCreateSerializer(serializers.ModelSerializer):
@@ -33,7 +36,7 @@ class InvoiceItemCreateSerializer(serializers.ModelSerializer):
         }
 
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Invoice model"""
     customer_details = CustomerSerializer(source='customer', read_only=True)
     items = InvoiceItemSerializer(many=True, read_only=True)
@@ -51,6 +54,8 @@ class InvoiceSerializer(serializers.ModelSerializer):
             'notes', 'created_at', 'updated_at', 'paid_at', 'items'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        expandable_fields = ['customer_details', 'items']
+        field_columns = {'total_items': ['items']}
 
     @extend_schema_field(serializers.IntegerField())
     def get_total_items(self, obj):
@@ -103,29 +108,30 @@ class InvoiceCreateSerializer(serializers.ModelSerializer):
             validated_data['status'] = 'pending'
             validated_data['paid_at'] = None
 
-        with transaction.atomic():
-            locked_products = {}
-            for item_data in items_data:
-                product = Product.objects.select_for_update().get(pk=item_data['product'].pk)
-                if product.quantity_in_stock < item_data['quantity']:
-                    raise ValidationError(
-                        {'items': f'Insufficient stock for {product.name}.'}
-                    )
-                locked_products[product.pk] = product
+        quantities = {}
+        for item_data in items_data:
+            product_id = item_data['product'].pk
+            quantities[product_id] = quantities.get(product_id, 0) + item_data['quantity']
 
+        with transaction.atomic():
             # Create invoice
             invoice = Invoice.objects.create(**validated_data)
 
-            # Create invoice items and decrement stock
+            try:
+                convert_holds(
+                    validated_data.get('customer'),
+                    quantities,
+                    reference=invoice_reference(invoice.id),
+                )
+            except InsufficientStock as exc:
+                raise ValidationError({'items': str(exc)})
+
+            # Create invoice items
             for item_data in items_data:
-                product = locked_products[item_data['product'].pk]
                 item_payload = item_data.copy()
-                item_payload['product'] = product
                 if not item_payload.get('unit_price'):
-                    item_payload['unit_price'] = product.current_price
+                    item_payload['unit_price'] = item_payload['product'].current_price
                 InvoiceItem.objects.create(invoice=invoice, **item_payload)
-                product.quantity_in_stock = product.quantity_in_stock - item_data['quantity']
-                product.save(update_fields=['quantity_in_stock'])
 
         return invoice
 
@@ -159,7 +165,7 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class InvoiceListSerializer(serializers.ModelSerializer):
+class InvoiceListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Lightweight serializer for invoice lists"""
     customer_name = serializers.CharField(source='customer.full_name', read_only=True)
     total_items = serializers.SerializerMethodField()
@@ -170,6 +176,7 @@ class InvoiceListSerializer(serializers.ModelSerializer):
             'id', 'invoice_number', 'customer_name', 'status',
             'total_amount', 'payment_method', 'total_items', 'created_at'
         ]
+        field_columns = {'total_items': ['items']}
 
     @extend_schema_field(serializers.IntegerField())
     def get_total_items(self, obj):
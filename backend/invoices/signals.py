@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from core.events import get_broker, publish_event
+from products.ledger import return_invoice_stock
+from users.models import Customer
+from .history import forget_customer_payloads, refresh_order_payload
+from .models import Invoice
+
+# Customer fields the order payload falls back on (see invoices.history).
+PAYLOAD_CUSTOMER_FIELDS = {'first_name', 'last_name', 'email'}
+
+
+def invoice_status_event(invoice):
+    return {
+        'invoiceId': str(invoice.id),
+        'invoiceNumber': invoice.invoice_number,
+        'status': invoice.status,
+        'paidAt': invoice.paid_at.isoformat() if invoice.paid_at else None,
+    }
+
+
+@receiver(post_save, sender=Invoice)
+def publish_invoice_status(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    data = invoice_status_event(instance)
+    customer_id = instance.customer_id
+    # Use the loaded customer when there is one rather than querying for it.
+    known_user_id = instance.customer.user_id if Invoice.customer.is_cached(instance) else None
+
+    def publish():
+        if not customer_id or not get_broker().has_user_subscribers():
+            return
+        user_id = known_user_id or Customer.objects.filter(pk=customer_id).values_list('user_id', flat=True).first()
+        if user_id:
+            publish_event('invoice.status', data, user_id=user_id)
+
+    transaction.on_commit(publish)
+
+
+@receiver(post_save, sender=Invoice)
+def restock_cancelled_invoice(sender, instance, created, update_fields=None, **kwargs):
+    if created or instance.status not in ('cancelled', 'refunded'):
+        return
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    return_invoice_stock(instance.id)
+
+
+@receiver(post_save, sender=Invoice)
+def schedule_order_payload_refresh(sender, instance, **kwargs):
+    # Runs after commit so items written later in the same transaction are included.
+    invoice_id = instance.pk
+    transaction.on_commit(lambda: refresh_order_payload(invoice_id))
+
+
+@receiver(post_save, sender=Customer)
+def forget_stale_customer_payloads(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if created or raw:
+        return
+    if update_fields is not None and not PAYLOAD_CUSTOMER_FIELDS & set(update_fields):
+        return
+    forget_customer_payloads(instance.pk)
@@ -0,0 +1,13 @@
+from jobs.queue import task
+from .receipts import RECEIPT_EMAIL_TASK, send_pending_receipts
+
+
+@task(RECEIPT_EMAIL_TASK)
+def send_receipt_emails():
+    send_pending_receipts()
+
+
+# Catches requests queued while a send job was finishing.
+@task('invoices.sweep_receipt_emails', every=300, priority=-10)
+def sweep_receipt_emails():
+    send_pending_receipts()
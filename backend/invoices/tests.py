@@ -1,5 +1,20 @@
 import pytest
+import json
+import socket
+from decimal import Decimal
+import httpx
+from django.contrib.auth.models import User
+from django.core import mail
 from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.events import InProcessBroker
+from core.smtp_sink import SMTPSink
+from invoices.fastpath import InvoiceListValues
+from invoices.history import refresh_order_payload, refresh_order_payloads
+from invoices.models import Invoice, Receipt, ReceiptEmail
+from invoices.receipts import queue_receipt_email, send_pending_receipts
+from jobs.models import Job
+from jobs.queue import run_next
 
 
 @pytest.mark.django_db
@@ -145,3 +160,363 @@ class TestPaymentAPI:
 
         invoice.refresh_from_db()
         assert invoice.status == 'refunded'
+
+
+@pytest.fixture
+def paypal_transport(monkeypatch):
+    """Route the pooled PayPal client through a fake transport; returns the request log."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        path = request.url.path
+        if path == '/v1/oauth2/token':
+            return httpx.Response(200, json={'access_token': 'TOKEN', 'expires_in': 3600})
+        if path == '/v2/checkout/orders':
+            return httpx.Response(201, json={
+                'id': 'ORDER-1',
+                'links': [{'rel': 'payer-action', 'href': 'https://paypal.test/approve'}],
+            })
+        if path == '/v2/checkout/orders/DECLINED/capture':
+            return httpx.Response(422, json={
+                'name': 'UNPROCESSABLE_ENTITY',
+                'details': [{'issue': 'INSTRUMENT_DECLINED', 'description': 'The instrument was declined.'}],
+            })
+        if path.endswith('/capture'):
+            return httpx.Response(201, json={'id': 'ORDER-1', 'payer': {'email_address': 'buyer@example.com'}})
+        return httpx.Response(404, json={'name': 'RESOURCE_NOT_FOUND', 'message': 'Not found'})
+
+    monkeypatch.setattr(
+        'invoices.paypal.get_async_client',
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return calls
+
+
+@pytest.fixture
+def jwt_client(api_client, user):
+    token = RefreshToken.for_user(user).access_token
+    api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return api_client
+
+
+@pytest.mark.django_db
+class TestAsyncPayPalViews:
+    def test_create_order_requires_authentication(self, api_client, invoice):
+        response = api_client.post(f'/api/invoices/{invoice.id}/create_paypal_order/')
+        assert response.status_code == 401
+
+    def test_create_order_marks_invoice_pending(self, jwt_client, invoice, paypal_transport):
+        response = jwt_client.post(f'/api/invoices/{invoice.id}/create_paypal_order/', {}, format='json')
+        assert response.status_code == 200
+        assert response.json()['approval_url'] == 'https://paypal.test/approve'
+
+        invoice.refresh_from_db()
+        assert invoice.payment_method == 'paypal'
+        assert invoice.paypal_transaction_id == 'ORDER-1'
+
+    def test_access_token_is_reused_between_calls(self, jwt_client, invoice, paypal_transport):
+        jwt_client.post(f'/api/invoices/{invoice.id}/create_paypal_order/', {}, format='json')
+        jwt_client.post(f'/api/invoices/{invoice.id}/create_paypal_order/', {}, format='json')
+        token_calls = [call for call in paypal_transport if call.url.path == '/v1/oauth2/token']
+        assert len(token_calls) == 1
+
+    def test_capture_marks_invoice_paid(self, jwt_client, invoice, paypal_transport):
+        response = jwt_client.post(
+            f'/api/invoices/{invoice.id}/capture_paypal_order/',
+            {'order_id': 'ORDER-1'},
+            format='json',
+        )
+        assert response.status_code == 200
+
+        invoice.refresh_from_db()
+        assert invoice.status == 'paid'
+        assert invoice.paypal_payer_email == 'buyer@example.com'
+
+    def test_capture_retry_with_idempotency_key_is_replayed(self, jwt_client, invoice, paypal_transport):
+        for _ in range(2):
+            response = jwt_client.post(
+                f'/api/invoices/{invoice.id}/capture_paypal_order/',
+                {'order_id': 'ORDER-1'},
+                format='json',
+                HTTP_IDEMPOTENCY_KEY='capture-1',
+            )
+            assert response.status_code == 200
+        assert response['Idempotent-Replayed'] == 'true'
+        capture_calls = [call for call in paypal_transport if call.url.path.endswith('/capture')]
+        assert len(capture_calls) == 1
+
+    def test_other_customers_invoice_is_not_found(self, api_client, invoice, paypal_transport):
+        stranger = User.objects.create_user(username='stranger', password='testpass123')
+        token = RefreshToken.for_user(stranger).access_token
+        api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = api_client.post(f'/api/invoices/{invoice.id}/create_paypal_order/', {}, format='json')
+        assert response.status_code == 404
+
+    def test_paypal_error_is_translated(self, jwt_client, invoice, paypal_transport):
+        response = jwt_client.post(
+            f'/api/invoices/{invoice.id}/capture_paypal_order/',
+            {'order_id': 'DECLINED'},
+            format='json',
+        )
+        assert response.status_code == 422
+        assert response.json()['paypal']['issue'] == 'INSTRUMENT_DECLINED'
+
+        invoice.refresh_from_db()
+        assert invoice.status == 'pending'
+
+
+@pytest.mark.django_db
+class TestReceipts:
+    @pytest.fixture
+    def paid_invoice(self, invoice, product):
+        invoice.items.create(product=product, quantity=2, unit_price=product.price)
+        return invoice
+
+    def test_receipt_is_rendered_once_and_stored(self, authenticated_client, paid_invoice, media_root):
+        first = authenticated_client.get(f'/api/invoices/{paid_invoice.id}/receipt/').data
+        second = authenticated_client.get(f'/api/invoices/{paid_invoice.id}/receipt/').data
+        assert first['pdfUrl'] == second['pdfUrl']
+        assert first['receiptUrl'] == first['pdfUrl']
+        assert Receipt.objects.count() == 1
+
+        receipt = Receipt.objects.get()
+        assert receipt.pdf.name.startswith(f'receipts/{paid_invoice.id}/')
+        assert (media_root / receipt.pdf.name).read_bytes().startswith(b'%PDF-')
+        assert 'INV-2024-001' in (media_root / receipt.html.name).read_text()
+
+    def test_receipt_links_go_through_the_authenticated_api(self, authenticated_client, paid_invoice):
+        data = authenticated_client.get(f'/api/invoices/{paid_invoice.id}/receipt/').data
+        assert data['pdfUrl'] == f'http://testserver/api/invoices/{paid_invoice.id}/receipt/?output=pdf'
+        assert data['htmlUrl'] == f'http://testserver/api/invoices/{paid_invoice.id}/receipt/?output=html'
+
+        response = authenticated_client.get(data['htmlUrl'])
+        assert response.status_code == 200
+        assert b'INV-2024-001' in b''.join(response.streaming_content)
+        authenticated_client.force_authenticate(None)
+        assert authenticated_client.get(data['pdfUrl']).status_code == 401
+
+    def test_receipt_is_rerendered_when_invoice_changes(self, authenticated_client, paid_invoice, media_root):
+        authenticated_client.get(f'/api/invoices/{paid_invoice.id}/receipt/')
+        old_pdf = Receipt.objects.get().pdf.name
+        paid_invoice.status = 'paid'
+        paid_invoice.paid_at = timezone.now()
+        paid_invoice.save(update_fields=['status', 'paid_at'])
+
+        authenticated_client.get(f'/api/invoices/{paid_invoice.id}/receipt/')
+        new_pdf = Receipt.objects.get().pdf.name
+        assert new_pdf != old_pdf
+        assert not (media_root / old_pdf).exists()
+
+    def test_receipt_download_with_etag(self, authenticated_client, paid_invoice):
+        url = f'/api/invoices/{paid_invoice.id}/receipt/'
+        response = authenticated_client.get(url, {'output': 'pdf'})
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/pdf'
+        assert b''.join(response.streaming_content).startswith(b'%PDF-')
+
+        cached = authenticated_client.get(url, {'output': 'pdf'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert cached.status_code == 304
+        assert authenticated_client.get(url, {'output': 'doc'}).status_code == 400
+
+    def test_compressed_receipt_still_revalidates(self, authenticated_client, paid_invoice):
+        url = f'/api/invoices/{paid_invoice.id}/receipt/'
+        response = authenticated_client.get(url, {'output': 'html'}, HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert response['ETag'].startswith('W/"')
+
+        cached = authenticated_client.get(
+            url, {'output': 'html'}, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        assert cached.status_code == 304
+
+    def test_send_receipt_is_delivered_by_the_worker(self, authenticated_client, paid_invoice):
+        response = authenticated_client.post(
+            f'/api/invoices/{paid_invoice.id}/send-receipt/', {'email': 'buyer@example.com'}, format='json',
+        )
+        assert response.status_code == 200
+        assert mail.outbox == []
+
+        Job.objects.filter(name='invoices.send_receipt_emails').update(run_at=timezone.now())
+        run_next('test')
+        assert ReceiptEmail.objects.get().status == ReceiptEmail.SENT
+        [message] = mail.outbox
+        assert message.to == ['buyer@example.com']
+        assert message.attachments[0][0] == 'INV-2024-001.pdf'
+        assert message.alternatives[0][1] == 'text/html'
+
+    def test_send_receipt_rejects_invalid_email(self, authenticated_client, invoice):
+        response = authenticated_client.post(
+            f'/api/invoices/{invoice.id}/send-receipt/', {'email': 'not-an-email'}, format='json',
+        )
+        assert response.status_code == 400
+
+    def test_batch_is_sent_over_one_smtp_connection(self, settings, paid_invoice):
+        settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+        settings.EMAIL_USE_TLS = False
+        for index in range(3):
+            queue_receipt_email(paid_invoice, f'buyer{index}@example.com')
+
+        with SMTPSink() as sink:
+            settings.EMAIL_HOST, settings.EMAIL_PORT = sink.host, sink.port
+            assert send_pending_receipts() == 3
+        assert sink.connections == 1
+        assert sorted(message['To'] for message in sink.messages) == [
+            'buyer0@example.com', 'buyer1@example.com', 'buyer2@example.com',
+        ]
+
+    def test_smtp_outage_leaves_emails_pending(self, settings, paid_invoice):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            unused_port = probe.getsockname()[1]
+        settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+        settings.EMAIL_HOST, settings.EMAIL_PORT = '127.0.0.1', unused_port
+        queue_receipt_email(paid_invoice, 'buyer@example.com')
+
+        with pytest.raises(OSError):
+            send_pending_receipts()
+        assert ReceiptEmail.objects.get().status == ReceiptEmail.PENDING
+
+
+@pytest.mark.django_db
+class TestOrderHistoryProjection:
+    def test_payload_is_stored_on_commit_and_refreshed_on_status_change(
+        self, invoice, product, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            invoice.items.create(product=product, quantity=3, unit_price=product.price)
+            invoice.save()
+        payload = json.loads(Invoice.objects.get(pk=invoice.pk).order_payload)
+        assert payload['status'] == 'PENDING'
+        assert payload['items'][0]['quantity'] == 3
+
+        with django_capture_on_commit_callbacks(execute=True):
+            invoice.status = 'paid'
+            invoice.save(update_fields=['status'])
+        assert json.loads(Invoice.objects.get(pk=invoice.pk).order_payload)['status'] == 'COMPLETED'
+
+    def test_payload_leaves_out_stock(self, invoice, product):
+        invoice.items.create(product=product, quantity=1, unit_price=product.price)
+        payload = json.loads(refresh_order_payload(invoice.pk))
+        assert 'stock' not in payload['items'][0]['product']
+
+    def test_customer_profile_change_rebuilds_payloads(self, authenticated_client, invoice, customer):
+        refresh_order_payload(invoice.pk)
+        customer.phone_number = '+33600000000'
+        customer.save(update_fields=['phone_number'])
+        assert Invoice.objects.get(pk=invoice.pk).order_payload is not None
+
+        customer.email = 'renamed@example.com'
+        customer.save()
+        assert Invoice.objects.get(pk=invoice.pk).order_payload is None
+        response = authenticated_client.get('/api/invoices/history/')
+        assert response.data['results'][0]['billingInfo']['email'] == 'renamed@example.com'
+
+    def test_history_serves_stored_payloads(self, authenticated_client, invoice):
+        Invoice.objects.filter(pk=invoice.pk).update(order_payload='{"id":"stored"}')
+        response = authenticated_client.get('/api/invoices/history/')
+        assert response['Content-Type'] == 'application/json'
+        assert response.data == {'count': 1, 'limit': 20, 'offset': 0, 'results': [{'id': 'stored'}]}
+
+    def test_history_builds_missing_payloads(self, authenticated_client, invoice):
+        response = authenticated_client.get('/api/invoices/history/')
+        assert response.data['results'][0]['id'] == str(invoice.id)
+        assert Invoice.objects.get(pk=invoice.pk).order_payload is not None
+
+    def test_history_pages_in_constant_queries(self, authenticated_client, customer, django_assert_max_num_queries):
+        Invoice.objects.bulk_create([
+            Invoice(
+                customer=customer, invoice_number=f'INV-H-{n}', subtotal=1, tax_amount=0, total_amount=1,
+            )
+            for n in range(30)
+        ])
+        refresh_order_payloads(Invoice.objects.values_list('pk', flat=True))
+
+        authenticated_client.get('/api/invoices/history/')  # warm the auth caches
+        with django_assert_max_num_queries(4):
+            response = authenticated_client.get('/api/invoices/history/', {'limit': 25})
+        assert response.data['count'] == 30
+        assert len(response.data['results']) == 25
+
+        last = authenticated_client.get('/api/invoices/history/', {'limit': 25, 'offset': 25})
+        assert last.data['count'] == 30
+        assert len(last.data['results']) == 5
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+    def test_nested_fields_skip_embedded_serializers(self, staff_client, invoice, product, django_assert_num_queries):
+        invoice.items.create(product=product, quantity=2, unit_price=product.price)
+        invoice.items.create(product=product, quantity=1, unit_price=product.price)
+
+        # One query for the invoice, one for its prefetched items.
+        with django_assert_num_queries(2, exact=False):
+            response = staff_client.get(f'/api/invoices/{invoice.id}/?fields=id,total_items,items.quantity')
+        assert response.data == {'id': invoice.id, 'total_items': 3, 'items': [{'quantity': 2}, {'quantity': 1}]}
+
+    def test_expand_nested_product_details(self, staff_client, invoice, product):
+        invoice.items.create(product=product, quantity=2, unit_price=product.price)
+
+        response = staff_client.get(f'/api/invoices/{invoice.id}/?expand=items.product_details')
+        assert 'customer_details' not in response.data
+        item = response.data['items'][0]
+        assert item['product_details']['category_name'] == 'Beverages'
+        assert 'active_promotion' not in item['product_details']
+
+    def test_list_fields(self, staff_client, invoice):
+        response = staff_client.get('/api/invoices/?fields=invoice_number,customer_name')
+        assert response.data['results'] == [{'invoice_number': 'INV-2024-001', 'customer_name': 'John Doe'}]
+
+
+@pytest.mark.django_db
+class TestValuesSerializerParity:
+    def test_invoice_list(self, invoice, customer, product, render_both):
+        invoice.items.create(product=product, quantity=2, unit_price=product.price)
+        invoice.items.create(product=product, quantity=5, unit_price=product.price)
+        Invoice.objects.create(
+            customer=customer, invoice_number='INV-2024-002', subtotal=Decimal('0'),
+            tax_amount=Decimal('0'), total_amount=Decimal('0'), status='paid',
+        )
+
+        drf, fast = render_both(InvoiceListValues, Invoice.objects.all())
+        assert fast == drf
+
+    def test_list_endpoint_query_count_is_flat(self, staff_client, customer, product, django_assert_max_num_queries):
+        for n in range(15):
+            invoice = Invoice.objects.create(
+                customer=customer, invoice_number=f'INV-Q-{n}', subtotal=Decimal('10'),
+                tax_amount=Decimal('2'), total_amount=Decimal('12'),
+            )
+            invoice.items.create(product=product, quantity=1, unit_price=product.price)
+        with django_assert_max_num_queries(4):
+            response = staff_client.get('/api/invoices/')
+        assert response.data['count'] == 15
+        assert {row['total_items'] for row in response.data['results']} == {1}
+
+
+@pytest.mark.django_db
+class TestInvoiceStatusEvents:
+    def _publish_callback(self, invoice, capture):
+        with capture() as callbacks:
+            invoice.status = 'paid'
+            invoice.save(update_fields=['status'])
+        return next(callback for callback in callbacks if callback.__name__ == 'publish')
+
+    def test_no_subscribers_skips_the_customer_lookup(
+        self, invoice, django_capture_on_commit_callbacks, django_assert_num_queries
+    ):
+        publish = self._publish_callback(Invoice.objects.get(pk=invoice.pk), django_capture_on_commit_callbacks)
+        with django_assert_num_queries(0):
+            publish()
+
+    def test_loaded_customer_is_used_for_the_channel(
+        self, invoice, monkeypatch, django_capture_on_commit_callbacks, django_assert_num_queries
+    ):
+        published = []
+        monkeypatch.setattr(InProcessBroker, 'has_user_subscribers', lambda self: True)
+        monkeypatch.setattr('invoices.signals.publish_event', lambda *args, **kwargs: published.append(kwargs))
+        loaded = Invoice.objects.select_related('customer').get(pk=invoice.pk)
+        publish = self._publish_callback(loaded, django_capture_on_commit_callbacks)
+        with django_assert_num_queries(0):
+            publish()
+        assert published == [{'user_id': invoice.customer.user_id}]
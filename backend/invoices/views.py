@@ -1,3 +1,4 @@
+import os
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
@@ -5,12 +6,22 @@ from rest_framework.decorators import action
 from rest_framework.views import APIView
 from django.utils import timezone
 from decimal import Decimal
-from django.conf import settings
-from django.http import HttpResponse
-import requests
-from requests import RequestException
-from users.models import Customer
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.http import FileResponse, HttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from core.conditional import etag_matches
+from core.fastpath import FastListMixin
+from core.fieldsets import SparseFieldsetMixin
+from core.idempotency import idempotent
+from core.responses import PrerenderedJSONResponse, json_array, json_object
+from products.holds import InsufficientStock, hold_stock, release_holds
+from users.authentication import get_request_customer
+from .fastpath import InvoiceListValues
+from .history import build_order_payload, history_page
 from .models import Invoice, InvoiceItem, Cart, CartItem
+from .receipts import RECEIPT_CONTENT_TYPES, get_receipt, queue_receipt_email
 from .serializers import (
     InvoiceSerializer,
     InvoiceCreateSerializer,
@@ -22,70 +33,7 @@ from .serializers import (
 )
 
 
-def get_paypal_access_token():
-    auth = (settings.PAYPAL_CLIENT_ID, settings.PAYPAL_CLIENT_SECRET)
-    response = requests.post(
-        f"{settings.PAYPAL_BASE_URL}/v1/oauth2/token",
-        data={'grant_type': 'client_credentials'},
-        auth=auth,
-        timeout=15,
-    )
-    response.raise_for_status()
-    return response.json().get('access_token')
-
-
-def build_paypal_error_response(exc: RequestException, fallback_message: str):
-    response = getattr(exc, 'response', None)
-    if response is None:
-        return Response(
-            {'detail': f'{fallback_message}: {str(exc)}'},
-            status=status.HTTP_502_BAD_GATEWAY,
-        )
-
-    raw_status = response.status_code
-    if raw_status in (400, 404, 409, 422):
-        status_code = raw_status
-    elif raw_status in (401, 403):
-        # Avoid colliding with app-auth 401 handling on frontend.
-        status_code = status.HTTP_502_BAD_GATEWAY
-    elif 400 <= raw_status < 500:
-        status_code = status.HTTP_400_BAD_REQUEST
-    else:
-        status_code = status.HTTP_502_BAD_GATEWAY
-    detail = None
-    paypal_payload = None
-
-    try:
-        payload = response.json()
-        if isinstance(payload, dict):
-            details = payload.get('details') or []
-            first_detail = details[0] if isinstance(details, list) and details else {}
-            issue = first_detail.get('issue') if isinstance(first_detail, dict) else None
-            description = first_detail.get('description') if isinstance(first_detail, dict) else None
-            message = payload.get('message') or payload.get('error_description') or payload.get('error')
-            detail = description or message or issue
-            paypal_payload = {
-                'name': payload.get('name'),
-                'message': payload.get('message'),
-                'issue': issue,
-                'description': description,
-                'debug_id': payload.get('debug_id'),
-            }
-    except ValueError:
-        body = (response.text or '').strip()
-        detail = body[:500] if body else None
-
-    return Response(
-        {
-            'detail': detail or f'{fallback_message}.',
-            'paypal_status': raw_status,
-            'paypal': paypal_payload,
-        },
-        status=status_code,
-    )
-
-
-class InvoiceViewSet(viewsets.ModelViewSet):
+class InvoiceViewSet(SparseFieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Invoice management.
     
@@ -105,6 +53,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     **Payment Methods:** cash, card, paypal, other
     """
     queryset = Invoice.objects.all()
+    fast_serializer_class = InvoiceListValues
     permission_classes = [IsAuthenticated]
     filterset_fields = ['status', 'payment_method', 'customer']
     search_fields = ['invoice_number', 'customer__first_name', 'customer__last_name']
@@ -114,7 +63,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         if self.request.user.is_staff:
             qs = Invoice.objects.all()
         else:
-            customer = Customer.objects.filter(user=self.request.user).first()
+            customer = get_request_customer(self.request)
             if not customer:
                 return Invoice.objects.none()
             qs = Invoice.objects.filter(customer=customer)
@@ -138,9 +87,10 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         if not request.data.get('customer'):
-            customer = Customer.objects.filter(user=request.user).first()
+            customer = get_request_customer(request)
             if not customer:
                 return Response(
                     {'detail': 'Customer profile not found. Please ensure you have a profile or provide a customer ID.'},
@@ -183,16 +133,6 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             return InvoiceCreateSerializer
         return InvoiceSerializer
 
-    def _to_frontend_status(self, backend_status):
-        status_map = {
-            'pending': 'PENDING',
-            'processing': 'PROCESSING',
-            'paid': 'COMPLETED',
-            'cancelled': 'CANCELLED',
-            'refunded': 'CANCELLED',
-        }
-        return status_map.get((backend_status or '').lower(), 'PENDING')
-
     def _to_backend_status(self, incoming_status):
         raw_status = str(incoming_status or '').strip().lower()
         status_map = {
@@ -205,47 +145,12 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         }
         return status_map.get(raw_status, None)
 
-    def _to_order_payload(self, invoice):
-        items = []
-        for item in invoice.items.select_related('product__category').all():
-            product = item.product
-            items.append({
-                'product': {
-                    'id': str(product.id),
-                    'name': item.product_name or product.name,
-                    'brand': item.product_brand or product.brand,
-                    'price': float(item.unit_price),
-                    'stock': product.quantity_in_stock,
-                    'imageUrl': product.picture_url or '',
-                    'barcode': product.barcode or '',
-                    'category': product.category.name if product.category else '',
-                },
-                'quantity': item.quantity,
-            })
-
-        return {
-            'id': str(invoice.id),
-            'userId': str(invoice.customer_id),
-            'items': items,
-            'totalAmount': float(invoice.total_amount),
-            'billingInfo': {
-                'firstName': invoice.billing_first_name or invoice.customer.first_name,
-                'lastName': invoice.billing_last_name or invoice.customer.last_name,
-                'address': invoice.billing_address,
-                'zipCode': invoice.billing_zip_code,
-                'city': invoice.billing_city,
-                'email': invoice.paypal_payer_email or invoice.customer.email,
-            },
-            'paymentMethod': invoice.payment_method,
-            'status': self._to_frontend_status(invoice.status),
-            'createdAt': invoice.created_at.isoformat(),
-        }
-
     @action(detail=False, methods=['get'])
     def history(self, request):
         """
         List invoice history in frontend order format.
         Supports limit/offset pagination expected by the mobile app.
+        Serves the payloads stored by invoices.history as-is.
         """
         try:
             limit = int(request.query_params.get('limit', 20))
@@ -262,17 +167,11 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         if offset < 0:
             offset = 0
 
-        queryset = self.get_queryset().select_related('customer').prefetch_related('items__product__category')
-        total_count = queryset.count()
-        invoices = queryset[offset:offset + limit]
-        results = [self._to_order_payload(invoice) for invoice in invoices]
-
-        return Response({
-            'count': total_count,
-            'limit': limit,
-            'offset': offset,
-            'results': results,
-        })
+        count, payloads = history_page(self.get_queryset(), limit, offset)
+        return PrerenderedJSONResponse(json_object(
+            {'count': count, 'limit': limit, 'offset': offset},
+            {'results': json_array(payloads)},
+        ))
 
     @action(detail=True, methods=['patch'], url_path='status')
     def update_status(self, request, pk=None):
@@ -301,7 +200,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             invoice.save(update_fields=['status'])
 
         invoice.refresh_from_db()
-        return Response(self._to_order_payload(invoice))
+        return Response(build_order_payload(invoice))
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -313,7 +212,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         invoice = self.get_object()
 
         if invoice.status == 'cancelled':
-            return Response(self._to_order_payload(invoice))
+            return Response(build_order_payload(invoice))
 
         if invoice.status == 'paid':
             invoice.status = 'refunded'
@@ -324,17 +223,49 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             invoice.save(update_fields=['status', 'paid_at'])
 
         invoice.refresh_from_db()
-        return Response(self._to_order_payload(invoice))
+        return Response(build_order_payload(invoice))
 
     @action(detail=True, methods=['get'])
     def receipt(self, request, pk=None):
         """
-        Lightweight receipt endpoint consumed by mobile app.
+        Receipt links consumed by the mobile app.
+
+        The receipt is rendered once and stored. `receiptUrl` / `pdfUrl` /
+        `htmlUrl` are `?output=pdf|html` on this endpoint, which serves the
+        stored file behind the same authentication as the invoice; the
+        storage URLs are never handed out (receipts hold personal data, and
+        local media is not served outside DEBUG).
         """
         invoice = self.get_object()
-        receipt_url = request.build_absolute_uri(f"/api/invoices/{invoice.id}/")
+        receipt = get_receipt(invoice)
+
+        output = request.query_params.get('output')
+        if output:
+            if output not in RECEIPT_CONTENT_TYPES:
+                return Response(
+                    {'detail': f"output must be one of: {', '.join(RECEIPT_CONTENT_TYPES)}."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            stored = getattr(receipt, output)
+            # Stored names end in the SHA-256 of the file.
+            etag = f'"{os.path.splitext(os.path.basename(stored.name))[0]}"'
+            if etag_matches(request.headers.get('If-None-Match'), etag):
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = FileResponse(
+                    stored.open('rb'),
+                    content_type=RECEIPT_CONTENT_TYPES[output],
+                    filename=f'{invoice.invoice_number}.{output}',
+                )
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, max_age=3600)
+            return response
+
+        url = request.build_absolute_uri(reverse('invoice-receipt', args=[invoice.pk]))
         return Response({
-            'receiptUrl': receipt_url,
+            'receiptUrl': f'{url}?output=pdf',
+            'pdfUrl': f'{url}?output=pdf',
+            'htmlUrl': f'{url}?output=html',
             'invoiceNumber': invoice.invoice_number,
             'status': invoice.status,
             'totalAmount': float(invoice.total_amount),
@@ -343,7 +274,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], url_path='send-receipt')
     def send_receipt(self, request, pk=None):
         """
-        Placeholder endpoint for receipt email dispatch.
+        Queue the receipt for email delivery by the background worker.
         """
         invoice = self.get_object()
         target_email = (
@@ -356,137 +287,20 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 {'detail': 'Email is required.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            validate_email(target_email)
+        except ValidationError:
+            return Response(
+                {'detail': 'Enter a valid email address.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        # Email delivery service is not integrated yet, but this preserves API contract.
+        queue_receipt_email(invoice, target_email)
         return Response({
             'success': True,
             'message': f'Receipt queued for {target_email}.',
         })
 
-    @action(detail=True, methods=['post'])
-    def create_paypal_order(self, request, pk=None):
-        invoice = self.get_object()
-        if invoice.status == 'paid':
-            return Response({'detail': 'Invoice already paid.'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            token = get_paypal_access_token()
-            return_url = request.build_absolute_uri("/api/paypal/return/")
-            cancel_url = request.build_absolute_uri("/api/paypal/cancel/")
-            payload = {
-                "intent": "CAPTURE",
-                "purchase_units": [
-                    {
-                        "reference_id": invoice.invoice_number,
-                        "custom_id": str(invoice.id),
-                        "amount": {
-                            "currency_code": "EUR",
-                            "value": f"{invoice.total_amount:.2f}"
-                        },
-                        "description": f"Invoice {invoice.invoice_number}"
-                    }
-                ],
-                "payment_source": {
-                    "paypal": {
-                        "experience_context": {
-                            "landing_page": "LOGIN",
-                            "shipping_preference": "NO_SHIPPING",
-                            "user_action": "PAY_NOW",
-                            "return_url": return_url,
-                            "cancel_url": cancel_url,
-                        }
-                    }
-                },
-            }
-
-            response = requests.post(
-                f"{settings.PAYPAL_BASE_URL}/v2/checkout/orders",
-                json=payload,
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=representation",
-                },
-                timeout=15,
-            )
-            response.raise_for_status()
-            data = response.json()
-            links = data.get('links') or []
-            approval_link = next(
-                (
-                    link.get('href')
-                    for link in links
-                    if (link.get('rel') or '').lower() in ['approve', 'payer-action']
-                ),
-                ''
-            )
-            if not approval_link and data.get('id'):
-                checkout_host = 'https://www.sandbox.paypal.com'
-                if 'sandbox' not in (settings.PAYPAL_BASE_URL or '').lower():
-                    checkout_host = 'https://www.paypal.com'
-                approval_link = f"{checkout_host}/checkoutnow?token={data.get('id')}"
-            if approval_link:
-                data['approval_url'] = approval_link
-
-            invoice.payment_method = 'paypal'
-            invoice.status = 'pending'
-            invoice.paypal_transaction_id = data.get('id', '')
-            invoice.save(update_fields=['payment_method', 'status', 'paypal_transaction_id'])
-
-            return Response(data, status=status.HTTP_200_OK)
-        except RequestException as exc:
-            return build_paypal_error_response(exc, 'PayPal order creation failed')
-
-    @action(detail=True, methods=['post'])
-    def capture_paypal_order(self, request, pk=None):
-        invoice = self.get_object()
-        order_id = request.data.get('order_id') or invoice.paypal_transaction_id
-        if not order_id:
-            return Response({'detail': 'PayPal order id is required.'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            token = get_paypal_access_token()
-            capture_url = f"{settings.PAYPAL_BASE_URL}/v2/checkout/orders/{order_id}/capture"
-            response = requests.post(
-                capture_url,
-                json={},
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=representation",
-                },
-                timeout=15,
-            )
-
-            # Sandbox sometimes rejects the explicit empty JSON payload.
-            # Retry with an empty body when that specific validation error occurs.
-            if (
-                response.status_code in (400, 422)
-                and 'payload is not supported' in (response.text or '').lower()
-            ):
-                response = requests.post(
-                    capture_url,
-                    headers={
-                        "Authorization": f"Bearer {token}",
-                        "Prefer": "return=representation",
-                    },
-                    timeout=15,
-                )
-
-            response.raise_for_status()
-            data = response.json()
-
-            payer = data.get('payer', {})
-            payer_email = payer.get('email_address', '')
-
-            invoice.status = 'paid'
-            invoice.paid_at = timezone.now()
-            invoice.paypal_transaction_id = order_id
-            invoice.paypal_payer_email = payer_email
-            invoice.save(update_fields=['status', 'paid_at', 'paypal_transaction_id', 'paypal_payer_email'])
-
-            return Response(data, status=status.HTTP_200_OK)
-        except RequestException as exc:
-            return build_paypal_error_response(exc, 'PayPal order capture failed')
-
 
 class InvoiceItemViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -508,7 +322,7 @@ class InvoiceItemViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         if self.request.user.is_staff:
             return InvoiceItem.objects.all()
-        customer = Customer.objects.filter(user=self.request.user).first()
+        customer = get_request_customer(self.request)
         if not customer:
             return InvoiceItem.objects.none()
         return InvoiceItem.objects.filter(invoice__customer=customer)
@@ -518,7 +332,7 @@ class CartViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
     def _get_customer(self, request):
-        return Customer.objects.filter(user=request.user).first()
+        return get_request_customer(request)
 
     def _get_or_create_cart(self, customer):
         cart, _ = Cart.objects.get_or_create(customer=customer)
@@ -549,7 +363,12 @@ class CartViewSet(viewsets.ViewSet):
         product = serializer.validated_data['product']
         quantity = serializer.validated_data['quantity']
 
-        if product.quantity_in_stock < quantity:
+        existing_quantity = (
+            CartItem.objects.filter(cart=cart, product=product).values_list('quantity', flat=True).first() or 0
+        )
+        try:
+            hold_stock(customer, product, existing_quantity + quantity)
+        except InsufficientStock:
             return Response({'detail': 'Insufficient stock.'}, status=status.HTTP_400_BAD_REQUEST)
 
         item, created = CartItem.objects.get_or_create(
@@ -589,7 +408,9 @@ class CartViewSet(viewsets.ViewSet):
         if quantity < 1:
             return Response({'detail': 'Quantity must be at least 1.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if item.product.quantity_in_stock < quantity:
+        try:
+            hold_stock(customer, item.product, quantity)
+        except InsufficientStock:
             return Response({'detail': 'Insufficient stock.'}, status=status.HTTP_400_BAD_REQUEST)
 
         item.quantity = quantity
@@ -607,9 +428,11 @@ class CartViewSet(viewsets.ViewSet):
         if not customer:
             return Response({'detail': 'Customer profile not found.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        deleted, _ = CartItem.objects.filter(id=item_id, cart__customer=customer).delete()
-        if not deleted:
+        item = CartItem.objects.filter(id=item_id, cart__customer=customer).first()
+        if item is None:
             return Response({'detail': 'Cart item not found.'}, status=status.HTTP_404_NOT_FOUND)
+        item.delete()
+        release_holds(customer, [item.product_id])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['post'])
@@ -618,6 +441,7 @@ class CartViewSet(viewsets.ViewSet):
         if not customer:
             return Response({'detail': 'Customer profile not found.'}, status=status.HTTP_400_BAD_REQUEST)
         CartItem.objects.filter(cart__customer=customer).delete()
+        release_holds(customer)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -625,7 +449,7 @@ class PaymentBaseAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def _get_customer(self, request):
-        return Customer.objects.filter(user=request.user).first()
+        return get_request_customer(request)
 
     def _invoice_queryset_for_request(self, request):
         if request.user.is_staff:
@@ -678,6 +502,7 @@ class PaymentProcessView(PaymentBaseAPIView):
     """
     Process a direct payment for an order/invoice.
     """
+    @idempotent
     def post(self, request):
         order_id = request.data.get('orderId')
         if not order_id:
@@ -795,69 +620,6 @@ class PaymentRefundView(PaymentBaseAPIView):
         }))
 
 
-class PayPalWebhookView(APIView):
-    permission_classes = [AllowAny]
-    authentication_classes = []
-
-    def post(self, request):
-        if not settings.PAYPAL_WEBHOOK_ID:
-            return Response({'detail': 'PayPal webhook not configured.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        headers = request.headers
-        try:
-            token = get_paypal_access_token()
-        except RequestException as exc:
-            return Response({'detail': f'PayPal token error: {str(exc)}'}, status=status.HTTP_502_BAD_GATEWAY)
-        payload = {
-            "auth_algo": headers.get('PayPal-Auth-Algo'),
-            "cert_url": headers.get('PayPal-Cert-Url'),
-            "transmission_id": headers.get('PayPal-Transmission-Id'),
-            "transmission_sig": headers.get('PayPal-Transmission-Sig'),
-            "transmission_time": headers.get('PayPal-Transmission-Time'),
-            "webhook_id": settings.PAYPAL_WEBHOOK_ID,
-            "webhook_event": request.data,
-        }
-
-        try:
-            verify = requests.post(
-                f"{settings.PAYPAL_BASE_URL}/v1/notifications/verify-webhook-signature",
-                json=payload,
-                headers={"Authorization": f"Bearer {token}"},
-                timeout=15,
-            )
-            verify.raise_for_status()
-            verification = verify.json()
-        except RequestException as exc:
-            return Response({'detail': f'PayPal verification failed: {str(exc)}'}, status=status.HTTP_502_BAD_GATEWAY)
-
-        if verification.get('verification_status') != 'SUCCESS':
-            return Response({'detail': 'Invalid signature.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        event_type = request.data.get('event_type')
-        resource = request.data.get('resource', {})
-        custom_id = None
-
-        if event_type in ['PAYMENT.CAPTURE.COMPLETED', 'CHECKOUT.ORDER.APPROVED']:
-            if 'purchase_units' in resource and resource['purchase_units']:
-                custom_id = resource['purchase_units'][0].get('custom_id')
-            if not custom_id:
-                custom_id = resource.get('custom_id')
-
-        if custom_id:
-            try:
-                invoice = Invoice.objects.get(id=custom_id)
-                invoice.status = 'paid'
-                invoice.paid_at = timezone.now()
-                invoice.paypal_transaction_id = resource.get('id', invoice.paypal_transaction_id)
-                payer = resource.get('payer', {})
-                invoice.paypal_payer_email = payer.get('email_address', invoice.paypal_payer_email)
-                invoice.save(update_fields=['status', 'paid_at', 'paypal_transaction_id', 'paypal_payer_email'])
-            except Invoice.DoesNotExist:
-                pass
-
-        return Response({'status': 'ok'})
-
-
 class PayPalReturnView(APIView):
     permission_classes = [AllowAny]
     authentication_classes = []
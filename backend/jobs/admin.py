@@ -0,0 +1,22 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'name', 'status', 'priority', 'run_at', 'attempts', 'max_attempts',
+        'wait_ms', 'duration_ms', 'finished_at',
+    ]
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'unique_key', 'last_error']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'locked_by', 'locked_at', 'wait_ms', 'duration_ms']
+    actions = ['retry_now']
+
+    @admin.action(description='Queue selected jobs to run now')
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, run_at=timezone.now(), attempts=0, locked_by='', locked_at=None,
+        )
+        self.message_user(request, f'{updated} job(s) queued.')
@@ -0,0 +1,33 @@
+import logging
+import signal
+from django.core.management.base import BaseCommand
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs until stopped (SIGINT/SIGTERM finish the current jobs first).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Jobs run in parallel (threads)')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger('jobs')
+        handler = logging.StreamHandler(self.stdout)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO if options['verbosity'] > 0 else logging.WARNING)
+        worker = Worker(
+            concurrency=max(options['concurrency'], 1),
+            burst=options['burst'],
+            poll_interval=options['poll_interval'],
+        )
+        if not options['burst']:
+            signal.signal(signal.SIGINT, worker.stop)
+            signal.signal(signal.SIGTERM, worker.stop)
+        try:
+            processed = worker.run()
+        finally:
+            logger.removeHandler(handler)
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker.name} ran {processed} job(s).'))
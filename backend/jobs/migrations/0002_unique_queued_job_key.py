@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("jobs", "0001_jobs"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="job",
+            name="unique_active_job_key",
+        ),
+        migrations.AddConstraint(
+            model_name="job",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("status", "queued"), models.Q(("unique_key", ""), _negated=True)
+                ),
+                fields=("unique_key",),
+                name="unique_queued_job_key",
+            ),
+        ),
+    ]
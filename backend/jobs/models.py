@@ -0,0 +1,65 @@
+from django.db import models
+from django.db.models import Q
+
+
+class Job(models.Model):
+    """
+    A unit of background work run by ``manage.py runworker``.
+
+    ``name`` selects a function registered with ``jobs.queue.task``, which
+    is called with ``kwargs``. Workers take the queued job with the highest
+    ``priority`` whose ``run_at`` has passed. A failing job is retried with
+    exponential backoff until ``max_attempts`` is reached.
+
+    ``unique_key`` (optional) allows only one queued job per key.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    PRIORITY_LOW = -10
+    PRIORITY_DEFAULT = 0
+    PRIORITY_HIGH = 10
+
+    name = models.CharField(max_length=100, db_index=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.SmallIntegerField(default=PRIORITY_DEFAULT)
+    run_at = models.DateTimeField()
+    unique_key = models.CharField(max_length=200, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Timing of the latest attempt, in milliseconds: time spent due but not
+    # yet picked up, and time spent running.
+    wait_ms = models.PositiveIntegerField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at', 'priority'], name='job_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unique_key'],
+                condition=Q(status='queued') & ~Q(unique_key=''),
+                name='unique_queued_job_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
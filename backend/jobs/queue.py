@@ -0,0 +1,226 @@
+"""
+Database-backed job queue.
+
+Tasks are plain functions registered with ``@task``, usually in an app's
+``tasks.py``::
+
+    @task('products.expire_stock_holds', every=300)
+    def expire_stock_holds():
+        ...
+
+``enqueue`` inserts a ``Job`` row, normally inside the request's
+transaction, so a job only becomes visible to workers once the data it
+refers to has been committed. Workers (``manage.py runworker``) call
+``run_next`` in a loop. It claims the best due job with a conditional
+``UPDATE``, so two workers never run the same job, and records its outcome
+and timings.
+
+A ``unique_key`` dedupes against jobs that are still queued, not ones
+already running: a running job may have read its inputs before the change
+that queued the new one, so the work must happen again.
+
+Tasks registered with ``every=`` (seconds) are periodic. Each one has at
+most one queued or running job, and finishing it queues the next run.
+"""
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+CLAIM_CANDIDATES = 10
+
+
+class Task:
+    def __init__(self, name, func, priority, max_attempts, every):
+        self.name = name
+        self.func = func
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.every = every
+
+
+registry = {}
+
+
+def task(name, priority=Job.PRIORITY_DEFAULT, max_attempts=None, every=None):
+    """Register the decorated function as the job ``name``."""
+    def decorator(func):
+        registry[name] = Task(name, func, priority, max_attempts, every)
+        return func
+    return decorator
+
+
+def periodic_key(name):
+    return f'periodic:{name}'
+
+
+def enqueue(name, kwargs=None, *, priority=None, run_at=None, delay=None, max_attempts=None, unique_key=''):
+    """
+    Queue job ``name`` to be called with ``kwargs`` (JSON-serialisable).
+
+    ``run_at`` or ``delay`` (seconds) schedules it for later. When a job
+    with the same ``unique_key`` is already queued (not yet running), that
+    job is returned instead of creating a duplicate.
+    """
+    spec = registry.get(name)
+    if spec is None:
+        raise KeyError(f'No task registered as {name!r}.')
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+    job = Job(
+        name=name,
+        kwargs=kwargs or {},
+        priority=spec.priority if priority is None else priority,
+        run_at=run_at,
+        max_attempts=max_attempts or spec.max_attempts or settings.JOB_MAX_ATTEMPTS,
+        unique_key=unique_key,
+    )
+    if not unique_key:
+        job.save()
+        return job
+    while True:
+        try:
+            with transaction.atomic():
+                job.save()
+            return job
+        except IntegrityError:
+            job.pk = None
+        existing = Job.objects.filter(unique_key=unique_key, status=Job.QUEUED).first()
+        if existing is not None:
+            return existing
+        # Claimed between the insert and the read: try the insert again.
+
+
+def schedule_periodic():
+    """Queue the first run of every periodic task that has none queued or running."""
+    for spec in registry.values():
+        key = periodic_key(spec.name)
+        if spec.every and not Job.objects.filter(unique_key=key, status__in=Job.ACTIVE_STATUSES).exists():
+            enqueue(spec.name, unique_key=key)
+
+
+def claim_next(worker_id, now=None):
+    """Mark the best due job as running for ``worker_id`` and return it (or None)."""
+    now = now or timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('-priority', 'run_at', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        due = due.select_for_update(skip_locked=True)
+    with transaction.atomic():
+        candidates = list(due.values_list('id', flat=True)[:CLAIM_CANDIDATES])
+        for job_id in candidates:
+            claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+                status=Job.RUNNING, locked_by=worker_id, locked_at=now, started_at=now,
+            )
+            if claimed:
+                return Job.objects.get(pk=job_id)
+    return None
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retry number ``attempts`` (exponential, jittered)."""
+    delay = min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome. Returns the updated job."""
+    spec = registry.get(job.name)
+    started = time.monotonic()
+    error = None
+    try:
+        if spec is None:
+            raise KeyError(f'No task registered as {job.name!r}.')
+        spec.func(**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Job %s #%s failed (attempt %s).', job.name, job.pk, job.attempts + 1)
+
+    job.duration_ms = int((time.monotonic() - started) * 1000)
+    job.wait_ms = max(int((job.started_at - job.run_at).total_seconds() * 1000), 0)
+    _finish(job, error)
+    return job
+
+
+def _finish(job, error):
+    now = timezone.now()
+    job.attempts += 1
+    job.locked_by = ''
+    job.locked_at = None
+    job.finished_at = now
+    if error is None:
+        job.status = Job.SUCCEEDED
+        job.last_error = ''
+    else:
+        job.last_error = error
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = now + timedelta(seconds=retry_delay(job.attempts))
+        else:
+            job.status = Job.FAILED
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            # A job with the same key was queued while this one ran; it
+            # does the work instead of this retry.
+            job.status = Job.FAILED
+            job.last_error = f'{error}\nNot retried: a newer job with the same key is queued.'
+            job.save()
+        spec = registry.get(job.name)
+        if job.status != Job.QUEUED and spec and spec.every and job.unique_key == periodic_key(job.name):
+            enqueue(job.name, run_at=job.started_at + timedelta(seconds=spec.every), unique_key=job.unique_key)
+
+
+def run_next(worker_id):
+    """Claim and run one due job. Returns it, or None when nothing is due."""
+    job = claim_next(worker_id)
+    if job is not None:
+        run_job(job)
+    return job
+
+
+def requeue_stale(timeout=None):
+    """
+    Give up on running jobs whose worker has not finished them within
+    ``timeout`` seconds (it was most likely killed). They count as a failed
+    attempt and are retried like any other failure.
+    """
+    cutoff = timezone.now() - timedelta(seconds=timeout or settings.JOB_LOCK_TIMEOUT)
+    stale = list(Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff))
+    for job in stale:
+        _finish(job, f'Abandoned by worker {job.locked_by}.')
+    return len(stale)
+
+
+def purge_finished(older_than=None):
+    """Delete succeeded jobs finished more than ``older_than`` seconds ago."""
+    cutoff = timezone.now() - timedelta(seconds=older_than or settings.JOB_RETENTION)
+    deleted, _ = Job.objects.filter(status=Job.SUCCEEDED, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def job_stats(since):
+    """Per task name: job counts by status and timings of jobs finished since ``since``."""
+    finished = Q(finished_at__gte=since)
+    return list(
+        Job.objects.values('name')
+        .annotate(
+            queued=Count('id', filter=Q(status=Job.QUEUED)),
+            running=Count('id', filter=Q(status=Job.RUNNING)),
+            succeeded=Count('id', filter=finished & Q(status=Job.SUCCEEDED)),
+            failed=Count('id', filter=finished & Q(status=Job.FAILED)),
+            avg_duration_ms=Avg('duration_ms', filter=finished),
+            max_duration_ms=Max('duration_ms', filter=finished),
+            avg_wait_ms=Avg('wait_ms', filter=finished),
+        )
+        .order_by('name')
+    )
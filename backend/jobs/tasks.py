@@ -0,0 +1,6 @@
+from .queue import purge_finished, task
+
+
+@task('jobs.purge_finished', every=86400, priority=-10)
+def purge_finished_jobs():
+    purge_finished()
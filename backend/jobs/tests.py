@@ -0,0 +1,160 @@
+import pytest
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from jobs.models import Job
+from jobs.queue import (
+    Task,
+    claim_next,
+    enqueue,
+    periodic_key,
+    purge_finished,
+    registry,
+    requeue_stale,
+    run_job,
+    run_next,
+    schedule_periodic,
+    task,
+)
+
+calls = []
+
+
+@task('tests.record')
+def record(value=None):
+    calls.append(value)
+
+
+@task('tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+@pytest.mark.django_db
+class TestJobQueue:
+    def test_runs_queued_job_and_records_timings(self):
+        job = enqueue('tests.record', {'value': 1})
+        assert run_next('w1').pk == job.pk
+        job.refresh_from_db()
+        assert calls == [1]
+        assert job.status == Job.SUCCEEDED
+        assert job.attempts == 1
+        assert job.duration_ms is not None and job.wait_ms is not None
+        assert run_next('w1') is None
+
+    def test_unknown_task_cannot_be_queued(self):
+        with pytest.raises(KeyError):
+            enqueue('tests.nope')
+
+    def test_higher_priority_and_due_jobs_first(self):
+        enqueue('tests.record', {'value': 'low'}, priority=Job.PRIORITY_LOW)
+        enqueue('tests.record', {'value': 'later'}, delay=3600, priority=Job.PRIORITY_HIGH)
+        enqueue('tests.record', {'value': 'high'}, priority=Job.PRIORITY_HIGH)
+        while run_next('w1'):
+            pass
+        assert calls == ['high', 'low']
+
+    def test_claimed_job_is_not_claimed_again(self):
+        enqueue('tests.record')
+        assert claim_next('w1') is not None
+        assert claim_next('w2') is None
+
+    def test_failure_is_retried_with_backoff_then_fails(self):
+        job = enqueue('tests.explode')
+        run_next('w1')
+        job.refresh_from_db()
+        assert job.status == Job.QUEUED
+        assert job.run_at > timezone.now()
+        assert 'boom' in job.last_error
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        run_next('w1')
+        job.refresh_from_db()
+        assert job.status == Job.FAILED
+        assert job.attempts == 2
+
+    def test_unique_key_deduplicates_active_jobs(self):
+        first = enqueue('tests.record', unique_key='sync')
+        assert enqueue('tests.record', unique_key='sync').pk == first.pk
+        run_next('w1')
+        assert enqueue('tests.record', unique_key='sync').pk != first.pk
+
+    def test_unique_key_queues_again_while_running(self):
+        running = enqueue('tests.record', unique_key='thumbs')
+        claim_next('w1')
+        queued = enqueue('tests.record', unique_key='thumbs')
+        assert queued.pk != running.pk
+        assert enqueue('tests.record', unique_key='thumbs').pk == queued.pk
+
+    def test_retry_gives_way_to_a_newer_queued_job(self):
+        job = enqueue('tests.explode', unique_key='boom')
+        claimed = claim_next('w1')
+        newer = enqueue('tests.explode', unique_key='boom')
+        run_job(claimed)
+        job.refresh_from_db()
+        assert job.status == Job.FAILED
+        assert 'newer job' in job.last_error
+        assert Job.objects.get(unique_key='boom', status=Job.QUEUED).pk == newer.pk
+
+    def test_running_periodic_task_is_not_scheduled_again(self, monkeypatch):
+        monkeypatch.setitem(registry, 'tests.tick', Task('tests.tick', record, 0, None, every=60))
+        schedule_periodic()
+        Job.objects.filter(name='tests.tick').update(status=Job.RUNNING)
+        schedule_periodic()
+        assert Job.objects.filter(name='tests.tick').count() == 1
+
+    def test_periodic_task_queues_its_next_run(self, monkeypatch):
+        monkeypatch.setitem(registry, 'tests.tick', Task('tests.tick', record, 0, None, every=60))
+        schedule_periodic()
+        schedule_periodic()
+        assert Job.objects.filter(name='tests.tick').count() == 1
+
+        Job.objects.exclude(name='tests.tick').delete()
+        run_next('w1')
+        upcoming = Job.objects.get(name='tests.tick', status=Job.QUEUED)
+        assert upcoming.unique_key == periodic_key('tests.tick')
+        assert upcoming.run_at > timezone.now() + timedelta(seconds=50)
+
+    def test_abandoned_job_is_requeued(self):
+        job = enqueue('tests.record')
+        claim_next('w1')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        assert requeue_stale() == 1
+        job.refresh_from_db()
+        assert job.status == Job.QUEUED
+        assert job.attempts == 1
+
+    def test_purge_finished_keeps_recent_jobs(self):
+        old = enqueue('tests.record')
+        recent = enqueue('tests.record')
+        run_next('w1')
+        run_next('w1')
+        Job.objects.filter(pk=old.pk).update(finished_at=timezone.now() - timedelta(days=30))
+        assert purge_finished() == 1
+        assert Job.objects.filter(pk=recent.pk).exists()
+
+
+@pytest.mark.django_db
+class TestRunWorker:
+    def test_burst_runs_due_jobs_and_exits(self):
+        enqueue('tests.record', {'value': 'a'})
+        enqueue('tests.record', {'value': 'b'})
+        call_command('runworker', '--burst', verbosity=0)
+        assert sorted(calls) == ['a', 'b']
+        assert Job.objects.filter(name='tests.record', status=Job.SUCCEEDED).count() == 2
+
+    def test_stats_endpoint(self, staff_client):
+        enqueue('tests.record')
+        run_next('w1')
+        response = staff_client.get('/api/jobs/stats/')
+        assert response.status_code == 200
+        stats = {row['name']: row for row in response.data['tasks']}
+        assert stats['tests.record']['succeeded'] == 1
+
+    def test_stats_requires_staff(self, authenticated_client):
+        assert authenticated_client.get('/api/jobs/stats/').status_code == 403
@@ -0,0 +1,24 @@
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .queue import job_stats
+
+
+class JobStatsView(APIView):
+    """
+    Background job counts and timings per task.
+
+    **Query Parameters:**
+    - hours: window for finished jobs and their timings (default: 24)
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            hours = int(request.query_params.get('hours', 24))
+        except ValueError:
+            return Response({'detail': 'hours must be an integer.'}, status=400)
+        since = timezone.now() - timedelta(hours=hours)
+        return Response({'since': since, 'tasks': job_stats(since)})
@@ -0,0 +1,82 @@
+"""
+The ``runworker`` loop: ``concurrency`` loops, one in the calling thread and
+the rest in worker threads, each claiming and running jobs until stopped.
+Threads suit the queue's workload (HTTP calls, email, database queries);
+run several worker processes for CPU-heavy tasks.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, connection
+from .queue import requeue_stale, run_next, schedule_periodic
+
+logger = logging.getLogger(__name__)
+
+# Seconds between sweeps for jobs abandoned by dead workers.
+MAINTENANCE_INTERVAL = 60
+
+
+class Worker:
+    def __init__(self, concurrency=1, burst=False, poll_interval=None):
+        self.concurrency = concurrency
+        self.burst = burst
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    def stop(self, *args):
+        """Finish the jobs in progress, then exit."""
+        self.stopping.set()
+
+    def run(self):
+        """Run until stopped (or, in burst mode, until no job is due). Returns jobs run."""
+        self._sweep_at = 0
+        schedule_periodic()
+        # The first loop runs in this thread so signals still reach it.
+        threads = [
+            threading.Thread(target=self._loop, args=(f'{self.name}/{index}',), daemon=True)
+            for index in range(1, self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        self._loop(f'{self.name}/0', close=False)
+        for thread in threads:
+            thread.join()
+        return self.processed
+
+    def _sweep(self):
+        with self._lock:
+            if time.monotonic() < self._sweep_at:
+                return
+            self._sweep_at = time.monotonic() + MAINTENANCE_INTERVAL
+        requeued = requeue_stale()
+        if requeued:
+            logger.warning('Requeued %s abandoned job(s).', requeued)
+
+    def _loop(self, worker_id, close=True):
+        try:
+            while not self.stopping.is_set():
+                if not connection.in_atomic_block:
+                    # Drop connections the database closed while we idled.
+                    close_old_connections()
+                self._sweep()
+                job = run_next(worker_id)
+                if job is not None:
+                    with self._lock:
+                        self.processed += 1
+                    logger.info(
+                        'Job %s #%s %s in %sms (waited %sms).',
+                        job.name, job.pk, job.status, job.duration_ms, job.wait_ms,
+                    )
+                    continue
+                if self.burst:
+                    return
+                self.stopping.wait(self.poll_interval)
+        finally:
+            if close:
+                connection.close()
@@ -1,25 +1,32 @@
 from django.contrib import admin
-from .models import Category, Product, Promotion
+from .models import Category, Product, Promotion, StockHold, StockMovement
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'created_at']
+    list_display = ['name', 'product_count', 'created_at']
     search_fields = ['name']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_product_counts(active_only=True)
+
+    @admin.display(description='Active products', ordering='product_count')
+    def product_count(self, obj):
+        return obj.product_count
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'brand', 'category', 'price', 'quantity_in_stock', 'stock_status', 'is_active']
     list_filter = ['category', 'is_active', 'created_at']
     search_fields = ['name', 'brand', 'barcode', 'openfoodfacts_id']
-    readonly_fields = ['created_at', 'updated_at', 'last_synced']
+    readonly_fields = ['created_at', 'updated_at', 'last_synced', 'picture_mirror', 'picture_mirror_failed', 'picture_variants']
     fieldsets = [
         ('Basic Information', {
             'fields': ['name', 'brand', 'category', 'price', 'description']
         }),
         ('Images', {
-            'fields': ['picture', 'picture_url']
+            'fields': ['picture', 'picture_url', 'picture_mirror', 'picture_mirror_failed', 'picture_variants']
         }),
         ('Stock', {
             'fields': ['quantity_in_stock']
@@ -39,6 +46,14 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     ]
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Write only the edited fields, so an unrelated edit does not put
+        # back the stock level the form loaded over sales made since.
+        if form.changed_data:
+            obj.save(update_fields=[*form.changed_data, 'updated_at'])
+
 
 @admin.register(Promotion)
 class PromotionAdmin(admin.ModelAdmin):
@@ -46,3 +61,28 @@ class PromotionAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'start_date', 'end_date']
     search_fields = ['title', 'description', 'product__name']
     readonly_fields = ['created_at']
+
+
+@admin.register(StockHold)
+class StockHoldAdmin(admin.ModelAdmin):
+    list_display = ['product', 'customer', 'quantity', 'created_at', 'expires_at']
+    search_fields = ['product__name', 'customer__first_name', 'customer__last_name']
+    raw_id_fields = ['product', 'customer']
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['product', 'kind', 'quantity', 'reference', 'created_by', 'created_at']
+    list_filter = ['kind', 'created_at']
+    search_fields = ['product__name', 'reference']
+    raw_id_fields = ['product', 'created_by']
+
+    # Movements are written by the ledger together with the stock change.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,104 @@
+"""
+Async Open Food Facts sync endpoint.
+
+The request spends almost all of its time waiting on Open Food Facts, so it
+runs as a native async view on the ASGI server rather than holding a worker
+thread for the duration of the call.
+"""
+from decimal import Decimal
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from core.async_api import async_api_view
+from core.http import get_async_client
+from .models import Product
+from .serializers import ProductSerializer
+
+OPEN_FOOD_FACTS_HEADERS = {
+    'User-Agent': 'Trinity-Dev-App - iOS - Version 1.0 - https://github.com/amoiz0468/trinity-dev-app',
+}
+
+
+@async_api_view(permission='admin')
+async def sync_openfoodfacts(request):
+    """
+    Sync products with Open Food Facts API.
+
+    **Request Body:**
+    ```json
+    {
+        "barcode": "3017620422003"
+    }
+    ```
+
+    **Returns:**
+    - Product data auto-populated from Open Food Facts
+    - Nutritional information included
+    - Either creates new product or updates existing one
+    """
+    barcode = request.data.get('barcode')
+
+    if not barcode:
+        return JsonResponse({'error': 'Barcode is required'}, status=400)
+
+    try:
+        # Open Food Facts requires a User-Agent header and .json extension is more reliable
+        url = f"{settings.OPEN_FOOD_FACTS_API_URL}/product/{barcode}.json"
+        response = await get_async_client().get(url, headers=OPEN_FOOD_FACTS_HEADERS, timeout=10)
+
+        if response.status_code != 200:
+            return JsonResponse({'error': 'Failed to fetch from Open Food Facts'}, status=502)
+
+        data = response.json()
+
+        if data.get('status') != 1:
+            return JsonResponse({'error': 'Product not found in Open Food Facts'}, status=404)
+
+        product_data = data.get('product', {})
+        nutriments = product_data.get('nutriments', {})
+
+        synced_fields = {
+            'name': product_data.get('product_name', 'Unknown'),
+            'brand': product_data.get('brands', ''),
+            'picture_url': product_data.get('image_url', ''),
+            'description': product_data.get('ingredients_text', ''),
+            'openfoodfacts_id': product_data.get('id', ''),
+            'energy_kcal': nutriments.get('energy-kcal_100g'),
+            'fat': nutriments.get('fat_100g'),
+            'saturated_fat': nutriments.get('saturated-fat_100g'),
+            'carbohydrates': nutriments.get('carbohydrates_100g'),
+            'sugars': nutriments.get('sugars_100g'),
+            'proteins': nutriments.get('proteins_100g'),
+            'salt': nutriments.get('salt_100g'),
+            'fiber': nutriments.get('fiber_100g'),
+            'last_synced': timezone.now(),
+        }
+
+        product = await Product.objects.filter(barcode=barcode).afirst()
+        created = product is None
+        if created:
+            # Open Food Facts does not provide price/stock, use safe defaults.
+            # Existing products keep theirs: stock only changes through the ledger.
+            product = await Product.objects.acreate(
+                barcode=barcode,
+                price=Decimal('0.01'),
+                quantity_in_stock=0,
+                **synced_fields,
+            )
+        else:
+            for field, value in synced_fields.items():
+                setattr(product, field, value)
+            await product.asave(update_fields=[*synced_fields, 'updated_at'])
+
+        product_payload = await sync_to_async(lambda: ProductSerializer(product).data)()
+        return JsonResponse(
+            {'created': created, 'product': product_payload},
+            status=201 if created else 200,
+        )
+
+    except httpx.HTTPError as e:
+        return JsonResponse({'error': f'API request failed: {str(e)}'}, status=502)
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
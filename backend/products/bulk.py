@@ -0,0 +1,234 @@
+"""
+Bulk catalog operations used by the admin API and management commands.
+
+``apply_stock_rows`` receives a whole delivery (or stock count) at once: it
+resolves every product in one query, applies all changes with a single
+``CASE`` update and records the matching ledger movements with one
+``bulk_create``.
+
+``upsert_products`` writes many products keyed on ``barcode`` with chunked
+``bulk_create(update_conflicts=True)``, resolving categories by name in one
+query.
+"""
+import csv
+import io
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils import timezone
+from core.versioning import bump_version
+from .mirror import queue_picture_processing
+from .models import Category, Product, StockMovement
+from .signals import CATALOG_VERSION_SCOPE
+
+STOCK_ROW_FIELDS = ('id', 'barcode', 'quantity', 'delta')
+
+UPSERT_MODES = ('create', 'update', 'upsert')
+UPSERT_CHUNK_SIZE = 500
+
+# Needed to create a product; updates may send any subset of fields.
+FIELDS_REQUIRED_TO_CREATE = ('name', 'price')
+
+# Insert values for columns an update does not touch. They satisfy NOT NULL
+# on the INSERT half of the upsert but are never written to existing rows.
+INSERT_PLACEHOLDERS = {'name': '', 'price': Decimal('0.01')}
+
+
+def read_stock_csv(text):
+    """
+    Parse CSV with a header row naming ``id`` or ``barcode`` and
+    ``quantity`` or ``delta`` columns into row dicts.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    return [
+        {field: (row.get(field) or '').strip() for field in STOCK_ROW_FIELDS if (row.get(field) or '').strip()}
+        for row in reader
+    ]
+
+
+def _parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer.')
+
+
+def _parse_stock_row(row):
+    """Return ``(lookup, mode, amount)`` or raise ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError('Expected an object.')
+    if row.get('id') not in (None, ''):
+        lookup = ('id', _parse_int(row['id'], 'id'))
+    elif row.get('barcode') not in (None, ''):
+        lookup = ('barcode', str(row['barcode']).strip())
+    else:
+        raise ValueError('id or barcode is required.')
+
+    has_quantity = row.get('quantity') not in (None, '')
+    has_delta = row.get('delta') not in (None, '')
+    if has_quantity == has_delta:
+        raise ValueError('Provide exactly one of quantity or delta.')
+    if has_quantity:
+        quantity = _parse_int(row['quantity'], 'quantity')
+        if quantity < 0:
+            raise ValueError('quantity cannot be negative.')
+        return lookup, 'quantity', quantity
+    return lookup, 'delta', _parse_int(row['delta'], 'delta')
+
+
+def apply_stock_rows(rows, user=None, reference=''):
+    """
+    Apply stock changes for many products in one transaction.
+
+    Each row sets an absolute ``quantity`` or adds a ``delta`` for a product
+    identified by ``id`` or ``barcode``. Invalid rows are reported and
+    skipped; the rest are applied. Positive deltas are recorded as receipts,
+    everything else as adjustments.
+
+    Returns ``(results, applied)``: one result per input row, in order.
+    """
+    results = [None] * len(rows)
+    parsed = []
+    for index, row in enumerate(rows):
+        try:
+            parsed.append((index, *_parse_stock_row(row)))
+        except ValueError as exc:
+            results[index] = {'row': index + 1, 'error': str(exc)}
+
+    ids = {value for _, (field, value), _, _ in parsed if field == 'id'}
+    barcodes = {value for _, (field, value), _, _ in parsed if field == 'barcode'}
+    changes = {}
+    with transaction.atomic():
+        products = (
+            Product.objects.select_for_update()
+            .filter(Q(id__in=ids) | Q(barcode__in=barcodes))
+            .values_list('id', 'barcode', 'quantity_in_stock')
+        )
+        by_id, by_barcode = {}, {}
+        for product_id, barcode, stock in products:
+            by_id[product_id] = stock
+            if barcode:
+                by_barcode[barcode] = product_id
+
+        for index, (field, value), mode, amount in parsed:
+            product_id = value if field == 'id' else by_barcode.get(value)
+            if product_id not in by_id:
+                results[index] = {'row': index + 1, 'error': f'Unknown product {field} {value}.'}
+                continue
+            if product_id in changes:
+                results[index] = {'row': index + 1, 'error': 'Product appears more than once.'}
+                continue
+            current = by_id[product_id]
+            new_quantity = amount if mode == 'quantity' else current + amount
+            if new_quantity < 0:
+                results[index] = {'row': index + 1, 'error': f'Stock would become negative ({new_quantity}).'}
+                continue
+            changes[product_id] = (current, new_quantity, mode)
+            results[index] = {'row': index + 1, 'product': product_id, 'quantity_in_stock': new_quantity}
+
+        changed = {pk: change for pk, change in changes.items() if change[0] != change[1]}
+        if changed:
+            Product.objects.filter(id__in=changed).update(
+                quantity_in_stock=Case(
+                    *[When(id=pk, then=Value(new)) for pk, (_, new, _) in changed.items()],
+                    output_field=IntegerField(),
+                ),
+                updated_at=timezone.now(),
+            )
+            StockMovement.objects.bulk_create([
+                StockMovement(
+                    product_id=pk,
+                    kind=StockMovement.RECEIPT if mode == 'delta' and new > old else StockMovement.ADJUSTMENT,
+                    quantity=new - old,
+                    reference=reference,
+                    created_by=user,
+                )
+                for pk, (old, new, mode) in changed.items()
+            ])
+            transaction.on_commit(lambda: bump_version(CATALOG_VERSION_SCOPE))
+
+    return results, len(changes)
+
+
+def upsert_products(serializer, mode='upsert'):
+    """
+    Create and/or update the products in a ``ProductBulkSerializer(many=True,
+    partial=True)`` keyed on ``barcode``.
+
+    ``mode`` is ``create`` (existing barcodes are errors), ``update`` (unknown
+    barcodes are errors) or ``upsert``. Invalid rows are reported and
+    skipped. Returns one result per input row, in order.
+    """
+    rows, errors = serializer.validate_rows()
+    results = [None] * len(serializer.initial_data)
+    for index, row_errors in errors.items():
+        results[index] = {'row': index + 1, 'errors': row_errors}
+
+    barcodes = [data['barcode'] for _, data in rows]
+    category_names = {data['category'] for _, data in rows if data.get('category')}
+    existing = dict(Product.objects.filter(barcode__in=barcodes).values_list('barcode', 'picture_url'))
+    categories = dict(Category.objects.filter(name__in=category_names).values_list('name', 'id'))
+
+    seen = set()
+    writes = {}
+    for index, data in rows:
+        barcode = data['barcode']
+        error = None
+        if barcode in seen:
+            error = 'Barcode appears more than once.'
+        elif mode == 'create' and barcode in existing:
+            error = 'A product with this barcode already exists.'
+        elif mode == 'update' and barcode not in existing:
+            error = 'No product with this barcode.'
+        elif barcode not in existing and any(data.get(field) in (None, '') for field in FIELDS_REQUIRED_TO_CREATE):
+            error = f"{' and '.join(FIELDS_REQUIRED_TO_CREATE)} are required to create a product."
+        elif data.get('category') and data['category'] not in categories:
+            error = f"Unknown category {data['category']!r}."
+        seen.add(barcode)
+        if error:
+            results[index] = {'row': index + 1, 'barcode': barcode, 'errors': {'non_field_errors': [error]}}
+            continue
+
+        if 'category' in data:
+            data['category_id'] = categories.get(data.pop('category'))
+        # Rows sending the same fields share one statement per chunk.
+        writes.setdefault(frozenset(data) - {'barcode'}, []).append((index, data))
+
+    # bulk_create() sends no post_save: drop the mirror and thumbnails of
+    # the old picture here, and queue the new one's below.
+    repointed = [
+        data['barcode'] for group in writes.values() for _, data in group
+        if 'picture_url' in data and data['picture_url'] != existing.get(data['barcode'], '')
+    ]
+
+    with transaction.atomic():
+        for fields, group in writes.items():
+            for start in range(0, len(group), UPSERT_CHUNK_SIZE):
+                chunk = group[start:start + UPSERT_CHUNK_SIZE]
+                Product.objects.bulk_create(
+                    [Product(**{**INSERT_PLACEHOLDERS, **data}) for _, data in chunk],
+                    update_conflicts=True,
+                    unique_fields=['barcode'],
+                    update_fields=[*sorted(fields), 'updated_at'],
+                )
+        if repointed:
+            repointed_ids = list(Product.objects.filter(barcode__in=repointed).values_list('id', flat=True))
+            Product.objects.filter(pk__in=repointed_ids).update(picture_mirror='', picture_mirror_failed='')
+            no_file = Q(picture__isnull=True) | Q(picture='')
+            Product.objects.filter(no_file, pk__in=repointed_ids).update(picture_variants={})
+            transaction.on_commit(lambda: queue_picture_processing(repointed_ids))
+        if writes:
+            transaction.on_commit(lambda: bump_version(CATALOG_VERSION_SCOPE))
+
+    written = [data['barcode'] for group in writes.values() for _, data in group]
+    ids = dict(Product.objects.filter(barcode__in=written).values_list('barcode', 'id'))
+    for group in writes.values():
+        for index, data in group:
+            barcode = data['barcode']
+            results[index] = {
+                'row': index + 1,
+                'barcode': barcode,
+                'id': ids.get(barcode),
+                'status': 'updated' if barcode in existing else 'created',
+            }
+    return results
@@ -0,0 +1,94 @@
+"""
+Delta-sync feed for the mobile catalog.
+
+Products and promotions are walked in ``(updated_at, id)`` order, backed by
+the matching indexes. The cursor handed to clients records the last position
+reached in each stream, so a client only downloads rows written since its
+previous sync. Products and promotions are deleted softly (``is_active``
+cleared), so deletions reach clients as changed rows.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+from django.db.models import Q
+from django.utils import timezone
+from .models import Product, Promotion
+
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+
+# Rows written in the last moments may still belong to transactions that have
+# not committed yet; holding them back keeps the cursor from skipping them.
+SETTLE_WINDOW = timedelta(seconds=2)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(positions):
+    payload = {
+        key: [updated_at.isoformat(), pk]
+        for key, (updated_at, pk) in positions.items()
+        if updated_at is not None
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return {}
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return {
+            key: (datetime.fromisoformat(updated_at), int(pk))
+            for key, (updated_at, pk) in payload.items()
+            if key in ('products', 'promotions')
+        }
+    except (ValueError, TypeError, AttributeError):
+        raise InvalidCursor('Invalid cursor.')
+
+
+def _changed_rows(queryset, position, until, limit):
+    queryset = queryset.filter(updated_at__lte=until)
+    if position:
+        updated_at, pk = position
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk)
+        )
+    rows = list(queryset.order_by('updated_at', 'id')[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def collect_changes(cursor, limit=DEFAULT_LIMIT):
+    """
+    Return the products and promotions changed after ``cursor``.
+
+    The result holds the changed rows, a flag telling whether either stream
+    was truncated by ``limit``, and the cursor for the next call.
+    """
+    positions = decode_cursor(cursor)
+    until = timezone.now() - SETTLE_WINDOW
+
+    products, more_products = _changed_rows(
+        Product.objects.select_related('category'),
+        positions.get('products'), until, limit,
+    )
+    promotions, more_promotions = _changed_rows(
+        Promotion.objects.select_related('product'),
+        positions.get('promotions'), until, limit,
+    )
+
+    if products:
+        positions['products'] = (products[-1].updated_at, products[-1].id)
+    if promotions:
+        positions['promotions'] = (promotions[-1].updated_at, promotions[-1].id)
+
+    return {
+        'products': products,
+        'promotions': promotions,
+        'has_more': more_products or more_promotions,
+        'cursor': encode_cursor(positions),
+    }
@@ -0,0 +1,93 @@
+"""
+``values()``-based serializers for the catalog list endpoints (see
+``core.fastpath``).
+"""
+from decimal import Decimal
+from django.utils import timezone
+from core.fastpath import ValuesSerializer
+from .images import variant_urls
+from .mirror import mirror_url
+from .models import Product, Promotion, product_count_subquery
+from .serializers import CategorySerializer, ProductListSerializer, PromotionSerializer
+
+
+def stock_status(quantity):
+    # Same thresholds as ``Product.stock_status``.
+    if quantity == 0:
+        return "Out of Stock"
+    elif quantity < 10:
+        return "Low Stock"
+    return "In Stock"
+
+
+class ProductListValues(ValuesSerializer):
+    serializer_class = ProductListSerializer
+    requires = {
+        'picture_url': ['picture_url', 'picture', 'picture_mirror'],
+        'picture_variants': ['picture_variants'],
+        'stock_status': ['quantity_in_stock'],
+        'current_price': ['price'],
+    }
+
+    def prepare(self, rows):
+        if 'active_promotion' not in self.names and 'current_price' not in self.names:
+            return
+        # One query for the promotions running now, in the order
+        # ``get_active_promotion`` would pick them.
+        now = timezone.now()
+        promotions = list(
+            Promotion.objects.filter(is_active=True, start_date__lte=now, end_date__gte=now)
+            .select_related('product')
+            .order_by('-discount_percentage', '-start_date')
+        )
+        self._storewide = next((promotion for promotion in promotions if promotion.product_id is None), None)
+        self._by_product = {}
+        for promotion in promotions:
+            if promotion.product_id is not None:
+                self._by_product.setdefault(promotion.product_id, promotion)
+        self._rank = {promotion.pk: rank for rank, promotion in enumerate(promotions)}
+        self._promotion_data = {}
+
+    def promotion_for(self, row):
+        candidates = [self._by_product.get(row['pk']), self._storewide]
+        candidates = [promotion for promotion in candidates if promotion is not None]
+        return min(candidates, key=lambda promotion: self._rank[promotion.pk]) if candidates else None
+
+    def get_picture_url(self, row):
+        if row['picture']:
+            url = Product._meta.get_field('picture').storage.url(row['picture'])
+            request = self.context.get('request')
+            return request.build_absolute_uri(url) if request else url
+        if row['picture_mirror']:
+            return mirror_url(row['picture_mirror'], self.context.get('request'))
+        return row['picture_url']
+
+    def get_picture_variants(self, row):
+        return variant_urls(row['picture_variants'], self.context.get('request'))
+
+    def get_stock_status(self, row):
+        return stock_status(row['quantity_in_stock'])
+
+    def get_active_promotion(self, row):
+        promotion = self.promotion_for(row)
+        if promotion is None:
+            return None
+        if promotion.pk not in self._promotion_data:
+            self._promotion_data[promotion.pk] = PromotionSerializer(promotion, context=self.context).data
+        return self._promotion_data[promotion.pk]
+
+    def get_current_price(self, row):
+        # Same arithmetic as ``Product.current_price``.
+        promotion = self.promotion_for(row)
+        if promotion and promotion.discount_percentage:
+            price = Decimal(str(row['price']))
+            discount_percentage = Decimal(str(promotion.discount_percentage))
+            return price - (price * discount_percentage) / Decimal('100')
+        return row['price']
+
+
+class CategoryValues(ValuesSerializer):
+    serializer_class = CategorySerializer
+
+    def get_annotations(self):
+        return {'product_count': product_count_subquery()}
@@ -0,0 +1,121 @@
+"""
+Stock reservations for carts.
+
+Adding to a cart places a ``StockHold`` for the customer instead of only
+reading ``quantity_in_stock``. Holds expire after ``STOCK_HOLD_TTL`` seconds;
+expired rows are ignored straight away and deleted in batches by the
+``expire_stock_holds`` command. At checkout the customer's holds are turned
+into stock decrements (``convert_holds``), so a customer who got an item into
+their cart is not beaten to it by someone who has not.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .ledger import apply_movement
+from .models import Product, StockHold, StockMovement
+
+EXPIRY_BATCH_SIZE = 1000
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product, available):
+        self.product = product
+        self.available = available
+        super().__init__(f'Insufficient stock for {product.name}.')
+
+
+def active_holds(now=None):
+    return StockHold.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def held_quantities(product_ids, exclude_customer=None):
+    """Map product id -> quantity held by active holds (optionally not counting one customer's)."""
+    holds = active_holds().filter(product_id__in=product_ids)
+    if exclude_customer is not None:
+        holds = holds.exclude(customer=exclude_customer)
+    rows = holds.values('product_id').annotate(held=Sum('quantity')).values_list('product_id', 'held')
+    return dict(rows)
+
+
+def available_to_promise(product, customer=None):
+    """Stock that ``customer`` (or anyone, when None) could still be promised."""
+    held = held_quantities([product.pk], exclude_customer=customer).get(product.pk, 0)
+    return max(product.quantity_in_stock - held, 0)
+
+
+def hold_stock(customer, product, quantity):
+    """
+    Set ``customer``'s hold on ``product`` to ``quantity`` and restart its TTL.
+
+    Raises ``InsufficientStock`` (leaving any previous hold in place) when
+    other customers' holds leave too little stock.
+    """
+    with transaction.atomic():
+        # Lock the product row so customers racing for the last units (and
+        # checkouts decrementing it) take turns. Without the lock, under READ
+        # COMMITTED neither sees the other's uncommitted hold and both pass.
+        stock = Product.objects.select_for_update().values_list('quantity_in_stock', flat=True).get(pk=product.pk)
+        held = held_quantities([product.pk], exclude_customer=customer).get(product.pk, 0)
+        if stock - held < quantity:
+            raise InsufficientStock(product, max(stock - held, 0))
+        StockHold.objects.filter(customer=customer, product=product).delete()
+        hold = StockHold.objects.create(
+            customer=customer,
+            product=product,
+            quantity=quantity,
+            expires_at=timezone.now() + timedelta(seconds=settings.STOCK_HOLD_TTL),
+        )
+    return hold
+
+
+def release_holds(customer, product_ids=None):
+    holds = StockHold.objects.filter(customer=customer)
+    if product_ids is not None:
+        holds = holds.filter(product_id__in=product_ids)
+    holds.delete()
+
+
+def convert_holds(customer, quantities, reference=''):
+    """
+    Record the sale of ``quantities`` (product id -> quantity) at checkout and
+    drop ``customer``'s holds on those products.
+
+    Must run inside the checkout transaction. Each decrement is a single
+    conditional ``UPDATE`` through the stock ledger rather than a locked
+    read-modify-write; stock held by other customers is not available.
+    Raises ``InsufficientStock``.
+    """
+    product_ids = list(quantities)
+    held_by_others = held_quantities(product_ids, exclude_customer=customer)
+    for product_id in sorted(product_ids):
+        reserve = held_by_others.get(product_id, 0)
+        sold = apply_movement(
+            product_id,
+            -quantities[product_id],
+            StockMovement.SALE,
+            reference,
+            keep_available=reserve,
+        )
+        if not sold:
+            product = Product.objects.get(pk=product_id)
+            raise InsufficientStock(product, max(product.quantity_in_stock - reserve, 0))
+    if customer is not None:
+        release_holds(customer, product_ids)
+
+
+def expire_holds(batch_size=EXPIRY_BATCH_SIZE):
+    """Delete expired holds in batches; returns how many were removed."""
+    now = timezone.now()
+    total = 0
+    while True:
+        ids = list(
+            StockHold.objects.filter(expires_at__lte=now)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        deleted, _ = StockHold.objects.filter(id__in=ids).delete()
+        total += deleted
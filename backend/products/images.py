@@ -0,0 +1,176 @@
+"""
+Product image thumbnails.
+
+The product picture (the uploaded file, else its local mirror, see
+``products.mirror``, else ``picture_url``) is scaled to fit each of
+``PRODUCT_THUMBNAIL_WIDTHS`` and saved as WebP and JPEG under
+``products/thumbs/<sha256 of the source>/``. Those names never
+change meaning, so they are stored with an immutable cache header (see
+``core.storage``). ``Product.picture_variants`` records them as
+``{"160": {"webp": name, "jpeg": name}, ...}``.
+
+Sizes larger than the source are not upscaled: only the first of them is
+produced, at the source's own size.
+
+Generation runs in the background worker (``products.generate_thumbnails``),
+queued when a product's picture changes.
+"""
+import hashlib
+import io
+import logging
+import httpx
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import F, Q
+from PIL import Image, ImageOps
+from core.storage import immutable_storage
+from jobs.queue import enqueue
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+GENERATE_THUMBNAILS_TASK = 'products.generate_thumbnails'
+
+# format key -> (Pillow format, file extension, save options)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+IMAGE_HEADERS = {
+    'User-Agent': 'Trinity-Dev-App - iOS - Version 1.0 - https://github.com/amoiz0468/trinity-dev-app',
+}
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def fetch_image(url):
+    """Download ``url``, refusing bodies over ``PRODUCT_IMAGE_MAX_BYTES``."""
+    limit = settings.PRODUCT_IMAGE_MAX_BYTES
+    timeout = httpx.Timeout(settings.OUTBOUND_HTTP_TIMEOUT, connect=settings.OUTBOUND_HTTP_CONNECT_TIMEOUT)
+    with httpx.stream('GET', url, headers=IMAGE_HEADERS, timeout=timeout, follow_redirects=True) as response:
+        if 400 <= response.status_code < 500:
+            raise InvalidImage(f'{url} returned {response.status_code}.')
+        response.raise_for_status()
+        data = bytearray()
+        for chunk in response.iter_bytes():
+            data += chunk
+            if len(data) > limit:
+                raise InvalidImage(f'{url} is larger than {limit} bytes.')
+    return bytes(data)
+
+
+def open_image(data):
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise InvalidImage(str(exc)) from exc
+    return ImageOps.exif_transpose(image)
+
+
+def _encode(image, format_key):
+    pil_format, _, options = THUMBNAIL_FORMATS[format_key]
+    if pil_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            if pil_format == 'JPEG':
+                # JPEG has no alpha: flatten onto white like the app's cards.
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+        else:
+            image = image.convert('RGB')
+    out = io.BytesIO()
+    image.save(out, pil_format, **options)
+    return out.getvalue()
+
+
+def render_thumbnails(data, widths=None):
+    """``{width: {format_key: bytes}}`` for the image in ``data``."""
+    image = open_image(data)
+    largest = max(image.size)
+    rendered = {}
+    for width in sorted(widths or settings.PRODUCT_THUMBNAIL_WIDTHS):
+        thumbnail = image.copy()
+        thumbnail.thumbnail((width, width), Image.LANCZOS)
+        rendered[width] = {format_key: _encode(thumbnail, format_key) for format_key in THUMBNAIL_FORMATS}
+        if width >= largest:
+            break
+    return rendered
+
+
+def store_thumbnails(data):
+    """Render and store thumbnails of ``data``; returns the ``picture_variants`` value."""
+    storage = immutable_storage()
+    digest = hashlib.sha256(data).hexdigest()
+    variants = {}
+    for width, encoded in render_thumbnails(data).items():
+        variants[str(width)] = {}
+        for format_key, content in encoded.items():
+            name = f'products/thumbs/{digest}/{width}.{THUMBNAIL_FORMATS[format_key][1]}'
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(content))
+            variants[str(width)][format_key] = name
+    return variants
+
+
+def picture_source(product):
+    """The bytes of ``product``'s picture, or ``None`` when it has none (or only one that failed mirroring)."""
+    if product.picture:
+        with product.picture.open('rb') as fh:
+            return fh.read()
+    if product.picture_mirror:
+        with immutable_storage().open(product.picture_mirror, 'rb') as fh:
+            return fh.read()
+    if product.picture_url and product.picture_url != product.picture_mirror_failed:
+        return fetch_image(product.picture_url)
+    return None
+
+
+def generate_thumbnails(product):
+    """Refresh ``product.picture_variants`` from its current picture."""
+    try:
+        data = picture_source(product)
+        variants = store_thumbnails(data) if data else {}
+    except InvalidImage as exc:
+        # Retrying will not help; list screens fall back to picture_url.
+        logger.warning('Cannot make thumbnails for product %s: %s', product.pk, exc)
+        variants = {}
+    if variants != product.picture_variants:
+        product.picture_variants = variants
+        product.save(update_fields=['picture_variants', 'updated_at'])
+    return variants
+
+
+def queue_thumbnails(product_id):
+    return enqueue(
+        GENERATE_THUMBNAILS_TASK,
+        {'product_id': product_id},
+        unique_key=f'{GENERATE_THUMBNAILS_TASK}:{product_id}',
+    )
+
+
+def variant_urls(variants, request=None):
+    """``picture_variants`` with storage names turned into (absolute) URLs."""
+    if not variants:
+        return {}
+    storage = immutable_storage()
+
+    def url(name):
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+
+    return {
+        width: {format_key: url(name) for format_key, name in formats.items()}
+        for width, formats in variants.items()
+    }
+
+
+def products_missing_thumbnails():
+    """Products with a picture but no thumbnails yet."""
+    no_file = Q(picture__isnull=True) | Q(picture='')
+    unusable_url = Q(picture_url='') | Q(picture_mirror_failed=F('picture_url'))
+    return Product.objects.filter(picture_variants={}).exclude(no_file & unusable_url)
@@ -0,0 +1,159 @@
+"""
+Inventory ledger.
+
+Every stock change is a ``StockMovement`` row. ``Product.quantity_in_stock``
+holds the running total: ``apply_movement`` changes it with one conditional
+``F()`` update in the same transaction that writes the movement. Direct
+saves of ``quantity_in_stock`` (admin, product create/update) are recorded
+by the signal handlers in ``products.signals``.
+
+``take_snapshot`` stores every product's level next to the id of the last
+movement it includes. ``stock_levels_at`` rebuilds stock at any past moment
+from the latest snapshot before that moment plus the movements after it.
+"""
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+from core.versioning import bump_version
+from .models import Product, StockMovement, StockSnapshot
+from .signals import CATALOG_VERSION_SCOPE
+
+
+class NoStockHistory(Exception):
+    """The requested moment is earlier than the first snapshot."""
+
+
+def invoice_reference(invoice_id):
+    return f'invoice:{invoice_id}'
+
+
+def apply_movement(product_id, quantity, kind, reference='', user=None, keep_available=0):
+    """
+    Add ``quantity`` (negative to remove) to a product's stock and record it.
+
+    A removal only happens if at least ``keep_available`` units would remain.
+    Returns False, with nothing written, when there is not enough stock.
+    """
+    filters = {'pk': product_id}
+    if quantity < 0:
+        filters['quantity_in_stock__gte'] = keep_available - quantity
+    with transaction.atomic():
+        updated = Product.objects.filter(**filters).update(
+            quantity_in_stock=F('quantity_in_stock') + quantity,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            return False
+        StockMovement.objects.create(
+            product_id=product_id,
+            kind=kind,
+            quantity=quantity,
+            reference=reference,
+            created_by=user,
+        )
+        # Queryset updates skip the post_save handler that normally does this.
+        transaction.on_commit(lambda: bump_version(CATALOG_VERSION_SCOPE))
+    return True
+
+
+def set_stock_level(product, quantity, user=None, reference=''):
+    """Record an adjustment bringing ``product``'s stock to exactly ``quantity``."""
+    with transaction.atomic():
+        current = (
+            Product.objects.select_for_update()
+            .values_list('quantity_in_stock', flat=True)
+            .get(pk=product.pk)
+        )
+        if quantity != current:
+            apply_movement(product.pk, quantity - current, StockMovement.ADJUSTMENT, reference, user)
+    product.quantity_in_stock = quantity
+
+
+def return_invoice_stock(invoice_id, user=None):
+    """
+    Put back the stock sold on an invoice that was cancelled or refunded.
+
+    Only what the ledger shows as sold and not yet returned is restocked, so
+    calling this again for the same invoice does nothing.
+    """
+    reference = invoice_reference(invoice_id)
+    outstanding = (
+        StockMovement.objects.filter(
+            reference=reference,
+            kind__in=[StockMovement.SALE, StockMovement.REFUND],
+        )
+        .values('product_id')
+        .annotate(net=Sum('quantity'))
+        .values_list('product_id', 'net')
+    )
+    with transaction.atomic():
+        for product_id, net in outstanding:
+            if net < 0:
+                apply_movement(product_id, -net, StockMovement.REFUND, reference, user)
+
+
+def take_snapshot():
+    """Snapshot every product's stock level; returns the number of rows written."""
+    with transaction.atomic():
+        taken_at = timezone.now()
+        previous_at = StockSnapshot.objects.aggregate(latest=Max('taken_at'))['latest']
+        levels, since_id = _snapshot_levels(previous_at)
+        movements = StockMovement.objects.filter(id__gt=since_id)
+        watermark = movements.aggregate(last=Max('id'))['last'] or since_id
+        for product_id, delta in _movement_totals(movements.filter(id__lte=watermark)):
+            levels[product_id] = levels.get(product_id, 0) + delta
+
+        product_ids = Product.objects.values_list('id', flat=True)
+        snapshots = [
+            StockSnapshot(
+                product_id=product_id,
+                quantity=levels.get(product_id, 0),
+                movement_id=watermark,
+                taken_at=taken_at,
+            )
+            for product_id in product_ids.iterator()
+        ]
+        StockSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+    return len(snapshots)
+
+
+def stock_levels_at(moment, product_ids=None):
+    """
+    Map product id -> units in stock at ``moment``.
+
+    Costs the same few queries however many products there are.
+    Raises ``NoStockHistory`` when ``moment`` predates the first snapshot.
+    """
+    snapshot_at = (
+        StockSnapshot.objects.filter(taken_at__lte=moment)
+        .aggregate(latest=Max('taken_at'))['latest']
+    )
+    if snapshot_at is None:
+        raise NoStockHistory(moment)
+
+    levels, since_id = _snapshot_levels(snapshot_at, product_ids)
+    movements = StockMovement.objects.filter(id__gt=since_id, created_at__lte=moment)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    for product_id, delta in _movement_totals(movements):
+        levels[product_id] = levels.get(product_id, 0) + delta
+    return levels
+
+
+def _snapshot_levels(taken_at, product_ids=None):
+    if taken_at is None:
+        return {}, 0
+    rows = StockSnapshot.objects.filter(taken_at=taken_at)
+    since_id = rows.values_list('movement_id', flat=True).first() or 0
+    if product_ids is not None:
+        rows = rows.filter(product_id__in=product_ids)
+    return dict(rows.values_list('product_id', 'quantity')), since_id
+
+
+def _movement_totals(movements):
+    return (
+        movements.order_by()
+        .values('product_id')
+        .annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total')
+    )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products.holds import EXPIRY_BATCH_SIZE, expire_holds
+
+
+class Command(BaseCommand):
+    help = 'Delete expired cart stock holds in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        deleted = expire_holds(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Expired {deleted} stock hold(s).'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from products.images import generate_thumbnails, products_missing_thumbnails, queue_thumbnails
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Make product thumbnails (only for products without them unless --all).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate every product, not just missing thumbnails')
+        parser.add_argument('--queue', action='store_true', help='Queue background jobs instead of working inline')
+
+    def handle(self, *args, **options):
+        products = Product.objects.all() if options['all'] else products_missing_thumbnails()
+        count = 0
+        for product in products.order_by('pk').iterator():
+            if options['queue']:
+                queue_thumbnails(product.pk)
+            else:
+                generate_thumbnails(product)
+            count += 1
+        action = 'Queued' if options['queue'] else 'Processed'
+        self.stdout.write(self.style.SUCCESS(f'{action} thumbnails for {count} product(s).'))
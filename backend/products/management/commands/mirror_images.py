@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from products.mirror import mirror_pending, products_to_mirror, queue_mirror
+
+
+class Command(BaseCommand):
+    help = 'Copy remote product pictures (Open Food Facts) to local storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='store_true', help='Queue a background job instead of working inline')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            queue_mirror()
+            self.stdout.write(self.style.SUCCESS(f'Queued mirroring of {products_to_mirror().count()} product(s).'))
+            return
+        count = mirror_pending()
+        self.stdout.write(self.style.SUCCESS(f'Processed pictures of {count} product(s).'))
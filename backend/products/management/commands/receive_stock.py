@@ -0,0 +1,30 @@
+import csv
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from products.bulk import apply_stock_rows, read_stock_csv
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply a stock CSV (columns: id or barcode, and quantity or delta), '
+        'e.g. a supplier delivery note.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import')
+        parser.add_argument('--reference', default='', help='Recorded on each stock movement, e.g. a delivery number')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist.')
+
+        try:
+            rows = read_stock_csv(path.read_text(encoding='utf-8-sig'))
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError(f'Cannot read {path} as a UTF-8 CSV: {exc}')
+        results, applied = apply_stock_rows(rows, reference=options['reference'] or path.name)
+        for result in results:
+            if 'error' in result:
+                self.stderr.write(f"Row {result['row']}: {result['error']}")
+        self.stdout.write(self.style.SUCCESS(f'Applied {applied} of {len(results)} row(s).'))
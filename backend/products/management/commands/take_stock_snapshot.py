@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.ledger import take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Snapshot every product\'s stock level from the inventory ledger.'
+
+    def handle(self, *args, **options):
+        written = take_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted stock for {written} product(s).'))
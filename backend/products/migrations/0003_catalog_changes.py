@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0002_promotion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="promotion",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["updated_at", "id"], name="products_pr_updated_e6e93b_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="promotion",
+            index=models.Index(
+                fields=["updated_at", "id"], name="products_pr_updated_53aa28_idx"
+            ),
+        ),
+    ]
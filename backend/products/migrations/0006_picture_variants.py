@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0005_stock_ledger"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="picture_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0006_picture_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="picture_mirror",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0007_picture_mirror"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="picture_mirror_failed",
+            field=models.URLField(blank=True, editable=False, max_length=500),
+        ),
+    ]
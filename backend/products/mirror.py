@@ -0,0 +1,174 @@
+"""
+Local mirror of remote product pictures (Open Food Facts ``image_url``).
+
+Products whose picture is only a remote ``picture_url`` get a copy scaled
+to fit ``PRODUCT_IMAGE_MIRROR_SIZE``, stored as JPEG under
+``products/mirror/<sha256 of the download>.jpg`` with an immutable cache
+header (see ``core.storage``). Products showing the same image share one
+file. ``Product.picture_mirror`` holds the storage name; API responses then
+give the mirror as ``picture_url``, and thumbnails are made from it rather
+than from the remote image. ``picture_url`` itself keeps the source, so a
+re-sync with the same image is a no-op and a new one is mirrored again.
+
+A URL that does not serve an image (a 4xx, or bytes Pillow cannot read) is
+recorded in ``Product.picture_mirror_failed`` and skipped, by the mirror and
+by thumbnails, until ``picture_url`` changes. Network and 5xx errors are
+retried.
+
+``mirror_pending`` runs in the background worker (``products.mirror_images``),
+queued when a picture changes. An hourly sweep queues it as well for
+pictures written without ``Product.save()``, e.g. by a queryset update.
+Downloads run ``PRODUCT_IMAGE_MIRROR_CONCURRENCY`` at a time; database
+writes stay on the calling thread.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image
+from core.storage import immutable_storage
+from core.versioning import bump_version
+from jobs.queue import enqueue
+from .images import InvalidImage, _encode, fetch_image, open_image, queue_thumbnails
+from .models import Product
+from .signals import CATALOG_VERSION_SCOPE
+
+logger = logging.getLogger(__name__)
+
+MIRROR_IMAGES_TASK = 'products.mirror_images'
+
+# Syncs arriving close together are mirrored by one job.
+MIRROR_DELAY = 5
+
+
+class MirrorError(Exception):
+    """Some downloads failed in a way worth retrying."""
+
+
+def mirror_name(digest):
+    return f'products/mirror/{digest}.jpg'
+
+
+def needs_mirror(product):
+    return bool(
+        settings.PRODUCT_IMAGE_MIRROR
+        and not product.picture
+        and product.picture_url.startswith(('http://', 'https://'))
+        and product.picture_url != product.picture_mirror_failed
+    )
+
+
+def products_to_mirror():
+    """Products showing a remote picture that has no mirror yet and has not failed for good."""
+    no_file = Q(picture__isnull=True) | Q(picture='')
+    remote = Q(picture_url__startswith='http://') | Q(picture_url__startswith='https://')
+    return Product.objects.filter(no_file & remote, picture_mirror='').exclude(picture_mirror_failed=F('picture_url'))
+
+
+def queue_mirror():
+    return enqueue(MIRROR_IMAGES_TASK, delay=MIRROR_DELAY, unique_key=MIRROR_IMAGES_TASK)
+
+
+def queue_picture_processing(product_ids):
+    """
+    Queue mirroring or thumbnails for ``product_ids``, whose picture changed
+    without going through ``Product.save()`` (see ``products.signals``).
+    """
+    mirror = False
+    for product in Product.objects.filter(pk__in=product_ids).only('picture', 'picture_url', 'picture_mirror_failed'):
+        if needs_mirror(product):
+            mirror = True
+        else:
+            queue_thumbnails(product.pk)
+    if mirror:
+        queue_mirror()
+
+
+def sweep_unmirrored():
+    """Queue mirroring if any product still shows an unmirrored remote picture."""
+    if settings.PRODUCT_IMAGE_MIRROR and products_to_mirror().exists():
+        return queue_mirror()
+    return None
+
+
+def download(url):
+    """``(storage name, JPEG bytes or None if already stored)`` for the image at ``url``."""
+    data = fetch_image(url)
+    name = mirror_name(hashlib.sha256(data).hexdigest())
+    if immutable_storage().exists(name):
+        return name, None
+    image = open_image(data)
+    size = settings.PRODUCT_IMAGE_MIRROR_SIZE
+    image.thumbnail((size, size), Image.LANCZOS)
+    return name, _encode(image, 'jpeg')
+
+
+def mirror_products(products):
+    """
+    Mirror the pictures of ``products``, fetching each distinct URL once.
+
+    Returns the ``{url: exception}`` of the downloads that failed.
+    """
+    by_url = {}
+    for product in products:
+        by_url.setdefault(product.picture_url, []).append(product)
+
+    storage = immutable_storage()
+    failed = {}
+    mirrored = 0
+    with ThreadPoolExecutor(max_workers=settings.PRODUCT_IMAGE_MIRROR_CONCURRENCY) as pool:
+        futures = {url: pool.submit(download, url) for url in by_url}
+        for url, future in futures.items():
+            try:
+                name, content = future.result()
+            except (InvalidImage, httpx.HTTPError) as exc:
+                logger.warning('Cannot mirror %s: %s', url, exc)
+                failed[url] = exc
+                if isinstance(exc, InvalidImage):
+                    ids = [product.pk for product in by_url[url]]
+                    Product.objects.filter(pk__in=ids, picture_url=url).update(picture_mirror_failed=url)
+                continue
+            if content is not None and not storage.exists(name):
+                name = storage.save(name, ContentFile(content))
+            # Skip products whose picture changed while we were downloading.
+            ids = [product.pk for product in by_url[url]]
+            mirrored += Product.objects.filter(pk__in=ids, picture_url=url).update(
+                picture_mirror=name, updated_at=timezone.now(),
+            )
+    if mirrored:
+        # ``update()`` sends no signals; the catalog's picture URLs changed.
+        transaction.on_commit(lambda: bump_version(CATALOG_VERSION_SCOPE))
+
+    for url, products_for_url in by_url.items():
+        if not isinstance(failed.get(url), httpx.HTTPError):
+            # Mirrored, or not an image at all: thumbnails are (re)made
+            # from the mirror, or cleared without another download.
+            for product in products_for_url:
+                queue_thumbnails(product.pk)
+    return failed
+
+
+def mirror_pending(batch_size=100):
+    """Mirror every product in ``products_to_mirror()``; returns how many were tried."""
+    tried, retry = set(), {}
+    while True:
+        batch = list(products_to_mirror().exclude(pk__in=tried).order_by('pk')[:batch_size])
+        if not batch:
+            break
+        tried.update(product.pk for product in batch)
+        failed = mirror_products(batch)
+        retry.update({url: exc for url, exc in failed.items() if isinstance(exc, httpx.HTTPError)})
+    if retry:
+        raise MirrorError(f'{len(retry)} image(s) could not be downloaded: {", ".join(sorted(retry))}')
+    return len(tried)
+
+
+def mirror_url(name, request=None):
+    """Public URL of the mirror ``name``; cheap enough to call per row."""
+    url = immutable_storage().url(name)
+    return request.build_absolute_uri(url) if request else url
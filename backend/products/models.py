@@ -1,8 +1,28 @@
 from django.db import models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
 
+def product_count_subquery(active_only=False):
+    """Number of products in the outer query's category, as an expression."""
+    products = Product.objects.filter(category=OuterRef('pk'))
+    if active_only:
+        products = products.filter(is_active=True)
+    counts = products.order_by().values('category').annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class CategoryQuerySet(models.QuerySet):
+    def with_product_counts(self, active_only=False):
+        """
+        Annotate ``product_count`` in the same query. ``active_only`` leaves
+        out soft-deleted (``is_active=False``) products.
+        """
+        return self.annotate(product_count=product_count_subquery(active_only))
+
+
 class Category(models.Model):
     """
     Product category for organizing products.
@@ -10,6 +30,8 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = CategoryQuerySet.as_manager()
     
     class Meta:
         ordering = ['name']
@@ -43,6 +65,13 @@ class Product(models.Model):
     # Visual
     picture = models.ImageField(upload_to='products/', blank=True, null=True)
     picture_url = models.URLField(max_length=500, blank=True)
+    # Thumbnail storage names by width and format, see products.images.
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Storage name of the local copy of a remote picture_url, see products.mirror.
+    picture_mirror = models.CharField(max_length=255, blank=True, editable=False)
+    # A picture_url that is not an image (or gone for good); it is not
+    # downloaded again until picture_url changes.
+    picture_mirror_failed = models.URLField(max_length=500, blank=True, editable=False)
     
     # Stock Management
     quantity_in_stock = models.IntegerField(
@@ -79,6 +108,7 @@ class Product(models.Model):
             models.Index(fields=['name']),
             models.Index(fields=['barcode']),
             models.Index(fields=['category']),
+            models.Index(fields=['updated_at', 'id']),
         ]
     
     def __str__(self):
@@ -144,9 +174,13 @@ class Promotion(models.Model):
     end_date = models.DateTimeField()
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def __str__(self):
         return self.title
@@ -156,3 +190,93 @@ class Promotion(models.Model):
         from django.utils import timezone
         now = timezone.now()
         return self.is_active and self.start_date <= now <= self.end_date
+
+
+class StockHold(models.Model):
+    """
+    Stock set aside for a customer's cart until ``expires_at``.
+
+    Rows are only ever inserted and deleted, never updated, so placing a hold
+    does not write to (or lock) the product row. Available-to-promise stock
+    is ``quantity_in_stock`` minus the active holds of other customers.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_holds')
+    customer = models.ForeignKey('users.Customer', on_delete=models.CASCADE, related_name='stock_holds')
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'expires_at']),
+            models.Index(fields=['customer', 'product']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for {self.customer_id}"
+
+
+class StockMovement(models.Model):
+    """
+    One entry in the append-only inventory ledger.
+
+    ``quantity`` is signed: receipts and refunds add stock, sales remove it,
+    adjustments go either way. ``Product.quantity_in_stock`` is the running
+    total, updated in the same transaction as each movement is recorded.
+    """
+    RECEIPT = 'receipt'
+    SALE = 'sale'
+    ADJUSTMENT = 'adjustment'
+    REFUND = 'refund'
+    KIND_CHOICES = [
+        (RECEIPT, 'Receipt'),
+        (SALE, 'Sale'),
+        (ADJUSTMENT, 'Adjustment'),
+        (REFUND, 'Refund'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    reference = models.CharField(max_length=100, blank=True, db_index=True)
+    created_by = models.ForeignKey(
+        'auth.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['product', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity:+d} x {self.product_id}"
+
+
+class StockSnapshot(models.Model):
+    """
+    Stock level of one product at ``taken_at``, covering every movement up
+    to and including ``movement_id``.
+
+    Snapshots are taken for all products at once, so rebuilding stock at a
+    past moment means reading one snapshot run and summing the movements
+    recorded after it.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    quantity = models.IntegerField()
+    movement_id = models.BigIntegerField(default=0)
+    taken_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['taken_at', 'product'], name='unique_stock_snapshot'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} = {self.quantity} at {self.taken_at}"
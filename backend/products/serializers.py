@@ -3,6 +3,9 @@ from django.db.models import Q
 from drf_spectacular.utils import extend_schema_field
 from decimal import Decimal
 from django.utils import timezone
+from core.fieldsets import SparseFieldsMixin
+from .images import variant_urls
+from .mirror import mirror_url
 from .models import Category, Product, Promotion
 
 
@@ -17,9 +20,24 @@ class CategorySerializer(serializers.ModelSerializer):
     
     @extend_schema_field(serializers.IntegerField())
     def get_product_count(self, obj):
+        # Annotated by ``Category.objects.with_product_counts()`` on reads.
+        if hasattr(obj, 'product_count'):
+            return obj.product_count
         return obj.products.count()
 
 
+# What the product method fields (and the uploaded picture and mirror
+# overrides of ``picture_url``) read, for ``?fields=`` column pruning.
+PRODUCT_FIELD_COLUMNS = {
+    'picture_url': ['picture_url', 'picture', 'picture_mirror'],
+    'picture_variants': ['picture_variants'],
+    'stock_status': ['quantity_in_stock'],
+    'is_in_stock': ['quantity_in_stock'],
+    'active_promotion': [],
+    'current_price': ['price'],
+}
+
+
 class PromotionSerializer(serializers.ModelSerializer):
     """Serializer for Promotion model"""
     product_name = serializers.ReadOnlyField(source='product.name')
@@ -35,9 +53,10 @@ class PromotionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Product model"""
     category_name = serializers.CharField(source='category.name', read_only=True)
+    picture_variants = serializers.SerializerMethodField()
     stock_status = serializers.SerializerMethodField()
     is_in_stock = serializers.SerializerMethodField()
     active_promotion = serializers.SerializerMethodField()
@@ -47,7 +66,7 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = [
             'id', 'name', 'brand', 'price', 'category', 'category_name',
-            'picture', 'picture_url', 'quantity_in_stock',
+            'picture', 'picture_url', 'picture_variants', 'quantity_in_stock',
             'energy_kcal', 'fat', 'saturated_fat', 'carbohydrates',
             'sugars', 'proteins', 'salt', 'fiber',
             'description', 'barcode', 'openfoodfacts_id',
@@ -55,6 +74,12 @@ class ProductSerializer(serializers.ModelSerializer):
             'stock_status', 'is_in_stock', 'active_promotion', 'current_price'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'last_synced']
+        expandable_fields = ['active_promotion']
+        field_columns = PRODUCT_FIELD_COLUMNS
+
+    @extend_schema_field(serializers.DictField(child=serializers.DictField(child=serializers.URLField())))
+    def get_picture_variants(self, obj):
+        return variant_urls(obj.picture_variants, self.context.get('request'))
 
     @extend_schema_field(serializers.CharField())
     def get_stock_status(self, obj):
@@ -84,10 +109,12 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        if instance.picture:
+        if 'picture_url' in self.fields and instance.picture:
             request = self.context.get('request')
             url = instance.picture.url
             data['picture_url'] = request.build_absolute_uri(url) if request else url
+        elif 'picture_url' in self.fields and instance.picture_mirror:
+            data['picture_url'] = mirror_url(instance.picture_mirror, self.context.get('request'))
         return data
 
 
@@ -111,18 +138,62 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         return instance
 
     def update(self, instance, validated_data):
-        instance = super().update(instance, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        update_fields = [*validated_data, 'updated_at']
         if instance.picture:
             # Keep DB url in sync with stored image
             if instance.picture_url != instance.picture.url:
                 instance.picture_url = instance.picture.url
-                instance.save(update_fields=['picture_url'])
+                update_fields.append('picture_url')
+        # Only write what the request set: a full save would also write back
+        # the quantity_in_stock loaded earlier, undoing concurrent sales.
+        instance.save(update_fields=set(update_fields))
         return instance
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductBulkListSerializer(serializers.ListSerializer):
+    """Validates every row on its own so one bad row does not reject the batch."""
+
+    def validate_rows(self):
+        """Return ``(valid, errors)``: ``[(index, data)]`` and ``{index: errors}``."""
+        valid, errors = [], {}
+        for index, row in enumerate(self.initial_data):
+            if not isinstance(row, dict):
+                errors[index] = {'non_field_errors': ['Expected an object.']}
+                continue
+            try:
+                valid.append((index, self.child.run_validation(row)))
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+        return valid, errors
+
+
+class ProductBulkSerializer(serializers.ModelSerializer):
+    """
+    One row of a bulk create/update/upsert keyed on ``barcode``.
+
+    ``category`` is given by name. Stock is not accepted here; it changes
+    through the stock ledger (``bulk-stock``).
+    """
+    barcode = serializers.CharField(max_length=50)
+    category = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            'barcode', 'name', 'brand', 'price', 'category', 'picture_url',
+            'energy_kcal', 'fat', 'saturated_fat', 'carbohydrates',
+            'sugars', 'proteins', 'salt', 'fiber',
+            'description', 'is_active'
+        ]
+        list_serializer_class = ProductBulkListSerializer
+
+
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Lightweight serializer for product lists"""
     category_name = serializers.CharField(source='category.name', read_only=True)
+    picture_variants = serializers.SerializerMethodField()
     stock_status = serializers.SerializerMethodField()
     active_promotion = serializers.SerializerMethodField()
     current_price = serializers.SerializerMethodField()
@@ -131,9 +202,15 @@ class ProductListSerializer(serializers.ModelSerializer):
         model = Product
         fields = [
             'id', 'name', 'brand', 'price', 'category_name',
-            'picture_url', 'quantity_in_stock', 'stock_status', 
+            'picture_url', 'picture_variants', 'quantity_in_stock', 'stock_status', 
             'is_active', 'active_promotion', 'current_price'
         ]
+        expandable_fields = ['active_promotion']
+        field_columns = PRODUCT_FIELD_COLUMNS
+
+    @extend_schema_field(serializers.DictField(child=serializers.DictField(child=serializers.URLField())))
+    def get_picture_variants(self, obj):
+        return variant_urls(obj.picture_variants, self.context.get('request'))
 
     @extend_schema_field(serializers.CharField())
     def get_stock_status(self, obj):
@@ -159,8 +236,10 @@ class ProductListSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        if instance.picture:
+        if 'picture_url' in self.fields and instance.picture:
             request = self.context.get('request')
             url = instance.picture.url
             data['picture_url'] = request.build_absolute_uri(url) if request else url
+        elif 'picture_url' in self.fields and instance.picture_mirror:
+            data['picture_url'] = mirror_url(instance.picture_mirror, self.context.get('request'))
         return data
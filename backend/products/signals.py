@@ -0,0 +1,85 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from core.versioning import bump_version
+from .images import queue_thumbnails
+from .models import Category, Product, Promotion, StockMovement
+
+CATALOG_VERSION_SCOPE = 'catalog'
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def bump_catalog_version(sender, **kwargs):
+    bump_version(CATALOG_VERSION_SCOPE)
+
+
+PICTURE_FIELDS = {'picture', 'picture_url'}
+
+
+@receiver(pre_save, sender=Product)
+def remember_state_before_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._stock_before_save = None
+    instance._picture_before_save = None
+    if raw or instance.pk is None:
+        return
+    watch_stock = update_fields is None or 'quantity_in_stock' in update_fields
+    watch_picture = update_fields is None or bool(PICTURE_FIELDS & set(update_fields))
+    if not (watch_stock or watch_picture):
+        return
+    row = Product.objects.filter(pk=instance.pk).values_list('quantity_in_stock', 'picture', 'picture_url').first()
+    if row is None:
+        return
+    if watch_stock:
+        instance._stock_before_save = row[0]
+    if watch_picture:
+        instance._picture_before_save = (row[1] or '', row[2])
+
+
+@receiver(post_save, sender=Product)
+def record_direct_stock_change(sender, instance, created, raw=False, **kwargs):
+    """Keep the ledger complete when stock is written with ``save()`` rather than the ledger."""
+    if raw:
+        return
+    if created:
+        kind, delta = StockMovement.RECEIPT, instance.quantity_in_stock
+    else:
+        before = getattr(instance, '_stock_before_save', None)
+        if before is None:
+            return
+        kind, delta = StockMovement.ADJUSTMENT, instance.quantity_in_stock - before
+    if delta:
+        StockMovement.objects.create(product=instance, kind=kind, quantity=delta)
+
+
+@receiver(post_save, sender=Product)
+def schedule_picture_processing(sender, instance, created, raw=False, **kwargs):
+    """
+    Once a new or changed picture is committed, queue its mirroring (for a
+    remote ``picture_url``) or its thumbnails.
+    """
+    from .mirror import needs_mirror, queue_mirror
+
+    if raw:
+        return
+    picture = (instance.picture.name or '', instance.picture_url)
+    if created:
+        changed = any(picture)
+    else:
+        before = getattr(instance, '_picture_before_save', None)
+        changed = before is not None and before != picture
+    if not changed:
+        return
+    if instance.picture_mirror:
+        # The mirror was of the previous picture.
+        instance.picture_mirror = ''
+        Product.objects.filter(pk=instance.pk).update(picture_mirror='')
+    if needs_mirror(instance):
+        transaction.on_commit(queue_mirror)
+    else:
+        product_id = instance.pk
+        transaction.on_commit(lambda: queue_thumbnails(product_id))
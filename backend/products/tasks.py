@@ -0,0 +1,33 @@
+from jobs.queue import task
+from .holds import expire_holds
+from .images import GENERATE_THUMBNAILS_TASK, generate_thumbnails
+from .ledger import take_snapshot
+from .mirror import MIRROR_IMAGES_TASK, mirror_pending, sweep_unmirrored
+from .models import Product
+
+
+@task('products.expire_stock_holds', every=300)
+def expire_stock_holds():
+    expire_holds()
+
+
+@task('products.take_stock_snapshot', every=86400, priority=-10)
+def take_stock_snapshot():
+    take_snapshot()
+
+
+@task(GENERATE_THUMBNAILS_TASK)
+def generate_product_thumbnails(product_id):
+    product = Product.objects.filter(pk=product_id).first()
+    if product is not None:
+        generate_thumbnails(product)
+
+
+@task(MIRROR_IMAGES_TASK)
+def mirror_product_images():
+    mirror_pending()
+
+
+@task('products.sweep_unmirrored_images', every=3600, priority=-10)
+def sweep_unmirrored_images():
+    sweep_unmirrored()
@@ -1,7 +1,33 @@
 import pytest
-from django.utils import timezone
+import io
 from datetime import timedelta
-from products.models import Product, Category, Promotion
+from decimal import Decimal
+from types import SimpleNamespace
+import httpx
+from PIL import Image
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+from core.storage import immutable_storage
+from jobs.models import Job
+from jobs.queue import run_next
+from products import images, mirror
+from products.fastpath import ProductListValues, CategoryValues
+from products.holds import available_to_promise, hold_stock, InsufficientStock
+from products.ledger import apply_movement, stock_levels_at, take_snapshot, NoStockHistory
+from products.mirror import MirrorError, mirror_pending, products_to_mirror, sweep_unmirrored
+from products.models import Product, Category, Promotion, StockHold, StockMovement
+from products.serializers import ProductCreateUpdateSerializer
+from users.models import Customer
 
 
 @pytest.mark.django_db
@@ -32,7 +58,6 @@ class TestProductModel:
     
     def test_product_current_price_with_active_promotion(self, product):
         """Test that current_price returns discounted price when there's an active promotion"""
-        from decimal import Decimal
         now = timezone.now()
         promotion = Promotion.objects.create(
             title='Test Promotion',
@@ -81,3 +106,700 @@ class TestProductAPI:
         response = staff_client.post('/api/products/', data)
         assert response.status_code == 201
         assert response.data['name'] == 'Pepsi'
+
+
+@pytest.mark.django_db
+class TestCatalogChangesAPI:
+    @pytest.fixture(autouse=True)
+    def no_settle_window(self, monkeypatch):
+        monkeypatch.setattr('products.changes.SETTLE_WINDOW', timedelta(0))
+
+    def test_full_sync_without_cursor(self, authenticated_client, product):
+        response = authenticated_client.get('/api/products/changes/')
+        assert response.status_code == 200
+        assert [p['id'] for p in response.data['products']] == [product.id]
+        assert response.data['has_more'] is False
+        assert response.data['cursor']
+
+    def test_cursor_returns_only_later_changes(self, authenticated_client, product, category):
+        cursor = authenticated_client.get('/api/products/changes/').data['cursor']
+
+        response = authenticated_client.get(f'/api/products/changes/?since={cursor}')
+        assert response.data['products'] == []
+
+        other = Product.objects.create(name='Fanta', price=1.80, category=category, barcode='5449000011527')
+        product.is_active = False
+        product.save()
+
+        response = authenticated_client.get(f'/api/products/changes/?since={cursor}')
+        assert [p['id'] for p in response.data['products']] == [other.id]
+        assert response.data['deleted']['products'] == [product.id]
+
+    def test_limit_pages_through_changes(self, authenticated_client, product, category):
+        Product.objects.create(name='Fanta', price=1.80, category=category, barcode='5449000011527')
+
+        first = authenticated_client.get('/api/products/changes/?limit=1').data
+        assert len(first['products']) == 1
+        assert first['has_more'] is True
+
+        second = authenticated_client.get(f"/api/products/changes/?limit=1&since={first['cursor']}").data
+        assert len(second['products']) == 1
+        assert second['products'][0]['id'] != first['products'][0]['id']
+
+    def test_deleted_promotion_is_reported(self, staff_client, product):
+        now = timezone.now()
+        promotion = Promotion.objects.create(
+            title='Summer', discount_percentage=Decimal('10.00'), product=product,
+            start_date=now - timedelta(hours=1), end_date=now + timedelta(days=1),
+        )
+        cursor = staff_client.get('/api/products/changes/').data['cursor']
+
+        assert staff_client.delete(f'/api/promotions/{promotion.id}/').status_code == 204
+        response = staff_client.get(f'/api/products/changes/?since={cursor}')
+        assert response.data['deleted']['promotions'] == [promotion.id]
+
+    def test_invalid_cursor_is_rejected(self, authenticated_client):
+        response = authenticated_client.get('/api/products/changes/?since=not-a-cursor')
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestOpenFoodFactsSync:
+    @pytest.fixture
+    def off_transport(self, monkeypatch):
+        def handler(request):
+            if request.url.path.endswith('/3017620422003.json'):
+                return httpx.Response(200, json={
+                    'status': 1,
+                    'product': {
+                        'product_name': 'Nutella',
+                        'brands': 'Ferrero',
+                        'nutriments': {'energy-kcal_100g': 539},
+                    },
+                })
+            return httpx.Response(200, json={'status': 0})
+
+        monkeypatch.setattr(
+            'products.async_views.get_async_client',
+            lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+
+    @pytest.fixture
+    def staff_jwt_client(self, api_client, staff_user):
+        token = RefreshToken.for_user(staff_user).access_token
+        api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return api_client
+
+    def test_sync_creates_product(self, staff_jwt_client, off_transport):
+        response = staff_jwt_client.post(
+            '/api/products/sync_openfoodfacts/',
+            {'barcode': '3017620422003'},
+            format='json',
+        )
+        assert response.status_code == 201
+        assert response.json()['product']['name'] == 'Nutella'
+        assert Product.objects.get(barcode='3017620422003').brand == 'Ferrero'
+
+    def test_sync_keeps_price_and_stock_of_existing_product(self, staff_jwt_client, off_transport, product):
+        product.barcode = '3017620422003'
+        product.save()
+        response = staff_jwt_client.post(
+            '/api/products/sync_openfoodfacts/',
+            {'barcode': '3017620422003'},
+            format='json',
+        )
+        assert response.status_code == 200
+        product.refresh_from_db()
+        assert product.name == 'Nutella'
+        assert product.quantity_in_stock == 100
+        assert product.price == Decimal('2.50')
+
+    def test_sync_unknown_barcode_returns_404(self, staff_jwt_client, off_transport):
+        response = staff_jwt_client.post(
+            '/api/products/sync_openfoodfacts/',
+            {'barcode': '0000000000000'},
+            format='json',
+        )
+        assert response.status_code == 404
+
+    def test_sync_requires_staff(self, api_client, user):
+        token = RefreshToken.for_user(user).access_token
+        api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = api_client.post('/api/products/sync_openfoodfacts/', {'barcode': '1'}, format='json')
+        assert response.status_code == 403
+
+
+@pytest.mark.django_db
+class TestStockHolds:
+    @pytest.fixture
+    def other_customer(self, db):
+        other = User.objects.create_user(username='other', password='testpass123')
+        return Customer.objects.create(
+            user=other, first_name='Jane', last_name='Roe', email='jane@example.com',
+        )
+
+    def _checkout(self, client, product, quantity):
+        return client.post('/api/invoices/', {
+            'payment_method': 'card',
+            'items': [{'product': product.id, 'quantity': quantity, 'unit_price': '2.50'}],
+        }, format='json')
+
+    def test_holds_reduce_availability_for_other_customers(self, customer, other_customer, product):
+        hold_stock(customer, product, 30)
+        assert available_to_promise(product, other_customer) == 70
+        assert available_to_promise(product, customer) == 100
+
+    def test_failed_hold_keeps_previous_hold(self, customer, other_customer, product):
+        hold_stock(other_customer, product, 90)
+        hold_stock(customer, product, 5)
+        with pytest.raises(InsufficientStock):
+            hold_stock(customer, product, 20)
+        assert StockHold.objects.get(customer=customer).quantity == 5
+
+    def test_hold_locks_the_product_before_checking(self, customer, product, monkeypatch):
+        locked = []
+        select_for_update = QuerySet.select_for_update
+
+        def spy(queryset, *args, **kwargs):
+            locked.append(queryset.model)
+            return select_for_update(queryset, *args, **kwargs)
+
+        monkeypatch.setattr(QuerySet, 'select_for_update', spy)
+        hold_stock(customer, product, 5)
+        assert locked == [Product]
+
+    def test_add_to_cart_is_refused_when_stock_is_held(self, authenticated_client, customer, other_customer, product):
+        hold_stock(other_customer, product, 95)
+        response = authenticated_client.post(
+            '/api/cart/add_item/', {'product': product.id, 'quantity': 10}, format='json',
+        )
+        assert response.status_code == 400
+
+        response = authenticated_client.post(
+            '/api/cart/add_item/', {'product': product.id, 'quantity': 5}, format='json',
+        )
+        assert response.status_code == 201
+
+    def test_checkout_converts_holds_into_stock_decrement(self, authenticated_client, customer, product):
+        authenticated_client.post('/api/cart/add_item/', {'product': product.id, 'quantity': 3}, format='json')
+        assert StockHold.objects.filter(customer=customer).exists()
+
+        response = self._checkout(authenticated_client, product, 3)
+        assert response.status_code == 201
+        product.refresh_from_db()
+        assert product.quantity_in_stock == 97
+        assert not StockHold.objects.filter(customer=customer).exists()
+
+    def test_checkout_cannot_take_stock_held_by_others(self, authenticated_client, customer, other_customer, product):
+        hold_stock(other_customer, product, 98)
+        response = self._checkout(authenticated_client, product, 3)
+        assert response.status_code == 400
+        product.refresh_from_db()
+        assert product.quantity_in_stock == 100
+
+    def test_expired_holds_are_ignored_and_swept(self, customer, other_customer, product):
+        hold_stock(customer, product, 40)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        assert available_to_promise(product, other_customer) == 100
+
+        call_command('expire_stock_holds')
+        assert not StockHold.objects.exists()
+
+    def test_availability_endpoint(self, authenticated_client, customer, other_customer, product):
+        hold_stock(other_customer, product, 25)
+        response = authenticated_client.get(f'/api/products/{product.id}/availability/')
+        assert response.status_code == 200
+        assert response.data['available'] == 75
+
+
+@pytest.mark.django_db
+class TestStockLedger:
+    def _movements(self, product):
+        return list(StockMovement.objects.filter(product=product).values_list('kind', 'quantity', 'reference'))
+
+    def test_new_product_records_receipt(self, product):
+        assert self._movements(product) == [('receipt', 100, '')]
+
+    def test_checkout_and_cancel_are_recorded(self, authenticated_client, customer, product):
+        response = authenticated_client.post('/api/invoices/', {
+            'payment_method': 'card',
+            'items': [{'product': product.id, 'quantity': 4, 'unit_price': '2.50'}],
+        }, format='json')
+        invoice_id = response.data['id']
+        reference = f'invoice:{invoice_id}'
+
+        authenticated_client.post(f'/api/invoices/{invoice_id}/cancel/')
+        authenticated_client.post(f'/api/invoices/{invoice_id}/cancel/')
+
+        product.refresh_from_db()
+        assert product.quantity_in_stock == 100
+        assert self._movements(product)[1:] == [('sale', -4, reference), ('refund', 4, reference)]
+
+    def test_update_stock_records_adjustment(self, staff_client, product):
+        response = staff_client.post(f'/api/products/{product.id}/update_stock/', {'quantity': 120}, format='json')
+        assert response.status_code == 200
+        assert response.data['quantity_in_stock'] == 120
+        assert self._movements(product)[-1] == ('adjustment', 20, '')
+
+    def test_direct_save_is_recorded_as_adjustment(self, product):
+        product.quantity_in_stock = 90
+        product.save()
+        assert self._movements(product)[-1] == ('adjustment', -10, '')
+
+    def test_edits_do_not_write_back_stale_stock(self, staff_client, product, staff_user):
+        loaded = Product.objects.get(pk=product.pk)
+        apply_movement(product.id, -4, StockMovement.SALE)
+
+        serializer = ProductCreateUpdateSerializer(loaded, data={'name': 'Coke'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        request = RequestFactory().post('/')
+        request.user = staff_user
+        loaded.brand = 'TCCC'
+        form = SimpleNamespace(changed_data=['brand'])
+        site._registry[Product].save_model(request, loaded, form, change=True)
+
+        assert staff_client.delete(f'/api/products/{product.id}/').status_code == 204
+        product.refresh_from_db()
+        assert (product.name, product.brand, product.is_active) == ('Coke', 'TCCC', False)
+        assert product.quantity_in_stock == 96
+        assert [kind for kind, _, _ in self._movements(product)] == ['receipt', 'sale']
+
+    def test_stock_levels_at_past_moment(self, product):
+        take_snapshot()
+        before_sale = timezone.now()
+        apply_movement(product.id, -10, StockMovement.SALE)
+        StockMovement.objects.filter(kind='sale').update(created_at=before_sale + timedelta(minutes=1))
+
+        assert stock_levels_at(before_sale)[product.id] == 100
+        assert stock_levels_at(before_sale + timedelta(minutes=2))[product.id] == 90
+
+        take_snapshot()
+        assert stock_levels_at(timezone.now())[product.id] == 90
+
+    def test_moment_before_first_snapshot_has_no_history(self, product):
+        with pytest.raises(NoStockHistory):
+            stock_levels_at(timezone.now() - timedelta(days=1))
+
+
+@pytest.mark.django_db
+class TestBulkStock:
+    @pytest.fixture
+    def products(self, category):
+        return [
+            Product.objects.create(name=f'Item {i}', price=1, category=category, quantity_in_stock=10, barcode=f'BC{i}')
+            for i in range(3)
+        ]
+
+    def test_applies_valid_rows_and_reports_errors(self, staff_client, products):
+        response = staff_client.post('/api/products/bulk-stock/', {
+            'reference': 'DELIVERY-1',
+            'rows': [
+                {'barcode': 'BC0', 'delta': 5},
+                {'id': products[1].id, 'quantity': 3},
+                {'barcode': 'NOPE', 'delta': 1},
+                {'barcode': 'BC2', 'delta': -11},
+                {'barcode': 'BC2'},
+            ],
+        }, format='json')
+
+        assert response.status_code == 200
+        assert response.data['applied'] == 2
+        assert response.data['failed'] == 3
+        assert response.data['results'][0] == {'row': 1, 'product': products[0].id, 'quantity_in_stock': 15}
+        assert 'error' in response.data['results'][2]
+
+        stock = dict(Product.objects.values_list('barcode', 'quantity_in_stock'))
+        assert stock == {'BC0': 15, 'BC1': 3, 'BC2': 10}
+        movements = StockMovement.objects.filter(reference='DELIVERY-1').order_by('product_id')
+        assert [(m.kind, m.quantity) for m in movements] == [('receipt', 5), ('adjustment', -7)]
+
+    def test_new_picture_url_drops_the_old_mirror_and_is_mirrored(
+        self, staff_client, product, django_capture_on_commit_callbacks
+    ):
+        Product.objects.filter(pk=product.pk).update(
+            picture_url='https://images.example.com/old.jpg', picture_mirror='products/mirror/old.jpg',
+            picture_variants={'160': {'jpeg': 'products/thumbs/old/160.jpg'}},
+        )
+        with django_capture_on_commit_callbacks(execute=True):
+            staff_client.post('/api/products/bulk-upsert/', [
+                {'barcode': product.barcode, 'picture_url': 'https://images.example.com/new.jpg'},
+                {'barcode': 'NEW-1', 'name': 'Fanta', 'price': '1.80', 'picture_url': 'https://images.example.com/f.jpg'},
+            ], format='json')
+
+        product.refresh_from_db()
+        assert (product.picture_mirror, product.picture_variants) == ('', {})
+        assert Job.objects.filter(name='products.mirror_images', status=Job.QUEUED).count() == 1
+        assert products_to_mirror().count() == 2
+
+    def test_unchanged_picture_url_keeps_the_mirror(self, staff_client, product, django_capture_on_commit_callbacks):
+        Product.objects.filter(pk=product.pk).update(
+            picture_url='https://images.example.com/old.jpg', picture_mirror='products/mirror/old.jpg',
+        )
+        with django_capture_on_commit_callbacks(execute=True):
+            staff_client.post('/api/products/bulk-upsert/', [
+                {'barcode': product.barcode, 'price': '2.00', 'picture_url': 'https://images.example.com/old.jpg'},
+            ], format='json')
+        product.refresh_from_db()
+        assert product.picture_mirror == 'products/mirror/old.jpg'
+        assert not Job.objects.exists()
+
+    def test_uses_constant_number_of_queries(self, staff_client, category, django_assert_max_num_queries):
+        Product.objects.bulk_create([
+            Product(name=f'Bulk {i}', price=1, category=category, barcode=f'BULK{i}') for i in range(50)
+        ])
+        rows = [{'barcode': f'BULK{i}', 'delta': 2} for i in range(50)]
+        with django_assert_max_num_queries(12):
+            response = staff_client.post('/api/products/bulk-stock/', rows, format='json')
+        assert response.data['applied'] == 50
+
+    def test_accepts_csv_body(self, staff_client, products):
+        body = 'barcode,delta\nBC0,4\nBC1,-2\n'
+        response = staff_client.generic('POST', '/api/products/bulk-stock/', body, content_type='text/csv')
+        assert response.status_code == 200
+        assert response.data['applied'] == 2
+
+    def test_csv_that_is_not_utf8_is_rejected(self, staff_client, products):
+        body = 'barcode,delta\nBC0,4\nCafé,1\n'.encode('latin-1')
+        response = staff_client.generic('POST', '/api/products/bulk-stock/', body, content_type='text/csv')
+        assert response.status_code == 400
+        assert 'UTF-8' in response.data['error']
+
+    def test_requires_staff(self, authenticated_client):
+        response = authenticated_client.post('/api/products/bulk-stock/', [], format='json')
+        assert response.status_code == 403
+
+    def test_receive_stock_command(self, products, tmp_path):
+        path = tmp_path / 'delivery.csv'
+        path.write_text('barcode,delta\nBC1,6\n')
+        call_command('receive_stock', str(path))
+        products[1].refresh_from_db()
+        assert products[1].quantity_in_stock == 16
+
+
+@pytest.mark.django_db
+class TestBulkUpsert:
+    def test_upsert_creates_and_updates_by_barcode(self, staff_client, product, category):
+        response = staff_client.post('/api/products/bulk-upsert/', [
+            {'barcode': product.barcode, 'price': '3.10'},
+            {'barcode': 'NEW-1', 'name': 'Fanta', 'price': '1.80', 'category': 'Beverages'},
+        ], format='json')
+
+        assert response.status_code == 200
+        assert (response.data['created'], response.data['updated'], response.data['failed']) == (1, 1, 0)
+        product.refresh_from_db()
+        assert product.price == Decimal('3.10')
+        assert product.name == 'Coca Cola'
+        assert product.quantity_in_stock == 100
+        fanta = Product.objects.get(barcode='NEW-1')
+        assert fanta.category == category
+        assert response.data['results'][1]['id'] == fanta.id
+
+    def test_bad_rows_are_reported_without_aborting(self, staff_client, product):
+        response = staff_client.post('/api/products/bulk-upsert/', [
+            {'barcode': 'NEW-1', 'name': 'Fanta', 'price': '-1'},
+            {'barcode': 'NEW-2', 'price': '1.00'},
+            {'barcode': 'NEW-3', 'name': 'Sprite', 'price': '1.00', 'category': 'Nope'},
+            {'barcode': 'NEW-4', 'name': 'Water', 'price': '0.50'},
+        ], format='json')
+
+        assert response.data['created'] == 1
+        assert response.data['failed'] == 3
+        assert 'price' in response.data['results'][0]['errors']
+        assert Product.objects.filter(barcode__startswith='NEW-').count() == 1
+
+    def test_modes(self, staff_client, product):
+        response = staff_client.post('/api/products/bulk-upsert/?mode=create', [
+            {'barcode': product.barcode, 'name': 'Dup', 'price': '1.00'},
+        ], format='json')
+        assert response.data['failed'] == 1
+
+        response = staff_client.post('/api/products/bulk-upsert/', {
+            'mode': 'update',
+            'products': [{'barcode': 'MISSING', 'price': '1.00'}],
+        }, format='json')
+        assert response.data['failed'] == 1
+        assert not Product.objects.filter(barcode='MISSING').exists()
+
+    def test_uses_constant_number_of_queries(self, staff_client, category, django_assert_max_num_queries):
+        rows = [
+            {'barcode': f'PL{i}', 'name': f'Item {i}', 'price': '1.00', 'category': 'Beverages'}
+            for i in range(100)
+        ]
+        with django_assert_max_num_queries(12):
+            response = staff_client.post('/api/products/bulk-upsert/', rows, format='json')
+        assert response.data['created'] == 100
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+    def test_default_representation_is_unchanged(self, authenticated_client, product):
+        response = authenticated_client.get(f'/api/products/{product.id}/')
+        assert 'active_promotion' in response.data
+        assert 'energy_kcal' in response.data
+
+    def test_fields_prunes_keys_and_columns(self, authenticated_client, product):
+        with CaptureQueriesContext(connection) as queries:
+            response = authenticated_client.get('/api/products/?fields=id,name,stock_status')
+        assert response.data['results'] == [{'id': product.id, 'name': 'Coca Cola', 'stock_status': 'In Stock'}]
+        select = next(q['sql'] for q in queries.captured_queries if 'FROM "products_product"' in q['sql'] and 'COUNT' not in q['sql'])
+        assert '"quantity_in_stock"' in select
+        assert '"energy_kcal"' not in select
+        # Only the ETag's promotion lookup runs, not the per-product one.
+        assert not any('"discount_percentage" DESC' in q['sql'] for q in queries.captured_queries)
+
+    def test_expand_controls_embedded_promotion(self, authenticated_client, product):
+        response = authenticated_client.get(f'/api/products/{product.id}/?expand=')
+        assert 'active_promotion' not in response.data
+        assert 'energy_kcal' in response.data
+
+        response = authenticated_client.get(f'/api/products/{product.id}/?fields=id&expand=active_promotion')
+        assert response.data == {'id': product.id, 'active_promotion': None}
+
+
+@pytest.mark.django_db
+class TestValuesSerializerParity:
+    @pytest.fixture
+    def catalog(self, product, category):
+        now = timezone.now()
+        Product.objects.create(name='Loose apples', price=Decimal('0.35'), quantity_in_stock=0)
+        Product.objects.create(
+            name='Orange juice', brand='Tropic', price=Decimal('3.99'), category=category,
+            quantity_in_stock=10, picture='products/juice.jpg', picture_url='https://cdn.example.com/old.jpg',
+        )
+        Promotion.objects.create(
+            title='Storewide', description='5% off', discount_percentage=Decimal('5.00'),
+            start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1),
+        )
+        Promotion.objects.create(
+            title='Cola week', description='15% off', product=product, discount_percentage=Decimal('15.00'),
+            start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1),
+        )
+        return APIRequestFactory().get('/api/products/')
+
+    def test_product_list(self, catalog, render_both):
+        drf, fast = render_both(ProductListValues, Product.objects.all(), request=catalog)
+        assert fast == drf
+
+    def test_product_list_with_fieldset(self, catalog, render_both):
+        fieldset = ({'name': {}, 'category_name': {}, 'current_price': {}}, {})
+        drf, fast = render_both(ProductListValues, Product.objects.all(), request=catalog, fieldset=fieldset)
+        assert fast == drf
+
+    def test_categories(self, catalog, render_both):
+        Category.objects.create(name='Empty')
+        drf, fast = render_both(CategoryValues, Category.objects.all())
+        assert fast == drf
+
+    def test_list_endpoint_uses_fast_path(self, authenticated_client, catalog, django_assert_max_num_queries):
+        with django_assert_max_num_queries(5):
+            response = authenticated_client.get('/api/products/')
+        assert response.data['count'] == 3
+        juice = next(row for row in response.data['results'] if row['name'] == 'Orange juice')
+        assert juice['picture_url'] == 'http://testserver/media/products/juice.jpg'
+        assert juice['active_promotion']['title'] == 'Storewide'
+
+
+@pytest.mark.django_db
+class TestCategoryProductCounts:
+    @pytest.fixture
+    def categories(self, product, category):
+        Product.objects.create(name='Old cola', price=1, category=category, is_active=False)
+        for n in range(10):
+            other = Category.objects.create(name=f'Aisle {n}')
+            Product.objects.create(name=f'Item {n}', price=1, category=other)
+        return category
+
+    def test_list_counts_in_constant_queries(self, authenticated_client, categories, django_assert_max_num_queries):
+        with django_assert_max_num_queries(4):
+            response = authenticated_client.get('/api/categories/')
+        counts = {row['name']: row['product_count'] for row in response.data['results']}
+        assert counts['Beverages'] == 2
+        assert counts['Aisle 0'] == 1
+
+    def test_active_only(self, authenticated_client, categories):
+        response = authenticated_client.get(f'/api/categories/{categories.id}/?active_only=true')
+        assert response.data['product_count'] == 1
+
+        response = authenticated_client.get('/api/categories/?active_only=1')
+        assert next(row for row in response.data['results'] if row['name'] == 'Beverages')['product_count'] == 1
+
+    def test_created_category_reports_zero(self, staff_client):
+        response = staff_client.post('/api/categories/', {'name': 'Frozen'}, format='json')
+        assert response.status_code == 201
+        assert response.data['product_count'] == 0
+
+
+def image_bytes(size=(1200, 800), mode='RGB', format='PNG'):
+    out = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(out, format)
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+class TestThumbnails:
+    def test_upload_queues_thumbnails_listed_with_the_product(
+        self, staff_client, category, django_capture_on_commit_callbacks
+    ):
+        upload = SimpleUploadedFile('cola.png', image_bytes(), content_type='image/png')
+        with django_capture_on_commit_callbacks(execute=True):
+            response = staff_client.post('/api/products/', {
+                'name': 'Cola', 'price': '1.50', 'category': category.id, 'is_active': 'true',
+                'picture': upload,
+            }, format='multipart')
+        assert response.status_code == 201
+        assert run_next('test') is not None
+
+        product = Product.objects.get(name='Cola')
+        assert set(product.picture_variants) == {'160', '320', '640'}
+        with product.picture.storage.open(product.picture_variants['160']['webp']) as fh:
+            assert Image.open(fh).size == (160, 107)
+
+        row = staff_client.get('/api/products/').data['results'][0]
+        assert row['picture_variants']['320']['jpeg'].startswith('http://testserver/media/products/thumbs/')
+
+    def test_small_remote_picture_is_not_upscaled(self, product, monkeypatch):
+        monkeypatch.setattr(images, 'fetch_image', lambda url: image_bytes((200, 200), mode='RGBA'))
+        Product.objects.filter(pk=product.pk).update(picture_url='https://images.example.com/cola.png')
+        product.refresh_from_db()
+        variants = images.generate_thumbnails(product)
+
+        assert set(variants) == {'160', '320'}
+        product.refresh_from_db()
+        assert product.picture_variants == variants
+        # Same source bytes, same names: nothing is stored twice.
+        other = Product.objects.create(name='Cola light', price=1, picture_url=product.picture_url)
+        assert images.generate_thumbnails(other) == variants
+
+    def test_list_builds_the_storage_once(self, product, category, staff_client):
+        variants = {'160': {'webp': 'products/thumbs/x/160.webp', 'jpeg': 'products/thumbs/x/160.jpg'}}
+        Product.objects.create(name='Cola light', price=1, category=category, is_active=True)
+        Product.objects.update(picture_variants=variants)
+        immutable_storage.cache_clear()
+        for url in ('/api/products/', f'/api/products/{product.id}/'):
+            assert staff_client.get(url).status_code == 200
+        assert immutable_storage.cache_info().misses == 1
+
+    def test_unreadable_picture_clears_variants(self, product, monkeypatch):
+        monkeypatch.setattr(images, 'fetch_image', lambda url: b'not an image')
+        product.picture_url = 'https://images.example.com/broken.png'
+        product.picture_variants = {'160': {'webp': 'old.webp'}}
+        assert images.generate_thumbnails(product) == {}
+
+    def test_changing_the_picture_requeues(self, product, settings, django_capture_on_commit_callbacks):
+        settings.PRODUCT_IMAGE_MIRROR = False
+        with django_capture_on_commit_callbacks(execute=True):
+            product.price = 3
+            product.save()
+        assert not Job.objects.filter(name='products.generate_thumbnails').exists()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            product.picture_url = 'https://images.example.com/new.png'
+            product.save(update_fields=['picture_url'])
+        assert Job.objects.filter(name='products.generate_thumbnails', kwargs={'product_id': product.id}).exists()
+
+
+@pytest.mark.django_db
+class TestImageMirror:
+    @pytest.fixture
+    def remote_images(self, monkeypatch):
+        images = {
+            'https://images.example.com/a.jpg': image_bytes((2000, 1000), format='JPEG'),
+            'https://images.example.com/b.jpg': image_bytes((2000, 1000), format='JPEG'),
+            'https://images.example.com/not-an-image.jpg': b'<html>Not found</html>',
+        }
+        fetched = []
+
+        def fetch(url):
+            fetched.append(url)
+            if url not in images:
+                raise httpx.ConnectError('unreachable')
+            return images[url]
+
+        monkeypatch.setattr(mirror, 'fetch_image', fetch)
+        return fetched
+
+    def test_synced_picture_is_mirrored_and_served_locally(
+        self, product, category, staff_client, remote_images, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            product.picture_url = 'https://images.example.com/a.jpg'
+            product.save(update_fields=['picture_url', 'updated_at'])
+            Product.objects.create(
+                name='Cola light', price=1, category=category, picture_url='https://images.example.com/b.jpg',
+            )
+        assert Job.objects.filter(name='products.mirror_images').count() == 1
+        assert not Job.objects.filter(name='products.generate_thumbnails').exists()
+
+        Job.objects.update(run_at=timezone.now())
+        assert run_next('test').status == Job.SUCCEEDED
+        # Same bytes behind both URLs: one file, and each URL fetched once.
+        assert sorted(remote_images) == ['https://images.example.com/a.jpg', 'https://images.example.com/b.jpg']
+        names = set(Product.objects.values_list('picture_mirror', flat=True))
+        assert len(names) == 1
+        name = names.pop()
+        assert name.startswith('products/mirror/')
+        with default_storage.open(name) as fh:
+            assert Image.open(fh).size == (1024, 512)
+        assert Job.objects.filter(name='products.generate_thumbnails').count() == 2
+
+        product.refresh_from_db()
+        assert product.picture_url == 'https://images.example.com/a.jpg'
+        data = staff_client.get(f'/api/products/{product.id}/').data
+        assert data['picture_url'] == f'http://testserver/media/{name}'
+        row = staff_client.get('/api/products/').data['results'][0]
+        assert row['picture_url'] == f'http://testserver/media/{name}'
+
+    def test_unreachable_picture_is_retried(self, product, remote_images):
+        Product.objects.filter(pk=product.pk).update(picture_url='https://down.example.com/a.jpg')
+        with pytest.raises(MirrorError):
+            mirror_pending()
+        product.refresh_from_db()
+        assert product.picture_mirror == ''
+        assert not Job.objects.filter(name='products.generate_thumbnails').exists()
+
+    def test_picture_that_is_not_an_image_is_not_fetched_again(self, product, remote_images, monkeypatch):
+        url = 'https://images.example.com/not-an-image.jpg'
+        Product.objects.filter(pk=product.pk).update(picture_url=url)
+        assert mirror_pending() == 1
+        product.refresh_from_db()
+        assert product.picture_mirror_failed == url
+        assert not products_to_mirror().exists()
+        assert mirror_pending() == 0
+        assert remote_images == [url]
+
+        monkeypatch.setattr(images, 'fetch_image', lambda url: pytest.fail(f'{url} fetched again'))
+        assert run_next('test').name == 'products.generate_thumbnails'
+        assert not Job.objects.filter(status=Job.FAILED).exists()
+        assert not images.products_missing_thumbnails().exists()
+
+        # A new URL is tried again.
+        Product.objects.filter(pk=product.pk).update(picture_url='https://images.example.com/a.jpg')
+        assert products_to_mirror().count() == 1
+
+    def test_sweep_queues_pictures_written_without_save(self, product, settings):
+        assert sweep_unmirrored() is None
+        Product.objects.filter(pk=product.pk).update(picture_url='https://images.example.com/a.jpg')
+        assert sweep_unmirrored().name == 'products.mirror_images'
+
+        settings.PRODUCT_IMAGE_MIRROR = False
+        Job.objects.all().delete()
+        assert sweep_unmirrored() is None
+
+    def test_mirrored_urls_share_one_storage(self, product, category, staff_client):
+        Product.objects.create(name='Cola light', price=1, category=category, is_active=True)
+        Product.objects.update(picture_url='https://images.example.com/a.jpg', picture_mirror='products/mirror/a.jpg')
+        immutable_storage.cache_clear()
+        rows = staff_client.get('/api/products/').data['results']
+        assert {row['picture_url'] for row in rows} == {'http://testserver/media/products/mirror/a.jpg'}
+        assert immutable_storage.cache_info().misses == 1
+
+    def test_new_picture_url_drops_the_old_mirror(self, product, django_capture_on_commit_callbacks):
+        Product.objects.filter(pk=product.pk).update(picture_mirror='products/mirror/old.jpg')
+        product.refresh_from_db()
+        with django_capture_on_commit_callbacks(execute=True):
+            product.picture_url = 'https://images.example.com/new.jpg'
+            product.save()
+        product.refresh_from_db()
+        assert product.picture_mirror == ''
@@ -1,16 +1,27 @@
+import csv
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, SAFE_METHODS
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.parsers import MultiPartParser, FormParser
 from django.utils import timezone
-import requests
-from django.conf import settings
-from decimal import Decimal
+from core.conditional import ConditionalGetMixin
+from core.fastpath import FastListMixin
+from core.fieldsets import SparseFieldsetMixin
+from core.parsers import FastJSONParser
+from core.versioning import get_version
+from .bulk import UPSERT_MODES, apply_stock_rows, read_stock_csv, upsert_products
+from .holds import available_to_promise
+from .ledger import set_stock_level
+from .fastpath import CategoryValues, ProductListValues
+from .changes import DEFAULT_LIMIT, MAX_LIMIT, InvalidCursor, collect_changes
 from .models import Category, Product, Promotion
+from .signals import CATALOG_VERSION_SCOPE
+from users.authentication import get_request_customer
 from users.models import Notification
 from .serializers import (
     CategorySerializer,
+    ProductBulkSerializer,
     ProductSerializer,
     ProductCreateUpdateSerializer,
     ProductListSerializer,
@@ -18,15 +29,29 @@ from .serializers import (
 )
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+def active_promotion_ids():
+    """Ids of promotions running right now; they shift prices without any write."""
+    now = timezone.now()
+    return list(
+        Promotion.objects.filter(is_active=True, start_date__lte=now, end_date__gte=now)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+
+
+class CategoryViewSet(ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Category CRUD operations.
     
     List all categories, retrieve individual category details,
     create new categories, update existing ones, and delete categories.
+
+    `product_count` is annotated in the same query; pass
+    `?active_only=true` to leave out deactivated products.
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    fast_serializer_class = CategoryValues
     permission_classes = [IsAuthenticated]
 
     def get_permissions(self):
@@ -34,8 +59,15 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated()]
         return [IsAdminUser()]
 
+    def get_etag_validators(self):
+        return [get_version(CATALOG_VERSION_SCOPE)]
+
+    def get_queryset(self):
+        active_only = self.request.query_params.get('active_only') in ('1', 'true')
+        return Category.objects.with_product_counts(active_only=active_only)
+
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, SparseFieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Product CRUD operations.
     
@@ -52,17 +84,21 @@ class ProductViewSet(viewsets.ModelViewSet):
     - Advanced filtering and sorting capabilities
     """
     queryset = Product.objects.filter(is_active=True)
+    fast_serializer_class = ProductListValues
     permission_classes = [IsAuthenticated]
     search_fields = ['name', 'brand', 'barcode', 'category__name']
     filterset_fields = ['category', 'is_active']
     ordering_fields = ['name', 'price', 'quantity_in_stock', 'created_at']
-    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    parser_classes = [MultiPartParser, FormParser, FastJSONParser]
 
     def get_permissions(self):
         if self.request.method in SAFE_METHODS:
             return [IsAuthenticated()]
         return [IsAdminUser()]
     
+    def get_etag_validators(self):
+        return [get_version(CATALOG_VERSION_SCOPE), active_promotion_ids()]
+
     def get_serializer_class(self):
         if self.action == 'list':
             return ProductListSerializer
@@ -77,102 +113,48 @@ class ProductViewSet(viewsets.ModelViewSet):
         """
         instance = self.get_object()
         instance.is_active = False
-        instance.save()
+        instance.save(update_fields=['is_active', 'updated_at'])
         return Response(status=status.HTTP_204_NO_CONTENT)
     
-    @action(detail=False, methods=['post'])
-    def sync_openfoodfacts(self, request):
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
         """
-        Sync products with Open Food Facts API.
-        
-        **Request Body:**
-        ```json
-        {
-            "barcode": "3017620422003"
-        }
-        ```
-        
+        Delta-sync feed of catalog changes for offline clients.
+
+        **Query Parameters:**
+        - since: Cursor returned by the previous call (omit for a full sync)
+        - limit: Maximum rows per stream (default 200, max 1000)
+
         **Returns:**
-        - Product data auto-populated from Open Food Facts
-        - Nutritional information included
-        - Either creates new product or updates existing one
-        
-        Accepts barcode for search and returns populated product data.
+        - products / promotions: Active rows created or updated since the cursor
+        - deleted: Ids of products and promotions deactivated since the cursor
+        - cursor: Value to pass as `since` on the next call
+        - has_more: True when the client should call again immediately
         """
-        barcode = request.data.get('barcode')
-        
-        if not barcode:
-            return Response(
-                {'error': 'Barcode is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         try:
-            # Query Open Food Facts API
-            # Open Food Facts requires a User-Agent header and .json extension is more reliable
-            url = f"{settings.OPEN_FOOD_FACTS_API_URL}/product/{barcode}.json"
-            headers = {'User-Agent': 'Trinity-Dev-App - iOS - Version 1.0 - https://github.com/amoiz0468/trinity-dev-app'}
-            response = requests.get(url, headers=headers, timeout=10)
-            
-            if response.status_code != 200:
-                return Response(
-                    {'error': 'Failed to fetch from Open Food Facts'},
-                    status=status.HTTP_502_BAD_GATEWAY
-                )
-            
-            data = response.json()
-            
-            if data.get('status') != 1:
-                return Response(
-                    {'error': 'Product not found in Open Food Facts'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            product_data = data.get('product', {})
-            
-            # Extract nutritional information
-            nutriments = product_data.get('nutriments', {})
-            
-            # Check if product exists
-            product, created = Product.objects.update_or_create(
-                barcode=barcode,
-                defaults={
-                    'name': product_data.get('product_name', 'Unknown'),
-                    'brand': product_data.get('brands', ''),
-                    'picture_url': product_data.get('image_url', ''),
-                    'description': product_data.get('ingredients_text', ''),
-                    'openfoodfacts_id': product_data.get('id', ''),
-                    # Open Food Facts does not provide price/stock, use safe defaults
-                    'price': Decimal('0.01'),
-                    'quantity_in_stock': 0,
-                    'energy_kcal': nutriments.get('energy-kcal_100g'),
-                    'fat': nutriments.get('fat_100g'),
-                    'saturated_fat': nutriments.get('saturated-fat_100g'),
-                    'carbohydrates': nutriments.get('carbohydrates_100g'),
-                    'sugars': nutriments.get('sugars_100g'),
-                    'proteins': nutriments.get('proteins_100g'),
-                    'salt': nutriments.get('salt_100g'),
-                    'fiber': nutriments.get('fiber_100g'),
-                    'last_synced': timezone.now(),
-                }
-            )
-            
-            serializer = ProductSerializer(product)
-            return Response({
-                'created': created,
-                'product': serializer.data
-            }, status=status.HTTP_200_OK if not created else status.HTTP_201_CREATED)
-            
-        except requests.RequestException as e:
-            return Response(
-                {'error': f'API request failed: {str(e)}'},
-                status=status.HTTP_502_BAD_GATEWAY
-            )
-        except Exception as e:
-            return Response(
-                {'error': f'An error occurred: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except (TypeError, ValueError):
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), MAX_LIMIT)
+
+        try:
+            changes = collect_changes(request.query_params.get('since'), limit=limit)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = [product for product in changes['products'] if product.is_active]
+        promotions = [promotion for promotion in changes['promotions'] if promotion.is_active]
+        context = {'request': request}
+        return Response({
+            'products': ProductListSerializer(products, many=True, context=context).data,
+            'promotions': PromotionSerializer(promotions, many=True, context=context).data,
+            'deleted': {
+                'products': [p.id for p in changes['products'] if not p.is_active],
+                'promotions': [p.id for p in changes['promotions'] if not p.is_active],
+            },
+            'cursor': changes['cursor'],
+            'has_more': changes['has_more'],
+        })
 
     @action(detail=False, methods=['get'], url_path='barcode/(?P<barcode>[^/.]+)')
     def by_barcode(self, request, barcode=None):
@@ -187,6 +169,22 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = ProductSerializer(product, context={'request': request})
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        """
+        Available-to-promise stock for the requesting customer.
+
+        **Returns:** `quantity_in_stock`, plus `available`: stock minus what
+        other customers currently hold in their carts.
+        """
+        product = self.get_object()
+        customer = get_request_customer(request)
+        return Response({
+            'product': product.id,
+            'quantity_in_stock': product.quantity_in_stock,
+            'available': available_to_promise(product, customer),
+        })
+
     @action(detail=True, methods=['post'])
     def update_stock(self, request, pk=None):
         """
@@ -226,19 +224,117 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        product.quantity_in_stock = quantity
-        product.save()
+        # Recorded in the stock ledger as an adjustment to the new level.
+        set_stock_level(product, quantity, user=request.user)
         
         serializer = ProductSerializer(product)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'], url_path='bulk-stock')
+    def bulk_stock(self, request):
+        """
+        Apply stock changes for many products in one request.
+
+        **Request Body:** a JSON list, `{"rows": [...], "reference": "..."}`,
+        a `text/csv` body or a multipart `file` upload. Each row names a
+        product by `id` or `barcode` and gives either `quantity` (new level)
+        or `delta` (units received or removed):
+        ```json
+        [
+            {"barcode": "3017620422003", "delta": 24},
+            {"id": 12, "quantity": 0}
+        ]
+        ```
+
+        **Returns:** `applied`, `failed` and one result per row, either
+        `{row, product, quantity_in_stock}` or `{row, error}`.
+        """
+        reference = request.query_params.get('reference', '')
+        csv_data = None
+        if request.content_type.startswith('text/csv'):
+            csv_data = request.body
+        elif 'file' in request.FILES:
+            csv_data = request.FILES['file'].read()
+        if csv_data is not None:
+            try:
+                rows = read_stock_csv(csv_data.decode('utf-8-sig'))
+            except (UnicodeDecodeError, csv.Error) as exc:
+                return Response(
+                    {'error': f'Cannot read the CSV as UTF-8: {exc}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            rows = request.data
+            if isinstance(rows, dict):
+                reference = rows.get('reference', reference)
+                rows = rows.get('rows')
+        if not isinstance(rows, list):
+            return Response(
+                {'error': 'Expected a list of rows.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results, applied = apply_stock_rows(rows, user=request.user, reference=reference)
+        return Response({
+            'applied': applied,
+            'failed': len(results) - applied,
+            'results': results,
+        })
+
+    @action(detail=False, methods=['post'], url_path='bulk-upsert')
+    def bulk_upsert(self, request):
+        """
+        Create, update or upsert many products keyed on `barcode`.
+
+        **Request Body:** a JSON list of products, or
+        `{"mode": "upsert", "products": [...]}`. `category` is a category
+        name. Updates may send only the fields that change, e.g. a price list:
+        ```json
+        [
+            {"barcode": "3017620422003", "price": "4.99"},
+            {"barcode": "5449000000996", "name": "Coca Cola", "price": "2.50", "category": "Beverages"}
+        ]
+        ```
+
+        **Query Parameters:**
+        - mode: `create`, `update` or `upsert` (default)
+
+        **Returns:** counts and one result per row, either
+        `{row, barcode, id, status}` or `{row, errors}`. Invalid rows do not
+        stop the rest of the batch.
+        """
+        payload = request.data
+        mode = request.query_params.get('mode', 'upsert')
+        if isinstance(payload, dict):
+            mode = payload.get('mode', mode)
+            payload = payload.get('products')
+        if mode not in UPSERT_MODES:
+            return Response(
+                {'error': f"mode must be one of {', '.join(UPSERT_MODES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not isinstance(payload, list):
+            return Response(
+                {'error': 'Expected a list of products.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = ProductBulkSerializer(data=payload, many=True, partial=True)
+        results = upsert_products(serializer, mode=mode)
+        statuses = [result.get('status') for result in results]
+        return Response({
+            'created': statuses.count('created'),
+            'updated': statuses.count('updated'),
+            'failed': statuses.count(None),
+            'results': results,
+        })
+
     @action(detail=False, methods=['get'])
     def recommendations(self, request):
         """
         Get product recommendations based on user purchase history.
         """
-        user = request.user
-        customer = getattr(user, 'customer_profile', None)
+        customer = get_request_customer(request)
         
         if not customer:
             # For guests or admins without profile, return popular products
@@ -273,7 +369,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class PromotionViewSet(viewsets.ModelViewSet):
+class PromotionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Promotion management.
     """
@@ -291,6 +387,23 @@ class PromotionViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated()]
         return [IsAdminUser()]
 
+    def get_etag_validators(self):
+        return [
+            self.request.user.is_staff,
+            get_version(CATALOG_VERSION_SCOPE),
+            active_promotion_ids(),
+        ]
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Soft delete a promotion by setting is_active to False, so the
+        delta-sync feed (``/api/products/changes/``) reports it as deleted.
+        """
+        instance = self.get_object()
+        instance.is_active = False
+        instance.save(update_fields=['is_active', 'updated_at'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     def perform_create(self, serializer):
         promotion = serializer.save()
         discount_text = ''
@@ -0,0 +1,173 @@
+"""
+Flat exports of invoices, invoice items, customers and products.
+
+Each dataset is a ``values_list`` projection read with
+``.iterator(chunk_size=...)`` and encoded row by row, so an export of any
+size is streamed with constant memory.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from django.db.models import Count, IntegerField, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from invoices.models import Invoice, InvoiceItem
+from products.models import Product
+from users.models import Customer
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+ITERATOR_CHUNK_SIZE = 2000
+
+
+class ExportSpec:
+    def __init__(self, queryset, columns, date_field, status_field=None):
+        self._queryset = queryset
+        # (output column name, queryset field or annotation)
+        self.columns = columns
+        self.date_field = date_field
+        self.status_field = status_field
+
+    def queryset(self):
+        return self._queryset()
+
+
+def _invoices():
+    return Invoice.objects.annotate(
+        item_count=Count('items'),
+        total_items=Coalesce(Sum('items__quantity'), Value(0), output_field=IntegerField()),
+    )
+
+
+EXPORTS = {
+    'invoices': ExportSpec(
+        _invoices,
+        [
+            ('id', 'id'),
+            ('invoice_number', 'invoice_number'),
+            ('created_at', 'created_at'),
+            ('status', 'status'),
+            ('payment_method', 'payment_method'),
+            ('customer_id', 'customer_id'),
+            ('customer_email', 'customer__email'),
+            ('item_count', 'item_count'),
+            ('total_items', 'total_items'),
+            ('subtotal', 'subtotal'),
+            ('tax_rate', 'tax_rate'),
+            ('tax_amount', 'tax_amount'),
+            ('total_amount', 'total_amount'),
+            ('paid_at', 'paid_at'),
+            ('paypal_transaction_id', 'paypal_transaction_id'),
+        ],
+        date_field='created_at',
+        status_field='status',
+    ),
+    'invoice-items': ExportSpec(
+        lambda: InvoiceItem.objects.all(),
+        [
+            ('id', 'id'),
+            ('invoice_id', 'invoice_id'),
+            ('invoice_number', 'invoice__invoice_number'),
+            ('invoice_created_at', 'invoice__created_at'),
+            ('invoice_status', 'invoice__status'),
+            ('product_id', 'product_id'),
+            ('barcode', 'product__barcode'),
+            ('product_name', 'product_name'),
+            ('product_brand', 'product_brand'),
+            ('quantity', 'quantity'),
+            ('unit_price', 'unit_price'),
+            ('total_price', 'total_price'),
+        ],
+        date_field='invoice__created_at',
+        status_field='invoice__status',
+    ),
+    'customers': ExportSpec(
+        lambda: Customer.objects.all(),
+        [
+            ('id', 'id'),
+            ('first_name', 'first_name'),
+            ('last_name', 'last_name'),
+            ('email', 'email'),
+            ('phone_number', 'phone_number'),
+            ('zip_code', 'zip_code'),
+            ('city', 'city'),
+            ('country', 'country'),
+            ('is_active', 'is_active'),
+            ('created_at', 'created_at'),
+        ],
+        date_field='created_at',
+    ),
+    'products': ExportSpec(
+        lambda: Product.objects.all(),
+        [
+            ('id', 'id'),
+            ('barcode', 'barcode'),
+            ('name', 'name'),
+            ('brand', 'brand'),
+            ('category', 'category__name'),
+            ('price', 'price'),
+            ('quantity_in_stock', 'quantity_in_stock'),
+            ('is_active', 'is_active'),
+            ('created_at', 'created_at'),
+            ('updated_at', 'updated_at'),
+        ],
+        date_field='created_at',
+    ),
+}
+
+
+def day_bounds(start=None, end=None):
+    """Aware datetimes for the start of ``start`` and the end of ``end`` (dates)."""
+    lower = timezone.make_aware(datetime.combine(start, time.min)) if start else None
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)) if end else None
+    return lower, upper
+
+
+def export_rows(spec, start=None, end=None, status=None):
+    """Yield tuples of column values, ordered by primary key."""
+    queryset = spec.queryset()
+    lower, upper = day_bounds(start, end)
+    if lower:
+        queryset = queryset.filter(**{f'{spec.date_field}__gte': lower})
+    if upper:
+        queryset = queryset.filter(**{f'{spec.date_field}__lt': upper})
+    if status and spec.status_field:
+        queryset = queryset.filter(**{spec.status_field: status})
+    fields = [field for _, field in spec.columns]
+    return queryset.order_by('pk').values_list(*fields).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+class _Line:
+    """File-like object for ``csv.writer`` that hands back each written line."""
+
+    def write(self, value):
+        return value
+
+
+def _format(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(spec, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow([name for name, _ in spec.columns]).encode()
+    for row in rows:
+        yield writer.writerow([_format(value) for value in row]).encode()
+
+
+def encode_jsonl(spec, rows):
+    names = [name for name, _ in spec.columns]
+    for row in rows:
+        record = dict(zip(names, (_format(value) for value in row)))
+        yield (json.dumps(record, default=str, separators=(',', ':')) + '\n').encode()
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'jsonl': encode_jsonl,
+}
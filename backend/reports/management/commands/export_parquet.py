@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from reports.parquet import ParquetUnavailable, export_parquet
+
+
+class Command(BaseCommand):
+    help = (
+        'Write invoices and invoice items as monthly Parquet partitions, plus '
+        'products and customers, rewriting only months that changed since the last run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dest', help='Output directory (default: ANALYTICS_EXPORT_DIR)')
+        parser.add_argument('--full', action='store_true', help='Rewrite every month')
+
+    def handle(self, *args, **options):
+        try:
+            summary = export_parquet(root=options['dest'], full=options['full'])
+        except ParquetUnavailable as exc:
+            raise CommandError(str(exc))
+        months = ', '.join(summary['months']) or 'none'
+        self.stdout.write(f'Months written: {months}')
+        if summary['removed']:
+            self.stdout.write(f"Months removed: {', '.join(summary['removed'])}")
+        rows = ', '.join(f'{name}={count}' for name, count in summary['rows'].items())
+        self.stdout.write(self.style.SUCCESS(f'Rows written: {rows}'))
@@ -0,0 +1,208 @@
+"""
+Columnar (Parquet) export of sales data for offline analysis.
+
+Invoices and invoice items are written as one file per calendar month,
+Hive-style (``invoices/month=2024-05/part-0.parquet``), so pandas/pyarrow
+can load the whole history as a single dataset. Products and customers are
+small dimension tables, rewritten in full each run.
+
+Every file of a dataset is written with the same Arrow schema, derived from
+the model fields behind its columns, so partitions of months without (say)
+a single paid invoice still read together with the others.
+
+``manifest.json`` records a signature (row count and latest ``updated_at``)
+for every month. A run only rewrites months whose signature changed, which
+is normally just the current month.
+
+Requires the optional ``pyarrow`` package.
+"""
+import functools
+import json
+import os
+import shutil
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Count, Max
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from invoices.models import Invoice, InvoiceItem
+from .exports import EXPORTS, ITERATOR_CHUNK_SIZE
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow
+    pa = pq = None
+
+MANIFEST_NAME = 'manifest.json'
+
+# Dataset name on disk -> export spec (see reports.exports).
+PARTITIONED_DATASETS = {
+    'invoices': EXPORTS['invoices'],
+    'invoice_items': EXPORTS['invoice-items'],
+}
+DIMENSION_DATASETS = {
+    'products': EXPORTS['products'],
+    'customers': EXPORTS['customers'],
+}
+
+
+class ParquetUnavailable(Exception):
+    pass
+
+
+def export_dir():
+    return settings.ANALYTICS_EXPORT_DIR
+
+
+def read_manifest(root=None):
+    path = os.path.join(root or export_dir(), MANIFEST_NAME)
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {'months': {}, 'last_run': None}
+
+
+def _write_json(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(data, fh, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _month_key(value):
+    return value.strftime('%Y-%m')
+
+
+def month_signatures():
+    """
+    Map ``YYYY-MM`` -> ``(month start, signature)`` for every month with
+    invoices. The signature changes whenever an invoice of that month is
+    created, edited or deleted, or its items change.
+    """
+    invoices = (
+        Invoice.objects.annotate(month=TruncMonth('created_at'))
+        .values('month')
+        .annotate(rows=Count('id'), updated=Max('updated_at'))
+        .order_by()
+    )
+    items = dict(
+        InvoiceItem.objects.annotate(month=TruncMonth('invoice__created_at'))
+        .values('month')
+        .annotate(rows=Count('id'))
+        .order_by()
+        .values_list('month', 'rows')
+    )
+    return {
+        _month_key(row['month']): (
+            row['month'],
+            [row['rows'], items.get(row['month'], 0), row['updated'].isoformat()],
+        )
+        for row in invoices
+    }
+
+
+def _model_field(queryset, path):
+    """The model field (or annotation output field) behind a ``values_list`` path."""
+    model = queryset.model
+    *relations, name = path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    if not relations and name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # ``customer_id`` and the like: the attname of a foreign key.
+        return next(field for field in model._meta.concrete_fields if field.attname == name)
+
+
+def _arrow_type(field):
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return pa.int64()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    return pa.string()
+
+
+@functools.cache
+def arrow_schema(spec):
+    """The fixed Arrow schema of ``spec``'s columns."""
+    queryset = spec.queryset()
+    return pa.schema([pa.field(name, _arrow_type(_model_field(queryset, path))) for name, path in spec.columns])
+
+
+def _write_table(spec, rows, path):
+    names = [name for name, _ in spec.columns]
+    columns = {name: [] for name in names}
+    for row in rows:
+        for name, value in zip(names, row):
+            columns[name].append(value)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp'
+    pq.write_table(pa.Table.from_pydict(columns, schema=arrow_schema(spec)), tmp, compression='zstd')
+    os.replace(tmp, path)
+    return len(columns[names[0]])
+
+
+def _month_rows(spec, month):
+    queryset = spec.queryset().annotate(_month=TruncMonth(spec.date_field)).filter(_month=month)
+    fields = [field for _, field in spec.columns]
+    return queryset.order_by('pk').values_list(*fields).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def export_parquet(root=None, full=False):
+    """
+    Write changed monthly partitions and the dimension tables under ``root``.
+
+    ``full`` ignores the manifest and rewrites every month. Partitions of
+    months that no longer have invoices are removed. Returns
+    ``{'months': [rewritten], 'removed': [months], 'rows': {dataset: rows written}}``.
+    """
+    if pa is None:
+        raise ParquetUnavailable('pyarrow is not installed.')
+
+    root = root or export_dir()
+    os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root)
+    exported = {} if full else manifest.get('months', {})
+    signatures = month_signatures()
+    changed = sorted(
+        month for month, (_, signature) in signatures.items() if exported.get(month) != signature
+    )
+    removed = sorted(set(manifest.get('months', {})) - set(signatures))
+
+    rows = {name: 0 for name in [*PARTITIONED_DATASETS, *DIMENSION_DATASETS]}
+    for month in changed:
+        start, signature = signatures[month]
+        for name, spec in PARTITIONED_DATASETS.items():
+            path = os.path.join(root, name, f'month={month}', 'part-0.parquet')
+            rows[name] += _write_table(spec, _month_rows(spec, start), path)
+        exported[month] = signature
+    for month in removed:
+        for name in PARTITIONED_DATASETS:
+            shutil.rmtree(os.path.join(root, name, f'month={month}'), ignore_errors=True)
+        exported.pop(month, None)
+
+    for name, spec in DIMENSION_DATASETS.items():
+        fields = [field for _, field in spec.columns]
+        queryset = spec.queryset().order_by('pk').values_list(*fields).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        rows[name] = _write_table(spec, queryset, os.path.join(root, name, f'{name}.parquet'))
+
+    _write_json(os.path.join(root, MANIFEST_NAME), {
+        'months': exported,
+        'last_run': timezone.now().isoformat(),
+    })
+    return {'months': changed, 'removed': removed, 'rows': rows}
@@ -1,3 +1,144 @@
-from django.test import TestCase
+import pytest
+import gzip
+import json
+from datetime import timedelta
+from decimal import Decimal
+from django.utils import timezone
+from invoices.models import Invoice
+from products.ledger import apply_movement, take_snapshot
+from products.models import StockMovement
+from reports.parquet import export_parquet
 
-# Create your tests here.
+
+@pytest.mark.django_db
+class TestStockLevelsReport:
+    def test_reports_stock_at_a_past_moment(self, staff_client, product):
+        take_snapshot()
+        moment = timezone.now()
+        apply_movement(product.id, -5, StockMovement.SALE)
+        StockMovement.objects.filter(kind='sale').update(created_at=moment + timedelta(seconds=1))
+
+        response = staff_client.get('/api/reports/stock/', {'at': moment.isoformat()})
+        assert response.status_code == 200
+        assert response.data['results'] == [
+            {'id': product.id, 'name': product.name, 'barcode': product.barcode, 'quantity_in_stock': 100}
+        ]
+
+        response = staff_client.get('/api/reports/stock/', {
+            'at': (moment + timedelta(seconds=2)).isoformat(),
+            'category': product.category_id,
+        })
+        assert response.data['results'][0]['quantity_in_stock'] == 95
+
+    def test_requires_staff(self, authenticated_client):
+        response = authenticated_client.get('/api/reports/stock/')
+        assert response.status_code == 403
+
+
+@pytest.mark.django_db
+class TestExports:
+    def _body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_invoice_csv_export(self, staff_client, invoice):
+        response = staff_client.get('/api/reports/export/invoices/')
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/csv'
+        lines = self._body(response).decode().splitlines()
+        assert lines[0].startswith('id,invoice_number,created_at,status')
+        assert lines[1].startswith(f'{invoice.id},INV-2024-001,')
+
+    def test_jsonl_export_with_filters(self, staff_client, invoice):
+        today = timezone.localdate().isoformat()
+        response = staff_client.get('/api/reports/export/invoices/', {
+            'output': 'jsonl', 'start': today, 'end': today, 'status': 'pending',
+        })
+        records = [json.loads(line) for line in self._body(response).decode().splitlines()]
+        assert [record['invoice_number'] for record in records] == ['INV-2024-001']
+
+        response = staff_client.get('/api/reports/export/invoices/', {'output': 'jsonl', 'status': 'paid'})
+        assert self._body(response) == b''
+
+    def test_gzip_export(self, staff_client, product):
+        response = staff_client.get('/api/reports/export/products/', {'gzip': '1'})
+        assert response['Content-Type'] == 'application/gzip'
+        assert response['Content-Disposition'].endswith('.csv.gz"')
+        text = gzip.decompress(self._body(response)).decode()
+        assert product.barcode in text
+
+    def test_unknown_dataset_and_bad_dates(self, staff_client):
+        assert staff_client.get('/api/reports/export/nope/').status_code == 404
+        assert staff_client.get('/api/reports/export/customers/', {'start': 'x'}).status_code == 400
+
+    def test_export_requires_staff(self, authenticated_client):
+        assert authenticated_client.get('/api/reports/export/invoices/').status_code == 403
+
+
+@pytest.mark.django_db
+class TestParquetExport:
+    @pytest.fixture(autouse=True)
+    def export_dir(self, settings, tmp_path):
+        pytest.importorskip('pyarrow')
+        settings.ANALYTICS_EXPORT_DIR = str(tmp_path)
+        return tmp_path
+
+    def test_writes_monthly_partitions_and_dimensions(self, export_dir, invoice, product):
+        import pyarrow.parquet as pq
+
+        invoice.items.create(product=product, quantity=2, unit_price=product.price)
+        summary = export_parquet()
+        month = timezone.localtime(invoice.created_at).strftime('%Y-%m')
+        assert summary['months'] == [month]
+
+        table = pq.read_table(export_dir / 'invoices' / f'month={month}' / 'part-0.parquet')
+        assert table.column('invoice_number').to_pylist() == ['INV-2024-001']
+        assert table.column('total_items').to_pylist() == [2]
+        items = pq.read_table(export_dir / 'invoice_items' / f'month={month}' / 'part-0.parquet')
+        assert items.column('barcode').to_pylist() == [product.barcode]
+        products = pq.read_table(export_dir / 'products' / 'products.parquet')
+        assert products.num_rows == 1
+
+    def test_incremental_run_rewrites_only_changed_months(self, invoice, customer):
+        old = Invoice.objects.create(
+            customer=customer, invoice_number='INV-2023-001', subtotal=10, tax_amount=0, total_amount=10,
+        )
+        Invoice.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+
+        assert len(export_parquet()['months']) == 2
+        assert export_parquet()['months'] == []
+
+        Invoice.objects.filter(pk=invoice.pk).update(status='paid', updated_at=timezone.now())
+        month = timezone.localtime(invoice.created_at).strftime('%Y-%m')
+        assert export_parquet()['months'] == [month]
+        assert len(export_parquet(full=True)['months']) == 2
+
+        Invoice.objects.filter(pk=old.pk).delete()
+        assert len(export_parquet()['removed']) == 1
+
+    def test_months_read_back_as_one_dataset(self, export_dir, invoice, customer):
+        import pyarrow.parquet as pq
+
+        old = Invoice.objects.create(
+            customer=customer, invoice_number='INV-2023-001', subtotal=Decimal('1234.56'),
+            tax_amount=0, total_amount=Decimal('1234.56'), status='paid', paid_at=timezone.now(),
+        )
+        Invoice.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        export_parquet()
+
+        # One month has no paid invoice, so its paid_at column is all null.
+        table = pq.read_table(export_dir / 'invoices')
+        assert sorted(table.column('invoice_number').to_pylist()) == ['INV-2023-001', 'INV-2024-001']
+        assert str(table.schema.field('paid_at').type) == 'timestamp[us, tz=UTC]'
+        assert str(table.schema.field('total_amount').type) == 'decimal128(10, 2)'
+        assert pq.read_table(export_dir / 'invoice_items').num_rows == 0
+
+    def test_endpoint(self, staff_client, invoice):
+        response = staff_client.post('/api/reports/parquet/', {'full': True}, format='json')
+        assert response.status_code == 200
+        assert response.data['rows']['invoices'] == 1
+
+        manifest = staff_client.get('/api/reports/parquet/').data
+        assert list(manifest['months']) == response.data['months']
+
+    def test_endpoint_requires_staff(self, authenticated_client):
+        assert authenticated_client.post('/api/reports/parquet/').status_code == 403
@@ -4,8 +4,13 @@ from rest_framework.permissions import IsAdminUser
 from django.db.models import Sum, Count, Avg, F, Q, Value, CharField
 from django.db.models.functions import TruncDate, Coalesce
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from core.streaming import buffered, gzipped, stream_response
 from datetime import timedelta
 from invoices.models import Invoice, InvoiceItem
+from .exports import ENCODERS, EXPORT_FORMATS, EXPORTS, export_rows
+from .parquet import ParquetUnavailable, export_parquet, read_manifest
+from products.ledger import NoStockHistory, stock_levels_at
 from products.models import Product
 from users.models import Customer
 
@@ -215,6 +220,47 @@ class ProductPerformanceView(APIView):
         })
 
 
+class StockLevelsReportView(APIView):
+    """
+    Stock level of every product at a point in time, rebuilt from the
+    inventory ledger.
+
+    **Query Parameters:**
+    - at: ISO 8601 datetime (default: now)
+    - category: optional category id
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        at_param = request.query_params.get('at')
+        moment = parse_datetime(at_param) if at_param else timezone.now()
+        if moment is None:
+            return Response({'detail': 'at must be an ISO 8601 datetime.'}, status=400)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+
+        products = Product.objects.order_by('id')
+        category = request.query_params.get('category')
+        product_ids = None
+        if category:
+            products = products.filter(category_id=category)
+            product_ids = products.values('id')
+        products = list(products.values('id', 'name', 'barcode'))
+
+        try:
+            levels = stock_levels_at(moment, product_ids=product_ids)
+        except NoStockHistory:
+            return Response({'detail': 'No stock history recorded before that date.'}, status=400)
+
+        return Response({
+            'at': moment.isoformat(),
+            'results': [
+                {**product, 'quantity_in_stock': levels.get(product['id'], 0)}
+                for product in products
+            ],
+        })
+
+
 class CustomerAnalyticsView(APIView):
     """
     Customer analytics and behavior.
@@ -236,3 +282,67 @@ class CustomerAnalyticsView(APIView):
             'active_customers': active_customers,
             'customers_with_purchases': customers_with_purchases,
         })
+
+
+class ExportView(APIView):
+    """
+    Stream a dataset as CSV or JSON Lines.
+
+    **Datasets:** invoices, invoice-items, customers, products
+
+    **Query Parameters:**
+    - output: `csv` (default) or `jsonl`
+    - start, end: inclusive date range (YYYY-MM-DD) on the creation date
+    - status: invoice status (invoices and invoice-items only)
+    - gzip: `1` to download a gzip-compressed file
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, dataset):
+        spec = EXPORTS.get(dataset)
+        if spec is None:
+            return Response({'detail': f"Unknown dataset. Choose from: {', '.join(EXPORTS)}."}, status=404)
+
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response({'detail': f"output must be one of: {', '.join(EXPORT_FORMATS)}."}, status=400)
+
+        dates = {}
+        for name in ('start', 'end'):
+            value = request.query_params.get(name)
+            if value:
+                dates[name] = parse_date(value)
+                if dates[name] is None:
+                    return Response({'detail': f'{name} must be a date (YYYY-MM-DD).'}, status=400)
+
+        rows = export_rows(spec, status=request.query_params.get('status'), **dates)
+        chunks = buffered(ENCODERS[output](spec, rows))
+        filename = f'{dataset}-{timezone.now():%Y%m%d}.{output}'
+        content_type = EXPORT_FORMATS[output]
+        if request.query_params.get('gzip') in ('1', 'true'):
+            chunks = gzipped(chunks)
+            filename += '.gz'
+            content_type = 'application/gzip'
+        return stream_response(request, chunks, content_type, filename=filename)
+
+
+class ParquetExportView(APIView):
+    """
+    Columnar export of sales data for analytics tools.
+
+    GET returns the manifest of the last run. POST writes the months that
+    changed since then (all months with `{"full": true}`) under
+    `ANALYTICS_EXPORT_DIR` and returns what was written.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(read_manifest())
+
+    def post(self, request):
+        full = str(request.data.get('full', '')).lower() in ('1', 'true')
+        try:
+            summary = export_parquet(full=full)
+        except ParquetUnavailable as exc:
+            return Response({'detail': str(exc)}, status=501)
+        return Response(summary)
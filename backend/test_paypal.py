@@ -14,7 +14,7 @@ sys.path.insert(0, os.path.dirname(__file__))
 django.setup()
 
 from django.conf import settings
-from invoices.views import get_paypal_access_token
+from invoices.paypal import get_paypal_access_token
 from invoices.models import Invoice
 from users.models import Customer
 from products.models import Product
@@ -39,7 +39,8 @@ def api_index(request):
                 "delete": "DELETE /api/products/{id}/",
                 "sync_with_barcode": "POST /api/products/sync_openfoodfacts/",
                 "update_stock": "POST /api/products/{id}/update_stock/",
-                "lookup_by_barcode": "GET /api/products/barcode/{barcode}/"
+                "lookup_by_barcode": "GET /api/products/barcode/{barcode}/",
+                "catalog_changes": "GET /api/products/changes/?since={cursor}"
             },
             "categories": {
                 "list": "GET /api/categories/",
@@ -76,6 +77,15 @@ def api_index(request):
                 "remove_item": "DELETE /api/cart/remove_item/",
                 "clear": "POST /api/cart/clear/"
             },
+            "notifications": {
+                "list": "GET /api/notifications/",
+                "unread_count": "GET /api/notifications/unread-count/",
+                "mark_read": "PATCH /api/notifications/{id}/read/",
+                "mark_all_read": "PATCH /api/notifications/read_all/"
+            },
+            "events": {
+                "stream": "GET /api/events/ (text/event-stream, ASGI only)"
+            },
             "paypal": {
                 "webhook": "POST /api/paypal/webhook/"
             },
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 from decouple import AutoConfig
+from django.core.exceptions import ImproperlyConfigured
+from corsheaders.defaults import default_headers as default_cors_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -55,11 +57,13 @@ INSTALLED_APPS = [
     "products",
     "invoices",
     "reports",
+    "jobs",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "core.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -103,6 +107,35 @@ DATABASES = {
 }
 
 
+# Cache
+# Uses Redis when REDIS_URL is set, otherwise a per-process in-memory cache.
+# REDIS_URL also switches the /api/events/ broker to Redis pub/sub. The ETag
+# version counters and events must be shared by every web and job worker
+# process, so REDIS_URL is required when DEBUG is off.
+
+REDIS_URL = config('REDIS_URL', default='')
+
+if not DEBUG and not REDIS_URL:
+    raise ImproperlyConfigured(
+        'REDIS_URL must be set when DEBUG is False: the web and job workers '
+        'share cache versions and events through it.'
+    )
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -140,6 +173,16 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# Hashed files are cached forever by WhiteNoise; this covers the rest.
+WHITENOISE_MAX_AGE = config('WHITENOISE_MAX_AGE', default=0 if DEBUG else 3600, cast=int)
+
+# API response compression (core.middleware.CompressionMiddleware): Brotli
+# when the `brotli` package is installed and accepted, gzip otherwise.
+COMPRESSION_PATHS = ['/api/']
+COMPRESSION_EXCLUDE_PATHS = ['/api/auth/']
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_GZIP_LEVEL = config('COMPRESSION_GZIP_LEVEL', default=6, cast=int)
+COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', default=4, cast=int)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -168,14 +211,46 @@ if USE_S3 and AWS_STORAGE_BUCKET_NAME:
     DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
     MEDIA_URL = f"https://{AWS_S3_CUSTOM_DOMAIN or f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'}/"
 
+# Email. Under DEBUG the defaults point at the local sink started with
+# `python manage.py smtp_sink`; otherwise EMAIL_HOST etc. must name a real
+# SMTP server.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost' if DEBUG else '')
+EMAIL_PORT = config('EMAIL_PORT', default=1025 if DEBUG else 587, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=not DEBUG, cast=bool)
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=15, cast=int)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='Trinity Grocery <receipts@trinity.local>')
+
+if not DEBUG and not EMAIL_HOST and EMAIL_BACKEND.endswith('smtp.EmailBackend'):
+    raise ImproperlyConfigured('EMAIL_HOST must be set when DEBUG is False (or choose another EMAIL_BACKEND).')
+
+# Receipt emails are sent by the background worker, up to
+# RECEIPT_EMAIL_BATCH_SIZE per SMTP connection. A new request waits
+# RECEIPT_EMAIL_BATCH_DELAY seconds so that others can join its batch.
+RECEIPT_EMAIL_BATCH_SIZE = config('RECEIPT_EMAIL_BATCH_SIZE', default=50, cast=int)
+RECEIPT_EMAIL_BATCH_DELAY = config('RECEIPT_EMAIL_BATCH_DELAY', default=5, cast=int)
+RECEIPT_EMAIL_MAX_ATTEMPTS = config('RECEIPT_EMAIL_MAX_ATTEMPTS', default=5, cast=int)
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CustomerJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed when installed, identical to DRF's JSON classes otherwise.
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
@@ -191,14 +266,50 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(minutes=config('JWT_REFRESH_TOKEN_LIFETIME', default=1440, cast=int)),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    'UPDATE_LAST_LOGIN': False,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Seconds an authenticated user's snapshot is served from cache before the
+# user row is read again (saves and deletes invalidate it immediately).
+AUTH_USER_SNAPSHOT_TTL = config('AUTH_USER_SNAPSHOT_TTL', default=60, cast=int)
+
+# Upper bound, in seconds, on how long a user's maintained unread notification
+# counter is trusted before it is counted again (see users.counters).
+NOTIFICATION_UNREAD_COUNT_TTL = config('NOTIFICATION_UNREAD_COUNT_TTL', default=300, cast=int)
+
+# Idempotency-Key handling: how long stored responses are replayed, how long a
+# duplicate sent to an async view waits for the in-flight original (sync views
+# answer 409 at once), and after how long an unfinished original is considered
+# abandoned (all in seconds).
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+IDEMPOTENCY_WAIT_TIMEOUT = config('IDEMPOTENCY_WAIT_TIMEOUT', default=10, cast=float)
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=60, cast=int)
+
+# Seconds a cart reservation keeps stock aside; re-adding or updating the
+# cart item restarts it.
+STOCK_HOLD_TTL = config('STOCK_HOLD_TTL', default=900, cast=int)
+
+# Background jobs (manage.py runworker): seconds an idle worker waits between
+# polls, after how long a running job is assumed abandoned by a dead worker,
+# default attempts per job, base and maximum retry backoff, and how long
+# succeeded jobs are kept (all in seconds).
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1, cast=float)
+JOB_LOCK_TIMEOUT = config('JOB_LOCK_TIMEOUT', default=900, cast=int)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=5, cast=int)
+JOB_RETRY_BACKOFF = config('JOB_RETRY_BACKOFF', default=30, cast=int)
+JOB_RETRY_BACKOFF_MAX = config('JOB_RETRY_BACKOFF_MAX', default=3600, cast=int)
+JOB_RETENTION = config('JOB_RETENTION', default=7 * 86400, cast=int)
+
+# Directory the export_parquet command and /api/reports/parquet/ write the
+# monthly Parquet partitions and manifest to (requires pyarrow).
+ANALYTICS_EXPORT_DIR = config('ANALYTICS_EXPORT_DIR', default=str(BASE_DIR / 'analytics'))
+
 # CORS Settings
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_cors_headers, 'idempotency-key')
 if DEBUG and ALLOW_ALL_HOSTS_IN_DEBUG:
     ALLOWED_HOSTS = ['*']
     CORS_ALLOW_ALL_ORIGINS = True
@@ -252,6 +363,26 @@ SECURE_CONTENT_TYPE_NOSNIFF = True
 CSRF_COOKIE_HTTPONLY = True
 SESSION_COOKIE_HTTPONLY = True
 
+# Outbound HTTP (pooled async client used for PayPal and Open Food Facts)
+OUTBOUND_HTTP_TIMEOUT = config('OUTBOUND_HTTP_TIMEOUT', default=15, cast=float)
+OUTBOUND_HTTP_CONNECT_TIMEOUT = config('OUTBOUND_HTTP_CONNECT_TIMEOUT', default=5, cast=float)
+OUTBOUND_HTTP_MAX_CONNECTIONS = config('OUTBOUND_HTTP_MAX_CONNECTIONS', default=100, cast=int)
+OUTBOUND_HTTP_MAX_KEEPALIVE = config('OUTBOUND_HTTP_MAX_KEEPALIVE', default=20, cast=int)
+
+# Product thumbnails (products.images): widths of the square boxes they fit
+# in, and the largest remote picture that will be downloaded.
+PRODUCT_THUMBNAIL_WIDTHS = [
+    int(width) for width in config('PRODUCT_THUMBNAIL_WIDTHS', default='160,320,640').split(',')
+]
+PRODUCT_IMAGE_MAX_BYTES = config('PRODUCT_IMAGE_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+
+# Local copies of remote product pictures (products.mirror): whether to
+# make them, the square box they are scaled to fit in, and how many
+# downloads run at once.
+PRODUCT_IMAGE_MIRROR = config('PRODUCT_IMAGE_MIRROR', default=True, cast=bool)
+PRODUCT_IMAGE_MIRROR_SIZE = config('PRODUCT_IMAGE_MIRROR_SIZE', default=1024, cast=int)
+PRODUCT_IMAGE_MIRROR_CONCURRENCY = config('PRODUCT_IMAGE_MIRROR_CONCURRENCY', default=4, cast=int)
+
 # Open Food Facts API
 OPEN_FOOD_FACTS_API_URL = config(
     'OPEN_FOOD_FACTS_API_URL',
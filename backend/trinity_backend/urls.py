@@ -28,7 +28,6 @@ from invoices.views import (
     InvoiceViewSet,
     InvoiceItemViewSet,
     CartViewSet,
-    PayPalWebhookView,
     PayPalReturnView,
     PayPalCancelView,
     PaymentVerifyView,
@@ -39,9 +38,16 @@ from reports.views import (
     ReportsView,
     SalesReportView,
     ProductPerformanceView,
+    StockLevelsReportView,
+    ExportView,
+    ParquetExportView,
     CustomerAnalyticsView
 )
+from jobs.views import JobStatsView
 from trinity_backend.api_docs import api_index
+from core.views import event_stream
+from invoices.async_views import capture_paypal_order, create_paypal_order, paypal_webhook
+from products.async_views import sync_openfoodfacts
 
 # Router for API endpoints
 router = DefaultRouter()
@@ -69,7 +75,7 @@ urlpatterns = [
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/auth/register/', RegisterView.as_view(), name='auth_register'),
     path('api/auth/me/', CurrentUserView.as_view(), name='auth_me'),
-    path('api/paypal/webhook/', PayPalWebhookView.as_view(), name='paypal-webhook'),
+    path('api/paypal/webhook/', paypal_webhook, name='paypal-webhook'),
     path('api/paypal/return/', PayPalReturnView.as_view(), name='paypal-return'),
     path('api/paypal/cancel/', PayPalCancelView.as_view(), name='paypal-cancel'),
     path('api/payments/verify/<str:transaction_id>', PaymentVerifyView.as_view(), name='payments-verify'),
@@ -79,11 +85,26 @@ urlpatterns = [
     path('api/payments/refund', PaymentRefundView.as_view(), name='payments-refund'),
     path('api/payments/refund/', PaymentRefundView.as_view(), name='payments-refund-slash'),
     
+    # Async endpoints that wait on PayPal / Open Food Facts; routed ahead of the
+    # API router so they take precedence over the viewset URLs.
+    path('api/invoices/<int:pk>/create_paypal_order/', create_paypal_order, name='invoice-create-paypal-order'),
+    path('api/invoices/<int:pk>/capture_paypal_order/', capture_paypal_order, name='invoice-capture-paypal-order'),
+    path('api/products/sync_openfoodfacts/', sync_openfoodfacts, name='product-sync-openfoodfacts'),
+
+    # Server-sent events (ASGI only)
+    path('api/events/', event_stream, name='event-stream'),
+
     # Reports
     path('api/reports/', ReportsView.as_view(), name='reports'),
     path('api/reports/sales/', SalesReportView.as_view(), name='sales-report'),
     path('api/reports/products/', ProductPerformanceView.as_view(), name='product-performance'),
+    path('api/reports/stock/', StockLevelsReportView.as_view(), name='stock-levels-report'),
+    path('api/reports/export/<slug:dataset>/', ExportView.as_view(), name='report-export'),
+    path('api/reports/parquet/', ParquetExportView.as_view(), name='report-parquet'),
     path('api/reports/customers/', CustomerAnalyticsView.as_view(), name='customer-analytics'),
+
+    # Background jobs
+    path('api/jobs/stats/', JobStatsView.as_view(), name='job-stats'),
     
     # API Router
     path('api/', include(router.urls)),
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Customer, Notification
+from .models import Customer, Notification, NotificationReceipt
 
 
 @admin.register(Customer)
@@ -27,3 +27,10 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ['type', 'is_read', 'created_at']
     search_fields = ['title', 'message', 'user__email', 'user__username']
     readonly_fields = ['created_at']
+
+
+@admin.register(NotificationReceipt)
+class NotificationReceiptAdmin(admin.ModelAdmin):
+    list_display = ['notification', 'user', 'read_at']
+    search_fields = ['notification__title', 'user__email', 'user__username']
+    readonly_fields = ['read_at']
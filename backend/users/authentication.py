@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import Customer
+
+# User columns kept in the cached snapshot. Anything else (e.g. password) is
+# left deferred and loaded from the database only if a view touches it.
+USER_SNAPSHOT_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name',
+    'is_staff', 'is_superuser', 'is_active',
+)
+
+_UNSET = object()
+
+
+def user_snapshot_cache_key(user_id):
+    return f'auth:user-snapshot:{user_id}'
+
+
+def invalidate_user_snapshot(user_id):
+    if user_id is not None:
+        cache.delete(user_snapshot_cache_key(user_id))
+
+
+class CustomerJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication backed by a short-lived user snapshot cache.
+
+    The token is validated as usual, then the user is rebuilt from a cached
+    snapshot (user columns plus the linked customer id). On a cache miss the
+    user is loaded together with its customer profile in a single query and
+    the snapshot is stored for ``AUTH_USER_SNAPSHOT_TTL`` seconds.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        snapshot = cache.get(user_snapshot_cache_key(user_id))
+        if snapshot is not None:
+            user = self._user_from_snapshot(snapshot)
+        else:
+            user = self._load_user(user_id)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
+
+    def _load_user(self, user_id):
+        try:
+            user = self.user_model.objects.select_related('customer_profile').get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        try:
+            customer_id = user.customer_profile.pk
+        except Customer.DoesNotExist:
+            customer_id = None
+
+        snapshot = {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS}
+        snapshot['customer_id'] = customer_id
+        cache.set(
+            user_snapshot_cache_key(user_id),
+            snapshot,
+            timeout=settings.AUTH_USER_SNAPSHOT_TTL,
+        )
+        return user
+
+    def _user_from_snapshot(self, snapshot):
+        field_names = [
+            f.attname for f in self.user_model._meta.concrete_fields
+            if f.attname in snapshot
+        ]
+        user = self.user_model.from_db(
+            DEFAULT_DB_ALIAS,
+            field_names,
+            [snapshot[name] for name in field_names],
+        )
+        user.snapshot_customer_id = snapshot['customer_id']
+        return user
+
+
+def get_request_customer(request):
+    """
+    Return the Customer linked to ``request.user`` (or None), resolving it at
+    most once per request.
+    """
+    try:
+        return request._customer
+    except AttributeError:
+        pass
+
+    customer = None
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        customer_id = getattr(user, 'snapshot_customer_id', _UNSET)
+        if customer_id is _UNSET:
+            try:
+                customer = user.customer_profile
+            except Customer.DoesNotExist:
+                customer = None
+        elif customer_id is not None:
+            customer = Customer.objects.filter(pk=customer_id).first()
+
+    request._customer = customer
+    return customer
@@ -0,0 +1,84 @@
+"""
+Maintained unread-notification counters (``NotificationCounter``).
+
+The badge reads one row per user. The row is kept up to date as follows:
+- a new notification adds one to the counters it concerns, and a global
+  one adds one to every counter in a single ``UPDATE``;
+- reading a notification takes one off;
+- read-all resets the count to zero.
+
+Other changes drop the affected rows, such as edits, deletes, removed
+receipts or a watermark moved outside read-all. The next read counts the
+row again from the notification tables. The same happens once
+``valid_until`` passes, when a counted notification expires.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Case, F, Min, Value, When
+from django.utils import timezone
+from .models import Notification, NotificationCounter
+
+
+def get_unread_count(user):
+    """Return the user's unread notification count."""
+    now = timezone.now()
+    unread = (
+        NotificationCounter.objects.filter(user=user, valid_until__gt=now)
+        .values_list('unread', flat=True).first()
+    )
+    if unread is not None:
+        return max(unread, 0)
+    return recount_unread(user, now)
+
+
+def recount_unread(user, now=None):
+    """Count the user's unread notifications and store the counter."""
+    now = now or timezone.now()
+    unread = Notification.objects.unread_count(user)
+    valid_until = now + timedelta(seconds=settings.NOTIFICATION_UNREAD_COUNT_TTL)
+    next_expiry = (
+        Notification.objects.visible_to(user).active(now)
+        .aggregate(next_expiry=Min('expires_at'))['next_expiry']
+    )
+    if next_expiry:
+        valid_until = min(valid_until, next_expiry)
+    NotificationCounter.objects.update_or_create(user=user, defaults={'unread': unread, 'valid_until': valid_until})
+    return unread
+
+
+def count_new_notification(notification):
+    """Add a just-created unread ``notification`` to the counters of its audience."""
+    expires_at = notification.expires_at
+    if notification.is_read or (expires_at and expires_at <= timezone.now()):
+        return
+    counters = NotificationCounter.objects.all()
+    if notification.user_id is not None:
+        counters = counters.filter(user_id=notification.user_id)
+    changes = {'unread': F('unread') + 1}
+    if expires_at:
+        # Counted until it expires; recount then.
+        changes['valid_until'] = Case(
+            When(valid_until__gt=expires_at, then=Value(expires_at)),
+            default=F('valid_until'),
+        )
+    counters.update(**changes)
+
+
+def count_read(user_id, count=1):
+    """Take ``count`` notifications the user has just read off their counter."""
+    if count:
+        NotificationCounter.objects.filter(user_id=user_id).update(unread=F('unread') - count)
+
+
+def reset_unread_count(user):
+    """Everything visible to the user has just been read."""
+    valid_until = timezone.now() + timedelta(seconds=settings.NOTIFICATION_UNREAD_COUNT_TTL)
+    NotificationCounter.objects.update_or_create(user=user, defaults={'unread': 0, 'valid_until': valid_until})
+
+
+def forget_unread_counts(user_id=None):
+    """Drop the counter of ``user_id`` (every counter for ``None``); it is recounted when next read."""
+    counters = NotificationCounter.objects.all()
+    if user_id is not None:
+        counters = counters.filter(user_id=user_id)
+    counters.delete()
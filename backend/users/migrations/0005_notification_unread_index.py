@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0004_notification_read_state"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "is_read", "created_at"],
+                name="users_notif_user_id_0b72f9_idx",
+            ),
+        ),
+    ]
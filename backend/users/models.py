@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import BooleanField, Case, Exists, F, OuterRef, Q, Value, When
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Customer(models.Model):
@@ -41,9 +43,67 @@ class Customer(models.Model):
         return f"{self.address}, {self.zip_code} {self.city}, {self.country}"
 
 
+class NotificationQuerySet(models.QuerySet):
+    def active(self, now=None):
+        """Exclude notifications past their expiry date."""
+        now = now or timezone.now()
+        return self.filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+
+    def visible_to(self, user):
+        """The user's own notifications plus global (user=null) ones."""
+        return self.filter(Q(user=user) | Q(user__isnull=True))
+
+    def with_read_state(self, user):
+        """
+        Annotate ``read_for_user``: the row's own flag for personal
+        notifications, and the user's receipt or read-all watermark for
+        global ones.
+        """
+        global_read = Q(Exists(NotificationReceipt.objects.filter(
+            notification=OuterRef('pk'), user=user
+        )))
+        read_all_at = NotificationReadState.read_all_at_for(user)
+        if read_all_at:
+            global_read |= Q(created_at__lte=read_all_at)
+        return self.annotate(read_for_user=Case(
+            When(Q(user__isnull=True) & global_read, then=Value(True)),
+            When(user__isnull=True, then=Value(False)),
+            default=F('is_read'),
+            output_field=BooleanField(),
+        ))
+
+    def unread_count(self, user):
+        """
+        Count the user's unread notifications from the notification tables.
+
+        The badge reads the maintained ``NotificationCounter`` instead (see
+        ``users.counters``); this count builds that row when it is missing
+        or out of date. Global notifications are only scanned back to the
+        user's read-all watermark.
+        """
+        now = timezone.now()
+        return self.personal_unread_count(user, now) + self.global_unread_count(user, now)
+
+    def personal_unread_count(self, user, now=None):
+        return self.filter(user=user, is_read=False).active(now).count()
+
+    def global_unread_count(self, user, now=None):
+        global_unread = self.filter(user__isnull=True).active(now).exclude(
+            Exists(NotificationReceipt.objects.filter(notification=OuterRef('pk'), user=user))
+        )
+        read_all_at = NotificationReadState.read_all_at_for(user)
+        if read_all_at:
+            global_unread = global_unread.filter(created_at__gt=read_all_at)
+        return global_unread.count()
+
+
 class Notification(models.Model):
     """
     Model for storing user notifications and global announcements.
+
+    ``is_read`` is only meaningful for personal notifications; read state of
+    global ones is tracked per user by NotificationReceipt and
+    NotificationReadState.
     """
     NOTIFICATION_TYPES = [
         ('info', 'Information'),
@@ -60,8 +120,66 @@ class Notification(models.Model):
     expires_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = NotificationQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', 'created_at']),
+        ]
 
     def __str__(self):
         return f"{self.type.upper()}: {self.title}"
+
+
+class NotificationReceipt(models.Model):
+    """
+    Marks a single global notification as read by one user.
+    """
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='receipts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_receipts')
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'notification'], name='unique_notification_receipt'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} read {self.notification_id}"
+
+
+class NotificationReadState(models.Model):
+    """
+    Per-user read-all watermark: every global notification created at or
+    before ``read_all_at`` counts as read, so "mark all as read" is a single
+    row write instead of one receipt per announcement.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='notification_read_state')
+    read_all_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user} read all at {self.read_all_at}"
+
+    @classmethod
+    def read_all_at_for(cls, user):
+        return cls.objects.filter(user=user).values_list('read_all_at', flat=True).first()
+
+
+class NotificationCounter(models.Model):
+    """
+    Maintained unread-notification count of one user, so the badge is a
+    single primary-key read (see ``users.counters``).
+
+    ``unread`` is exact until ``valid_until``: the next expiry among the
+    notifications it counts, capped at ``NOTIFICATION_UNREAD_COUNT_TTL``.
+    The row is then counted again from the notification tables.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter'
+    )
+    unread = models.IntegerField(default=0)
+    valid_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user}: {self.unread} unread"
@@ -135,3 +135,10 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ['id', 'user', 'title', 'message', 'type', 'is_read', 'expires_at', 'created_at']
         read_only_fields = ['id', 'created_at']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Per-user read state annotated by NotificationQuerySet.with_read_state
+        if hasattr(instance, 'read_for_user'):
+            data['is_read'] = instance.read_for_user
+        return data
@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from core.events import publish_event
+from core.versioning import bump_version
+from .authentication import invalidate_user_snapshot
+from .counters import count_new_notification, count_read, forget_unread_counts
+from .models import Customer, Notification, NotificationReadState, NotificationReceipt
+
+ALL_NOTIFICATIONS_SCOPE = 'notifications:all'
+
+
+def notification_audience_scope(user_id=None):
+    """Version scope of notifications addressed to ``user_id`` (None = everyone)."""
+    return f'notifications:user:{user_id}' if user_id else 'notifications:global'
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_snapshot_for_user(sender, instance, **kwargs):
+    invalidate_user_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_snapshot_for_customer(sender, instance, **kwargs):
+    invalidate_user_snapshot(instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_notification_version(sender, instance, **kwargs):
+    bump_version(ALL_NOTIFICATIONS_SCOPE, notification_audience_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        count_new_notification(instance)
+    else:
+        forget_unread_counts(instance.user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def forget_counters_of_deleted_notification(sender, instance, **kwargs):
+    forget_unread_counts(instance.user_id)
+
+
+@receiver(post_save, sender=NotificationReceipt)
+def count_read_receipt(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    notification = instance.notification
+    read_all_at = NotificationReadState.read_all_at_for(instance.user_id)
+    counted = (
+        notification.user_id is None
+        and (notification.expires_at is None or notification.expires_at > timezone.now())
+        and (read_all_at is None or notification.created_at > read_all_at)
+    )
+    if counted:
+        count_read(instance.user_id)
+
+
+@receiver(post_delete, sender=NotificationReceipt)
+@receiver(post_save, sender=NotificationReadState)
+def forget_counter_of_reader(sender, instance, **kwargs):
+    # read_all resets the counter once it is done; other changes recount.
+    forget_unread_counts(instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+def publish_new_notification(sender, instance, created, **kwargs):
+    if not created:
+        return
+    from .serializers import NotificationSerializer
+
+    data = NotificationSerializer(instance).data
+    transaction.on_commit(lambda: publish_event('notification', data, user_id=instance.user_id))
+
+
+@receiver(post_save, sender=NotificationReceipt)
+@receiver(post_delete, sender=NotificationReceipt)
+@receiver(post_save, sender=NotificationReadState)
+def bump_read_state_version(sender, instance, **kwargs):
+    bump_version(ALL_NOTIFICATIONS_SCOPE, notification_audience_scope(instance.user_id))
@@ -1,5 +1,10 @@
 import pytest
-from users.models import Customer
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from users.models import Customer, Notification, NotificationCounter
 
 
 @pytest.mark.django_db
@@ -62,3 +67,142 @@ class TestCustomerAPI:
     def test_unauthorized_access(self, api_client):
         response = api_client.get('/api/users/')
         assert response.status_code == 401
+
+
+@pytest.mark.django_db
+class TestCustomerJWTAuthentication:
+    def _authenticate(self, api_client, user):
+        api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def test_me_resolves_customer_with_token_user_query(self, api_client, customer, django_assert_num_queries):
+        self._authenticate(api_client, customer.user)
+        with django_assert_num_queries(1):
+            response = api_client.get('/api/auth/me/')
+        assert response.status_code == 200
+        assert response.data['customer']['id'] == customer.id
+
+    def test_request_customer_is_none_without_profile(self, api_client, user):
+        self._authenticate(api_client, user)
+        response = api_client.get('/api/auth/me/')
+        assert response.status_code == 200
+        assert response.data['customer'] is None
+
+    def test_cached_snapshot_skips_user_query(self, api_client, user, django_assert_num_queries):
+        self._authenticate(api_client, user)
+        api_client.get('/api/auth/me/')
+        with django_assert_num_queries(0):
+            response = api_client.get('/api/auth/me/')
+        assert response.status_code == 200
+        assert response.data['user']['username'] == user.username
+
+    def test_deactivated_user_is_rejected_despite_snapshot(self, api_client, user):
+        self._authenticate(api_client, user)
+        assert api_client.get('/api/auth/me/').status_code == 200
+
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        assert api_client.get('/api/auth/me/').status_code == 401
+
+
+@pytest.mark.django_db
+class TestNotificationReadState:
+    @pytest.fixture
+    def other_client(self, db):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='other', password='testpass123'))
+        return client
+
+    @pytest.fixture
+    def announcement(self, db):
+        return Notification.objects.create(title='Sale', message='Everything 10% off', type='promotion')
+
+    def _is_read(self, client, notification_id):
+        results = client.get('/api/notifications/').data['results']
+        return next(n['is_read'] for n in results if n['id'] == notification_id)
+
+    def test_reading_global_notification_is_per_user(self, authenticated_client, other_client, announcement):
+        response = authenticated_client.patch(f'/api/notifications/{announcement.id}/read/')
+        assert response.status_code == 200
+
+        assert self._is_read(authenticated_client, announcement.id) is True
+        assert self._is_read(other_client, announcement.id) is False
+        announcement.refresh_from_db()
+        assert announcement.is_read is False
+
+    def test_read_all_uses_watermark(self, authenticated_client, other_client, announcement, user):
+        Notification.objects.create(user=user, title='Yours', message='...')
+        assert Notification.objects.unread_count(user) == 2
+
+        authenticated_client.patch('/api/notifications/read_all/')
+        assert Notification.objects.unread_count(user) == 0
+        assert self._is_read(other_client, announcement.id) is False
+
+        later = Notification.objects.create(title='New', message='...')
+        assert Notification.objects.unread_count(user) == 1
+        assert self._is_read(authenticated_client, later.id) is False
+
+    def test_expired_notifications_are_hidden(self, authenticated_client, user):
+        Notification.objects.create(title='Old', message='...', expires_at=timezone.now() - timedelta(minutes=1))
+        response = authenticated_client.get('/api/notifications/')
+        assert response.data['results'] == []
+        assert Notification.objects.unread_count(user) == 0
+
+
+@pytest.mark.django_db
+class TestNotificationUnreadCountAPI:
+    def _count(self, client):
+        return client.get('/api/notifications/unread-count/').data['unread_count']
+
+    def test_unread_count_tracks_create_and_read(self, authenticated_client, user):
+        assert authenticated_client.get('/api/notifications/unread-count/').data == {'unread_count': 0}
+
+        notification = Notification.objects.create(title='Sale', message='...')
+        Notification.objects.create(user=user, title='Yours', message='...')
+        assert self._count(authenticated_client) == 2
+
+        authenticated_client.patch(f'/api/notifications/{notification.id}/read/')
+        assert self._count(authenticated_client) == 1
+
+        authenticated_client.patch('/api/notifications/read_all/')
+        assert self._count(authenticated_client) == 0
+
+    def test_badge_reads_one_counter_row(self, authenticated_client, django_assert_num_queries):
+        authenticated_client.get('/api/notifications/unread-count/')
+        with django_assert_num_queries(1):
+            response = authenticated_client.get('/api/notifications/unread-count/')
+        assert response.data['unread_count'] == 0
+
+    def test_writes_update_the_counter_in_place(self, authenticated_client, user, django_assert_num_queries):
+        personal = Notification.objects.create(user=user, title='Yours', message='...')
+        assert self._count(authenticated_client) == 1
+
+        announcement = Notification.objects.create(title='Sale', message='...')
+        assert NotificationCounter.objects.get(user=user).unread == 2
+        authenticated_client.patch(f'/api/notifications/{announcement.id}/read/')
+        authenticated_client.patch(f'/api/notifications/{announcement.id}/read/')
+        authenticated_client.patch(f'/api/notifications/{personal.id}/read/')
+        assert NotificationCounter.objects.get(user=user).unread == 0
+
+        authenticated_client.patch('/api/notifications/read_all/')
+        with django_assert_num_queries(1):
+            assert self._count(authenticated_client) == 0
+
+    def test_counter_is_recounted_when_a_notification_expires(self, authenticated_client, user):
+        assert self._count(authenticated_client) == 0
+        expires_at = timezone.now() + timedelta(minutes=1)
+        announcement = Notification.objects.create(title='Flash sale', message='...', expires_at=expires_at)
+        assert NotificationCounter.objects.get(user=user).valid_until == expires_at
+        assert self._count(authenticated_client) == 1
+
+        past = timezone.now() - timedelta(seconds=1)
+        Notification.objects.filter(pk=announcement.pk).update(expires_at=past)
+        NotificationCounter.objects.filter(user=user).update(valid_until=past)
+        assert self._count(authenticated_client) == 0
+
+    def test_edited_notification_is_recounted(self, authenticated_client, user):
+        notification = Notification.objects.create(user=user, title='Yours', message='...')
+        assert self._count(authenticated_client) == 1
+        notification.is_read = True
+        notification.save()
+        assert not NotificationCounter.objects.filter(user=user).exists()
+        assert self._count(authenticated_client) == 0
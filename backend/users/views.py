@@ -6,8 +6,14 @@ from rest_framework.views import APIView
 from django.contrib.auth.models import User
 from django.db.models import Sum, Count, Avg, Q, Max, DecimalField, ProtectedError
 from django.db.models.functions import Coalesce
+from django.utils import timezone
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .models import Customer, Notification
+from core.conditional import ConditionalGetMixin
+from core.versioning import bump_version, get_versions
+from .authentication import get_request_customer
+from .counters import count_read, get_unread_count, reset_unread_count
+from .models import Customer, Notification, NotificationReadState, NotificationReceipt
+from .signals import ALL_NOTIFICATIONS_SCOPE, notification_audience_scope
 from .serializers import (
     CustomerSerializer,
     CustomerCreateSerializer,
@@ -143,7 +149,7 @@ class CurrentUserView(APIView):
 
     def get(self, request):
         user = request.user
-        customer = Customer.objects.filter(user=user).first()
+        customer = get_request_customer(request)
         return Response({
             'user': UserSerializer(user).data,
             'customer': CustomerSerializer(customer).data if customer else None,
@@ -151,7 +157,7 @@ class CurrentUserView(APIView):
 
     def patch(self, request):
         user = request.user
-        customer = Customer.objects.filter(user=user).first()
+        customer = get_request_customer(request)
         
         # 1. Update User fields directly
         user_fields_to_update = []
@@ -187,7 +193,7 @@ class CurrentUserView(APIView):
 
     def put(self, request):
         user = request.user
-        customer = Customer.objects.filter(user=user).first()
+        customer = get_request_customer(request)
         
         # 1. Update User fields
         user_fields_to_update = []
@@ -229,7 +235,7 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = EmailOrUsernameTokenObtainPairSerializer
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for user notifications.
     """
@@ -238,24 +244,53 @@ class NotificationViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        # Users see their own and global (user=null) notifications
+        # Users see their own and unexpired global (user=null) notifications
         # Admins see all
-        if self.request.user.is_staff:
-            return Notification.objects.all()
-        return Notification.objects.filter(
-            Q(user=self.request.user) | Q(user__isnull=True)
-        ).order_by('-created_at')
+        user = self.request.user
+        if user.is_staff:
+            queryset = Notification.objects.all()
+        else:
+            queryset = Notification.objects.visible_to(user).active().order_by('-created_at')
+        return queryset.with_read_state(user)
+
+    def get_etag_validators(self):
+        user = self.request.user
+        if user.is_staff:
+            return [user.pk, *get_versions(ALL_NOTIFICATIONS_SCOPE)]
+        # Expiry hides notifications without any write, so count the expired ones too.
+        expired = Notification.objects.visible_to(user).filter(expires_at__lte=timezone.now()).count()
+        return [
+            user.pk,
+            expired,
+            *get_versions(notification_audience_scope(), notification_audience_scope(user.pk)),
+        ]
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """Lightweight unread badge count for the current user"""
+        return Response({'unread_count': get_unread_count(request.user)})
 
     @action(detail=True, methods=['patch'])
     def read(self, request, pk=None):
-        """Mark notification as read"""
+        """Mark notification as read for the current user"""
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        if notification.user_id is None:
+            NotificationReceipt.objects.get_or_create(notification=notification, user=request.user)
+        elif Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            # A queryset update, so the counter is adjusted rather than recounted.
+            count_read(notification.user_id)
+            bump_version(ALL_NOTIFICATIONS_SCOPE, notification_audience_scope(notification.user_id))
         return Response({'status': 'notification marked as read'})
 
     @action(detail=False, methods=['patch'])
     def read_all(self, request):
-        """Mark all visible notifications as read"""
-        self.get_queryset().filter(is_read=False).update(is_read=True)
+        """Mark all of the current user's notifications, and every global one, as read"""
+        user = request.user
+        now = timezone.now()
+        Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+        NotificationReadState.objects.update_or_create(user=user, defaults={'read_all_at': now})
+        # Receipts older than the watermark are now redundant.
+        NotificationReceipt.objects.filter(user=user, notification__created_at__lte=now).delete()
+        reset_unread_count(user)
+        bump_version(ALL_NOTIFICATIONS_SCOPE, notification_audience_scope(user.pk))
         return Response({'status': 'all notifications marked as read'})
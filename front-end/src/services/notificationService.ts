@@ -38,6 +38,20 @@ class NotificationService {
     }
   }
 
+  /**
+   * Get the unread notification count (cheap to poll for the badge)
+   */
+  async getUnreadCount(): Promise<number> {
+    try {
+      if (API_CONFIG.USE_MOCK_DATA) return 0;
+      const response = await apiClient.get<any>('/notifications/unread-count/');
+      return Number(response?.unread_count) || 0;
+    } catch (error) {
+      console.error('Error fetching unread notification count:', error);
+      return 0;
+    }
+  }
+
   /**
    * Mark a notification as read
    */